@@ -0,0 +1,120 @@
+import os
+import click
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from config import Config
+from database import db, init_db, pool_stats
+
+# Importing this module only pulls in Flask, the config and the db handle.
+# Blueprints (and through them the models and services) are imported inside
+# create_app(), and nothing connects to the database until the first request
+# or CLI command that needs it. The schema is managed with `flask init-db` and
+# the migrations in migrations/ (`flask db-upgrade`), never at startup.
+
+
+def create_app(config_object=Config) -> Flask:
+    from services.upload_service import PARTIAL_DIR, UploadRequest
+
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.config.from_object(config_object)
+    if app.config.get("TRUSTED_PROXY_COUNT"):
+        count = app.config["TRUSTED_PROXY_COUNT"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count, x_host=count)
+
+    app.config["UPLOAD_FOLDER"] = app.config.get("UPLOAD_FOLDER") or os.path.join(app.static_folder, "uploads")
+    os.makedirs(os.path.join(app.config["UPLOAD_FOLDER"], PARTIAL_DIR), exist_ok=True)
+
+    # DB connection bind
+    init_db(app)
+
+    from services.storage_service import init_storage
+    init_storage(app)
+
+    from services.session_service import init_sessions
+    init_sessions(app)
+
+    from services.metrics_service import init_metrics
+    init_metrics(app)
+
+    from services.profiler_service import init_profiler
+    init_profiler(app)
+
+    from blueprints import auth, blog, media, profiling
+
+    auth.login_manager.init_app(app)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(blog.bp)
+    app.register_blueprint(media.bp)
+    app.register_blueprint(profiling.bp)
+
+    register_commands(app)
+    return app
+
+
+# SCHEMA / MAINTENANCE
+
+def register_commands(app: Flask):
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create a fresh schema, or migrate an existing one to the head. Safe to re-run."""
+        from models import db_tables  # noqa: F401  (registers the models)
+        from services import migration_service
+        from services.search_service import init_search_index
+
+        for migration in migration_service.create_or_upgrade(db.engine, db.create_all):
+            print(f"Applied {migration.revision}: {migration.description}")
+        init_search_index()
+        print("Database schema is up to date")
+
+    @app.cli.command("db-upgrade")
+    @click.option("--to", "target", default=None, help="Revision to stop at (default: the newest)")
+    def db_upgrade_command(target):
+        """Apply pending schema migrations."""
+        from services import migration_service
+
+        applied = migration_service.upgrade(db.engine, target)
+        for migration in applied:
+            print(f"Applied {migration.revision}: {migration.description}")
+        print(f"{len(applied)} migration(s) applied")
+
+    @app.cli.command("db-downgrade")
+    @click.option("--to", "target", required=True, help="Revision to return to")
+    def db_downgrade_command(target):
+        """Revert schema migrations, newest first."""
+        from services import migration_service
+
+        for migration in migration_service.downgrade(db.engine, target):
+            print(f"Reverted {migration.revision}: {migration.description}")
+        print(f"Database is at {target}")
+
+    @app.cli.command("db-status")
+    def db_status_command():
+        """Show the database's schema revision and the pending migrations."""
+        from services import migration_service
+
+        current, pending = migration_service.status(db.engine)
+        print(f"Current revision: {current or 'none'}")
+        for migration in pending:
+            print(f"  pending {migration.revision}: {migration.description}")
+
+    @app.cli.command("db-stamp")
+    @click.argument("revision")
+    def db_stamp_command(revision):
+        """Record REVISION as applied without running any migration."""
+        from services import migration_service
+
+        if revision not in {m.revision for m in migration_service.load_migrations()}:
+            raise click.BadParameter(f"Unknown revision {revision}")
+        migration_service.stamp(db.engine, revision)
+        print(f"Database stamped at {revision}")
+
+    @app.cli.command("db-pool-stats")
+    def db_pool_stats_command():
+        """Show connection pool checkout waits per database bind."""
+        for bind, stats in pool_stats().items():
+            print(f"[{bind}]")
+            for name, value in stats.items():
+                print(f"  {name}: {value}")
@@ -1,277 +1,9 @@
-import os
-import secrets
-from services.email_service import send_email
-from flask import Flask, request, render_template, redirect, url_for, flash
-from flask_login import LoginManager, login_user, logout_user, login_required
+from app_factory import create_app
 
-from config import Config
-from database import db
-from models.db_tables import Post, User
-from services.auth_helpers import create_user, generate_email_verification_token, generate_otp_token, reset_password, verify_email_token, verify_otp_token, verify_password
+# Kept for `flask --app auth_app`; the auth routes now live in blueprints/auth.py
+# and are served by the same application as the blog.
+app = create_app()
 
-app = Flask(__name__)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SECRET_KEY"] = secrets.token_hex()
-# DB connection bind
-db.init_app(app)
-
-with app.app_context():
-    db.create_all() 
-
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(user_id)
-
-# -------------------
-# REGISTER
-# -------------------
-
-# @app.route("/register", methods=["GET", "POST"])
-# def register():
-#     step = request.form.get("step", "1")
-
-#     if request.method == "POST":
-
-#         # -------- STEP 1: USER DETAILS ----------
-#         if step == "1":
-#             # Check if this is a resend OTP request
-#             if "email" in request.form and "username" not in request.form:
-#                 email = request.form["email"]
-#                 user = User.query.filter_by(email=email).first()
-#                 if user and not user.is_email_verified:
-#                     otp_token = generate_email_verification_token(user)
-#                     flash(f"OTP resent (demo): {otp_token.token}", "success")
-#                     return render_template("register.html", step="2", email=email)
-#                 else:
-#                     flash("Invalid request", "danger")
-#                     return redirect(url_for("register"))
-
-#             # Normal registration
-#             username = request.form["username"]
-#             email = request.form["email"]
-#             password = request.form["password"]
-#             confirm_password = request.form["confirm_password"]
-
-#             if password != confirm_password:
-#                 flash("Passwords do not match", "danger")
-#                 return render_template("register.html", step="1")
-
-#             # Check if email exists
-#             user = User.query.filter_by(email=email).first()
-#             if user:
-#                 if user.is_email_verified:
-#                     flash("Email already registered. Please login.", "info")
-#                     return redirect(url_for("login"))
-#                 else:
-#                     otp_token = generate_email_verification_token(user)
-#                     flash(f"OTP resent (demo): {otp_token.token}", "success")
-#                     return render_template("register.html", step="2", email=email)
-
-#             # Create new user
-#             new_user = create_user(username, email, password)
-#             otp_token = generate_email_verification_token(new_user)
-#             flash(f"OTP sent (demo): {otp_token.token}", "success")
-#             return render_template("register.html", step="2", email=email)
-
-#         # -------- STEP 2: VERIFY OTP ----------
-#         elif step == "2":
-#             email = request.form["email"]
-#             input_otp = request.form["otp"]
-
-#             user = User.query.filter_by(email=email).first()
-#             if not user or not verify_email_token(user, input_otp):
-#                 flash("Invalid OTP", "danger")
-#                 return render_template("register.html", step="2", email=email)
-
-#             user.is_email_verified = True
-#             db.session.commit()
-#             flash("Email verified! You can now login.", "success")
-#             return redirect(url_for("login"))
-
-#     # Default: Step 1
-#     return render_template("register.html", step="1")
-
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    # Step can come from form (POST) or query string (GET)
-    step = request.form.get("step") or request.args.get("step") or "1"
-    email = request.form.get("email") or request.args.get("email")
-
-    if request.method == "POST":
-
-        # -------- STEP 1: USER DETAILS --------
-        if step == "1":
-            username = request.form["username"]
-            email = request.form["email"]
-            password = request.form["password"]
-            confirm_password = request.form["confirm_password"]
-
-            if password != confirm_password:
-                flash("Passwords do not match", "danger")
-                return render_template("register.html", step="1")
-
-            # Check if email already exists
-            user = User.query.filter_by(email=email).first()
-            if user:
-                if user.is_email_verified:
-                    flash("Email already registered. Please login.", "info")
-                    return redirect(url_for("login"))
-                else:
-                    # Resend OTP if email exists but not verified
-                    otp_token = generate_email_verification_token(user)
-                    # Send email here
-                    send_email(
-                        to=user.email,
-                        subject="Verify your email",
-                        message=f"Your OTP is {otp_token.token}"
-                    )
-                    flash("OTP resent! Check your email.", "success")
-                    return render_template("register.html", step="2", email=email)
-
-            # Create new user
-            new_user = create_user(username, email, password)
-            otp_token = generate_email_verification_token(new_user)
-            # Send email
-            send_email(
-                to=new_user.email,
-                subject="Verify your email",
-                message=f"Your OTP is {otp_token.token}"
-            )
-            flash("OTP sent! Check your email.", "success")
-            return render_template("register.html", step="2", email=email)
-
-        # -------- STEP 2: VERIFY OTP --------
-        elif step == "2":
-            input_otp = request.form["otp"]
-            user = User.query.filter_by(email=email).first()
-
-            if not user or not verify_email_token(user, input_otp):
-                flash("Invalid OTP", "danger")
-                return render_template("register.html", step="2", email=email)
-
-            user.is_email_verified = True
-            db.session.commit()
-            flash("Email verified! You can now login.", "success")
-            return redirect(url_for("login"))
-
-    # Default: render step 1
-    return render_template("register.html", step=step, email=email)
-
-
-# -------------------
-# LOGIN
-# -------------------
-
-@app.route("/login", methods=["GET","POST"])
-def login():
-    step = request.args.get("step")
-
-    if request.method == "POST":
-        # -------- NORMAL LOGIN --------
-        if step is None:
-            email = request.form["email"]
-            password = request.form["password"]
-            user = User.query.filter_by(email=email).first()
-            if not user or not verify_password(user, password):
-                flash("Invalid email or password", "danger")
-                return render_template("login.html")
-            if not user.is_email_verified:
-                flash("Please verify email first", "warning")
-                return render_template("login.html")
-            login_user(user)
-            flash("Login successful", "success")
-            return redirect(url_for("index"))
-
-        # -------- FORGOT PASSWORD: EMAIL --------
-        elif step == "forgot_email":
-            email = request.form["email"]
-            user = User.query.filter_by(email=email).first()
-            if not user:
-                flash("Email not found", "danger")
-                return render_template("login.html", step="forgot_email")
-            
-            # OTP sirf yahi generate hoga
-            otp_token = generate_otp_token(user, token_type="password_reset", minutes_valid=15)
-            send_email(
-                to=email,
-                subject="Forgot Password email",
-                message=f"Your OTP is {otp_token.token}"
-            )
-            flash("OTP sent! Check your email.", "success")
-            # flash(f"OTP sent (demo): {otp_token.token}", "info")
-            return render_template("login.html", step="forgot_otp", email=email)
-
-        # -------- VERIFY OTP --------
-        elif step == "forgot_otp":
-            email = request.form["email"]  # hidden field se
-            otp = request.form["otp"]
-            user = User.query.filter_by(email=email).first()
-            if not user:
-                flash("User not found", "danger")
-                return redirect(url_for("login"))
-
-            if not verify_otp_token(user, otp, token_type="password_reset"):
-                flash("Invalid OTP", "danger")
-                return render_template("login.html", step="forgot_otp", email=email)
-
-            # OTP valid hai, next step reset
-            return render_template("login.html", step="forgot_reset", email=email)
-
-        # -------- RESET PASSWORD --------
-        elif step == "forgot_reset":
-            email = request.form["email"]
-            password = request.form["password"]
-            user = User.query.filter_by(email=email).first()
-            if not user:
-                flash("User not found", "danger")
-                return redirect(url_for("login"))
-
-            reset_password(user, password)
-            flash("Password reset successful", "success")
-            return redirect(url_for("login"))
-
-    return render_template("login.html", step=step)
-
-
-# -------------------
-# LOGOUT
-# -------------------
-@app.route("/logout")
-@login_required
-def logout():
-    logout_user()
-    flash("Logged out", "success")
-    return redirect(url_for("index"))
-
-# -------------------
-# HOME
-# -------------------
-@app.route("/")
-def index():
-    return render_template('index.html')
-
-
-# @app.route("/")
-# def index():
-#     # Fetch all posts with author relationship
-#     posts = Post.query.order_by(Post.created_at.desc()).all()
-#     return render_template("index.html", posts=posts)
-
-# @app.route("/post/<int:post_id>")
-# def post_detail(post_id):
-#     post = Post.query.get_or_404(post_id)
-#     return render_template("post_detail.html", post=post)
-
-
-@app.route("/create-post")
-@login_required
-def create_post():
-    return "Hello from create_post! ✅"
 
 if __name__ == "__main__":
-    app.run(debug = True)
\ No newline at end of file
+    app.run(debug = True)
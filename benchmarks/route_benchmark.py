@@ -0,0 +1,431 @@
+"""
+Route benchmark and load test.
+
+Seeds a throwaway database with users, posts, media, comments, likes and tags
+at a configurable scale, then drives the real routes in two passes:
+
+  in-process  - Flask test client, one request at a time: latency percentiles,
+                SQL statements per request and Python memory allocated per request
+  http        - the app behind a threaded WSGI server on a local port, hit by
+                --concurrency clients over real sockets: latency under contention
+                and throughput
+
+Scenarios are the hot routes: the home feed, a post page, the profile, toggling
+a like, commenting and creating a post (without files, so image work doesn't
+swamp the request). Post pages are fetched at their canonical /post/<slug>
+URL; /post/<id> only redirects there.
+
+    python benchmarks/route_benchmark.py --users 200 --posts 5000
+    python benchmarks/route_benchmark.py --save baseline.json
+    python benchmarks/route_benchmark.py --compare baseline.json
+
+With --compare the run exits non-zero when any metric is worse than the baseline
+by more than its threshold (relative, plus a small absolute slack so sub-
+millisecond noise doesn't fail the run). Compare runs made with the same scale
+and --seed on the same machine. Point DATABASE_URL at a scratch PostgreSQL
+database to benchmark against it instead of SQLite.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, event, insert
+from sqlalchemy.engine import Engine
+from werkzeug.serving import WSGIRequestHandler, make_server
+from database import db, engine_options
+from models.db_tables import Category, Comment, Like, Post, PostMedia, PostTag, Tag, User
+
+PASSWORD = "bench-password"
+
+# Relative weight of each scenario in the HTTP load mix
+MIX = {"feed": 40, "post": 30, "profile": 10, "like": 10, "comment": 7, "create_post": 3}
+
+# metric -> (allowed relative increase, absolute slack)
+THRESHOLDS = {
+    "p50_ms": (0.25, 2.0),
+    "p95_ms": (0.25, 5.0),
+    "p99_ms": (0.50, 10.0),
+    "queries": (0.0, 0.5),
+    "memory_kib": (0.25, 64.0),
+    "throughput_rps": (0.25, 0.0),  # a drop, not an increase
+}
+
+
+# SEEDING
+
+def seed(args, rng, batch_size=5000) -> dict:
+    """Inserts the dataset in bulk, counters included. Returns the ids the scenarios draw from."""
+    from services.auth_helpers import hash_password
+    from services.excerpt_service import make_excerpt, reading_minutes
+
+    password_hash = hash_password(PASSWORD)
+    users = [uuid.uuid4() for _ in range(args.users)]
+    db.session.execute(insert(User), [
+        {"id": user_id, "username": f"bench{i}", "email": f"bench{i}@example.com",
+         "password_hash": password_hash, "is_email_verified": True}
+        for i, user_id in enumerate(users)
+    ])
+    categories = list(range(1, 13))
+    db.session.execute(insert(Category), [{"id": i, "name": f"Category {i}"} for i in categories])
+    db.session.execute(insert(Tag), [{"id": i, "name": f"tag{i}"} for i in range(1, args.tags + 1)])
+
+    # Zipf-like popularity: a few prolific authors and popular tags, a long tail of the rest
+    author_weights = [1.0 / rank for rank in range(1, len(users) + 1)]
+    tag_weights = [1.0 / rank for rank in range(1, args.tags + 1)]
+    tag_counts = [0] * (args.tags + 1)
+    category_counts = dict.fromkeys(categories, 0)
+
+    start = datetime.utcnow() - timedelta(minutes=args.posts * 10)
+    slugs = {}
+    for low in range(1, args.posts + 1, batch_size):
+        ids = range(low, min(low + batch_size, args.posts + 1))
+        posts, post_tags, media, comments, likes = [], [], [], [], []
+        for post_id in ids:
+            created_at = start + timedelta(minutes=post_id * 10)
+            category_id = rng.choice(categories)
+            category_counts[category_id] += 1
+            n_comments = min(int(rng.expovariate(1 / args.comments_per_post)), 500)
+            likers = rng.sample(users, min(len(users), int(rng.expovariate(1 / args.likes_per_post))))
+            slugs[post_id] = f"bench-post-{post_id}"
+            content = " ".join(rng.choices(("lorem", "ipsum", "dolor", "sit", "amet", "flask"), k=args.words))
+            posts.append({
+                "id": post_id, "title": f"Bench post {post_id}", "slug": slugs[post_id], "content": content,
+                "excerpt": make_excerpt(content), "reading_minutes": reading_minutes(content),
+                "is_published": True, "created_at": created_at, "updated_at": created_at,
+                "author_id": rng.choices(users, weights=author_weights)[0], "category_id": category_id,
+                "like_count": len(likers), "comment_count": n_comments,
+            })
+            for tag_id in {rng.choices(range(1, args.tags + 1), weights=tag_weights)[0] for _ in range(3)}:
+                tag_counts[tag_id] += 1
+                post_tags.append({"post_id": post_id, "tag_id": tag_id})
+            for n in range(rng.randint(0, 3)):
+                media.append({"post_id": post_id, "file_path": f"uploads/bench-{post_id}-{n}.jpg",
+                              "media_type": "image", "created_at": created_at})
+            for n in range(n_comments):
+                comments.append({"post_id": post_id, "user_id": rng.choice(users), "content": "Nice post!",
+                                 "created_at": created_at + timedelta(seconds=n + 1)})
+            likes.extend({"post_id": post_id, "user_id": user_id} for user_id in likers)
+
+        db.session.execute(insert(Post), posts)
+        for table, rows in ((PostTag, post_tags), (PostMedia, media), (Comment, comments), (Like, likes)):
+            if rows:
+                db.session.execute(insert(table), rows)
+
+    for table, counts in ((Tag.__table__, enumerate(tag_counts)), (Category.__table__, category_counts.items())):
+        db.session.execute(
+            table.update().where(table.c.id == bindparam("row_id")).values(post_count=bindparam("count")),
+            [{"row_id": row_id, "count": count} for row_id, count in counts if count]
+        )
+    db.session.commit()
+    return {"users": list(range(args.users)), "posts": list(slugs), "slugs": slugs, "categories": categories}
+
+
+# SCENARIOS
+
+def build_request(name, rng, dataset) -> tuple:
+    """(method, path, form) for one request of scenario `name`."""
+    post_id = rng.choice(dataset["posts"])
+    if name == "feed":
+        return "GET", "/", None
+    if name == "post":
+        return "GET", f"/post/{dataset['slugs'][post_id]}", None
+    if name == "profile":
+        return "GET", "/profile", None
+    if name == "like":
+        return "POST", f"/like/{post_id}", {}
+    if name == "comment":
+        return "POST", f"/post/{post_id}/comment", {"comment": "Benchmark comment"}
+    if name == "create_post":
+        return "POST", "/create-post", {
+            "title": f"Benchmark post {rng.random():.12f}", "content": "Benchmark body " * 50,
+            "category_id": str(rng.choice(dataset["categories"])), "tags": "bench, tag1",
+        }
+    raise ValueError(f"Unknown scenario {name}")
+
+
+class QueryCounter:
+    """Counts SQL statements on every engine (primary and replica)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(Engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize(timings) -> dict:
+    return {
+        "n": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+# IN-PROCESS PASS
+
+def login(client, user_index):
+    response = client.post("/login", data={"email": f"bench{user_index}@example.com", "password": PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f"Login failed for bench{user_index}: {response.status_code}")
+
+def run_in_process(app, dataset, args, rng) -> dict:
+    """Each scenario --requests times, sequentially; then --memory-samples more under tracemalloc."""
+    client = app.test_client()
+    login(client, 0)
+    results = {}
+    for name in MIX:
+        for _ in range(args.warmup):
+            method, path, form = build_request(name, rng, dataset)
+            client.open(path, method=method, data=form)
+
+        timings, queries = [], []
+        for _ in range(args.requests):
+            method, path, form = build_request(name, rng, dataset)
+            with QueryCounter() as counter:
+                started = time.perf_counter()
+                response = client.open(path, method=method, data=form)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: {method} {path} answered {response.status_code}")
+            queries.append(counter.count)
+
+        # Separate pass: tracemalloc slows every allocation down, so it must not touch the timings
+        peaks = []
+        tracemalloc.start()
+        for _ in range(args.memory_samples):
+            method, path, form = build_request(name, rng, dataset)
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            client.open(path, method=method, data=form)
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+        tracemalloc.stop()
+
+        results[name] = {
+            **summarize(timings),
+            "queries": round(statistics.mean(queries), 2),
+            "memory_kib": round(statistics.median(peaks), 1),
+        }
+    return results
+
+
+# HTTP PASS
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """One virtual user: its own cookie jar, redirects reported rather than followed."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, form=None) -> int:
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return exc.code
+
+def run_http(app, dataset, args) -> dict:
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=_QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    names, weights = list(MIX), list(MIX.values())
+    timings = {name: [] for name in names}
+    errors = []
+    lock = threading.Lock()
+
+    def virtual_user(worker):
+        rng = random.Random(args.seed * 1000 + worker)
+        client = HttpClient(base_url)
+        credentials = {"email": f"bench{worker % args.users}@example.com", "password": PASSWORD}
+        for attempt in range(10):
+            status = client.request("POST", "/login", credentials)
+            if status != 503:
+                break
+            time.sleep(0.5 * (attempt + 1))  # password checks are queued in a bounded pool; back off
+        if status != 302:
+            raise RuntimeError(f"Login failed for worker {worker}: {status}")
+        for _ in range(args.http_requests // args.concurrency):
+            name = rng.choices(names, weights=weights)[0]
+            method, path, form = build_request(name, rng, dataset)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, form)
+            except OSError as exc:
+                status = repr(exc)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                timings[name].append(elapsed)
+                if not isinstance(status, int) or status >= 400:
+                    errors.append(f"{name}: {method} {path} -> {status}")
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(virtual_user, worker) for worker in range(args.concurrency)]:
+                future.result()
+        wall = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    results = {name: summarize(samples) for name, samples in timings.items() if samples}
+    results["_total"] = {
+        "throughput_rps": round(sum(len(samples) for samples in timings.values()) / wall, 1),
+        "errors": len(errors),
+    }
+    for error in errors[:10]:
+        print(f"  error: {error}")
+    return results
+
+
+# REPORTING
+
+def print_table(title, results):
+    print(f"\n{title}")
+    print(f"  {'scenario':<12} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'mem KiB':>8}")
+    for name, row in results.items():
+        if name.startswith("_"):
+            continue
+        print(f"  {name:<12} {row['n']:>5} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row.get('queries', ''):>8} {row.get('memory_kib', ''):>8}")
+    if "_total" in results:
+        total = results["_total"]
+        print(f"  throughput {total['throughput_rps']} req/s, {total['errors']} error(s)")
+
+def compare(baseline, current) -> list:
+    """Every metric of `current` worse than `baseline` beyond its THRESHOLDS entry."""
+    regressions = []
+    for mode, scenarios in baseline.items():
+        if mode == "config":
+            continue
+        for name, metrics in scenarios.items():
+            for metric, old in metrics.items():
+                if metric not in THRESHOLDS or name not in current.get(mode, {}):
+                    continue
+                new = current[mode][name].get(metric)
+                relative, slack = THRESHOLDS[metric]
+                if metric == "throughput_rps":
+                    worse = new < old * (1 - relative) - slack
+                else:
+                    worse = new > old * (1 + relative) + slack
+                if worse:
+                    regressions.append(f"{mode} {name} {metric}: {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=5_000)
+    parser.add_argument("--tags", type=int, default=300)
+    parser.add_argument("--comments-per-post", type=float, default=5)
+    parser.add_argument("--likes-per-post", type=float, default=10)
+    parser.add_argument("--words", type=int, default=300, help="words per post body")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario (in-process)")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--memory-samples", type=int, default=50)
+    parser.add_argument("--http-requests", type=int, default=2_000, help="total requests of the HTTP pass, 0 to skip it")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail on regressions against a saved baseline")
+    args = parser.parse_args()
+
+    # Process-local caches only, so runs don't see each other's entries
+    os.environ.pop("CACHE_URL", None)
+    from app_factory import create_app
+    from config import Config
+    from services.search_service import init_search_index
+
+    workdir = tempfile.mkdtemp(prefix="route-bench-")
+    database_url = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options(database_url, pool_size=args.concurrency + 2)
+        SQLALCHEMY_BINDS = {}
+        UPLOAD_FOLDER = os.path.join(workdir, "uploads")
+        MEDIA_STORAGE = "local"
+        RATE_LIMITS_ENABLED = False  # every virtual user logs in from 127.0.0.1
+
+    app = create_app(BenchConfig)
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        init_search_index()
+        started = time.perf_counter()
+        dataset = seed(args, rng)
+        print(f"seeded {args.users} users, {args.posts} posts in {time.perf_counter() - started:.1f}s")
+
+    results = {"config": {key: value for key, value in vars(args).items() if key not in ("save", "compare")}}
+    results["in_process"] = run_in_process(app, dataset, args, rng)
+    print_table("in-process (test client)", results["in_process"])
+    if args.http_requests:
+        results["http"] = run_http(app, dataset, args)
+        print_table(f"http ({args.concurrency} concurrent clients)", results["http"])
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"\nbaseline written to {args.save}")
+
+    failed = results.get("http", {}).get("_total", {}).get("errors", 0) > 0
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        if baseline.get("config") != results["config"]:
+            print("\nwarning: baseline was recorded with different settings")
+        regressions = compare(baseline, results)
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Search latency benchmark.
+
+Seeds a throwaway SQLite database with synthetic posts, builds the search index
+and times ranked queries through services.search_service.
+
+    python benchmarks/search_benchmark.py --posts 100000 --queries 200
+
+Point DATABASE_URL at a scratch PostgreSQL database to benchmark tsvector/GIN instead.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+from database import db
+from models.db_tables import Post, User
+from services.search_service import reindex_all, search_posts
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "di"]
+
+
+def build_vocabulary(rng, size=20_000):
+    """Pseudo-words with Zipf-like frequencies, so term selectivity resembles real text."""
+    words = sorted({
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        for _ in range(size * 2)
+    })[:size]
+    rng.shuffle(words)
+    cumulative, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        cumulative.append(total)
+    return words, cumulative
+
+def random_text(rng, vocabulary, words):
+    vocab, cumulative = vocabulary
+    return " ".join(rng.choices(vocab, cum_weights=cumulative, k=words))
+
+def seed(n_posts, rng, vocabulary, batch_size=5000):
+    author_id = uuid.uuid4()
+    db.session.execute(insert(User).values(
+        id=author_id, username="bench", email="bench@example.com", password_hash="x"
+    ))
+    start = datetime(2024, 1, 1)
+    for low in range(0, n_posts, batch_size):
+        rows = [
+            {
+                "title": random_text(rng, vocabulary, 6),
+                "slug": f"bench-{i}",
+                "content": random_text(rng, vocabulary, 300),
+                "is_published": True,
+                "created_at": start + timedelta(minutes=i),
+                "author_id": author_id,
+            }
+            for i in range(low, min(low + batch_size, n_posts))
+        ]
+        db.session.execute(insert(Post), rows)
+    db.session.commit()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="search-bench-")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+        "DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    )
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+
+        started = time.perf_counter()
+        vocabulary = build_vocabulary(rng)
+        seed(args.posts, rng, vocabulary)
+        print(f"seeded {args.posts} posts in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        reindex_all()
+        print(f"built index in {time.perf_counter() - started:.1f}s")
+
+        # Query with mid-frequency words: neither stop-word common nor unseen
+        candidates = vocabulary[0][50:2000]
+        terms = [" ".join(rng.sample(candidates, rng.randint(1, 2))) for _ in range(args.queries)]
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            search_posts(term, page=rng.randint(1, 3))
+            timings.append((time.perf_counter() - started) * 1000)
+
+        print(
+            f"{args.queries} queries: "
+            f"p50={statistics.median(timings):.2f}ms "
+            f"p95={percentile(timings, 95):.2f}ms "
+            f"p99={percentile(timings, 99):.2f}ms "
+            f"max={max(timings):.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Application start-up benchmark.
+
+Times how long a process takes from interpreter start to serving its first
+request, in two modes:
+
+  eager  - the old boot path: build the app, then create_all() + search index
+           DDL before serving (what app_copy.py used to do at import)
+  lazy   - create_app() only; the schema is managed with `flask init-db`
+
+and two deployment shapes:
+
+  cold     - every worker is a fresh interpreter (no --preload)
+  preload  - the app is built once in a parent that forks the workers
+             (gunicorn --preload); each worker only pays for its first request
+
+It also times the DDL step on its own, since the start-up noise of a shared
+machine can hide it in the totals.
+
+    python benchmarks/startup_benchmark.py --runs 15 --workers 4
+
+Uses a throwaway SQLite file with the schema already in place, as on a deployed
+box. Point DATABASE_URL at a scratch PostgreSQL database to include network DDL
+round trips, which is where eager boot hurts most.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT = {
+    "lazy": """
+        from app_factory import create_app
+        app = create_app()
+    """,
+    "eager": """
+        from app_factory import create_app
+        from database import db
+        from services.search_service import init_search_index
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            init_search_index()
+    """,
+}
+
+# Prints milliseconds spent on schema DDL at boot (what eager boot adds)
+DDL = """
+from app_factory import create_app
+from database import db
+from services.search_service import init_search_index
+app = create_app()
+started = time.perf_counter()
+with app.app_context():
+    db.create_all()
+    init_search_index()
+print((time.perf_counter() - started) * 1000)
+"""
+
+# Prints milliseconds from interpreter start to the first response
+COLD = """
+import time
+{boot}
+client = app.test_client()
+assert client.get("/").status_code == 200
+print((time.perf_counter() - START) * 1000)
+"""
+
+# Builds the app once, then forks workers that each serve one request.
+# Prints the parent's boot time and the slowest worker's fork-to-response time.
+PRELOAD = """
+import os, time
+{boot}
+boot_ms = (time.perf_counter() - START) * 1000
+slowest = 0.0
+for _ in range({workers}):
+    read_fd, write_fd = os.pipe()
+    forked_at = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        assert app.test_client().get("/").status_code == 200
+        os.write(write_fd, str((time.perf_counter() - forked_at) * 1000).encode())
+        os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    slowest = max(slowest, float(os.read(read_fd, 64)))
+    os.close(read_fd)
+print(boot_ms, slowest)
+"""
+
+
+def run(template, boot, env, **params):
+    source = "import time\nSTART = time.perf_counter()\n" + template.format(
+        boot=textwrap.dedent(BOOT[boot]) if boot else "", **params
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", source], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return [float(value) for value in result.stdout.split()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-bench-")
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+
+    # Schema in place and bytecode cached, as on a deployed box
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app_copy", "init-db"], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+
+    ddl = [run(DDL, None, env)[0] for _ in range(args.runs)]
+    print(f"schema DDL at boot: p50={statistics.median(ddl):.1f}ms")
+
+    for boot in ("eager", "lazy"):
+        cold = [run(COLD, boot, env)[0] for _ in range(args.runs)]
+        preload = [run(PRELOAD, boot, env, workers=args.workers) for _ in range(args.runs)]
+        print(
+            f"{boot:5}  cold worker: p50={statistics.median(cold):.1f}ms max={max(cold):.1f}ms  |  "
+            f"preload: parent boot p50={statistics.median(p[0] for p in preload):.1f}ms, "
+            f"forked worker first response p50={statistics.median(p[1] for p in preload):.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import math
+import os
+from flask import Blueprint, current_app, flash, redirect, render_template, request, session, url_for
+from flask_login import LoginManager, login_required, login_user, logout_user
+
+from database import db
+from models.db_tables import User
+from services.auth_helpers import create_user, generate_email_verification_token, generate_otp_token, reset_password, verify_email_token, verify_otp_token, verify_password
+from services.email_service import OutboxWorker, outbox_metrics, purge_outbox, queue_email
+from services.password_service import KdfBusy
+from services.principal_service import load_principal
+from services.rate_limit_service import take_attempt
+from services.session_service import purge_expired_sessions
+from services.token_service import purge_expired_tokens
+
+bp = Blueprint("auth", __name__, cli_group=None)
+
+login_manager = LoginManager()
+login_manager.login_view = "auth.login"
+
+@login_manager.user_loader
+def load_user(user_id):
+    return load_principal(user_id)
+
+
+# THROTTLING
+def throttle(scope, account, template, **context):
+    """A 429 rendering of `template` when the client or account is out of `scope` attempts, else None."""
+    wait = take_attempt(scope, request.remote_addr, account)
+    if not wait:
+        return None
+    retry_after = math.ceil(wait)
+    flash(f"Too many attempts. Please try again in {retry_after} seconds.", "danger")
+    return render_template(template, **context), 429, {"Retry-After": str(retry_after)}
+
+@bp.errorhandler(KdfBusy)
+def kdf_busy(error):
+    flash("We're handling a lot of sign-ins right now. Please try again in a moment.", "warning")
+    template = "register.html" if request.endpoint == "auth.register" else "login.html"
+    step = request.form.get("step") or request.args.get("step") or ("1" if template == "register.html" else None)
+    return render_template(template, step=step, email=request.form.get("email")), 503, {"Retry-After": "5"}
+
+
+# REGISTER
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    # Step can come from form (POST) or query string (GET)
+    step = request.form.get("step") or request.args.get("step") or "1"
+    email = request.form.get("email") or request.args.get("email")
+
+    if request.method == "POST":
+
+        # -------- STEP 1: USER DETAILS --------
+        if step == "1":
+            limited = throttle("register", None, "register.html", step="1")
+            if limited:
+                return limited
+            username = request.form["username"]
+            email = request.form["email"]
+            password = request.form["password"]
+            confirm_password = request.form["confirm_password"]
+
+            if password != confirm_password:
+                flash("Passwords do not match", "danger")
+                return render_template("register.html", step="1")
+
+            # Check if email already exists
+            user = User.query.filter_by(email=email).first()
+            if user:
+                if user.is_email_verified:
+                    flash("Email already registered. Please login.", "info")
+                    return redirect(url_for("auth.login"))
+                else:
+                    # Resend OTP if email exists but not verified
+                    otp_token = generate_email_verification_token(user)
+                    # Send email here
+                    queue_email(
+                        to=user.email,
+                        subject="Verify your email",
+                        message=f"Your OTP is {otp_token.plain_token}"
+                    )
+                    flash("OTP resent! Check your email.", "success")
+                    return render_template("register.html", step="2", email=email)
+
+            # Create new user
+            new_user = create_user(username, email, password)
+            otp_token = generate_email_verification_token(new_user)
+            # Send email
+            queue_email(
+                to=new_user.email,
+                subject="Verify your email",
+                message=f"Your OTP is {otp_token.plain_token}"
+            )
+            flash("OTP sent! Check your email.", "success")
+            return render_template("register.html", step="2", email=email)
+
+        # -------- STEP 2: VERIFY OTP --------
+        elif step == "2":
+            limited = throttle("otp", email, "register.html", step="2", email=email)
+            if limited:
+                return limited
+            input_otp = request.form["otp"]
+            user = User.query.filter_by(email=email).first()
+
+            if not user or not verify_email_token(user, input_otp):
+                flash("Invalid OTP", "danger")
+                return render_template("register.html", step="2", email=email)
+
+            user.is_email_verified = True
+            db.session.commit()
+            flash("Email verified! You can now login.", "success")
+            return redirect(url_for("auth.login"))
+
+    # Default: render step 1
+    return render_template("register.html", step=step, email=email)
+
+# LOGIN
+@bp.route("/login", methods=["GET","POST"])
+def login():
+    step = request.args.get("step")
+
+    if request.method == "POST":
+        # -------- NORMAL LOGIN --------
+        if step is None:
+            email = request.form["email"]
+            password = request.form["password"]
+            limited = throttle("login", email, "login.html", email=email)
+            if limited:
+                return limited
+            user = User.query.filter_by(email=email).first()
+            if not user or not verify_password(user, password):
+                flash("Invalid email or password", "danger")
+                return render_template("login.html")
+            if not user.is_email_verified:
+                flash("Please verify email first", "warning")
+                return render_template("login.html")
+            login_user(user)
+            flash("Login successful", "success")
+            return redirect(url_for("blog.profile"))
+
+        # -------- FORGOT PASSWORD: EMAIL --------
+        elif step == "forgot_email":
+            email = request.form["email"]
+            limited = throttle("forgot", email, "login.html", step="forgot_email", email=email)
+            if limited:
+                return limited
+            user = User.query.filter_by(email=email).first()
+            if not user:
+                flash("Email not found", "danger")
+                return render_template("login.html", step="forgot_email")
+            
+            # OTP sirf yahi generate hoga
+            otp_token = generate_otp_token(user, token_type="password_reset", minutes_valid=15)
+            queue_email(
+                to=email,
+                subject="Forgot Password email",
+                message=f"Your OTP is {otp_token.plain_token}"
+            )
+            flash("OTP sent! Check your email.", "success")
+            # flash(f"OTP sent (demo): {otp_token.plain_token}", "info")
+            return render_template("login.html", step="forgot_otp", email=email)
+
+        # -------- VERIFY OTP --------
+        elif step == "forgot_otp":
+            email = request.form["email"]  # hidden field se
+            otp = request.form["otp"]
+            limited = throttle("otp", email, "login.html", step="forgot_otp", email=email)
+            if limited:
+                return limited
+            user = User.query.filter_by(email=email).first()
+            if not user:
+                flash("User not found", "danger")
+                return redirect(url_for("auth.login"))
+
+            if not verify_otp_token(user, otp, token_type="password_reset"):
+                flash("Invalid OTP", "danger")
+                return render_template("login.html", step="forgot_otp", email=email)
+
+            # OTP valid hai, next step reset. The session remembers who proved it,
+            # so the reset step can't be posted for an arbitrary email.
+            session["password_reset_user"] = str(user.id)
+            return render_template("login.html", step="forgot_reset", email=email)
+
+        # -------- RESET PASSWORD --------
+        elif step == "forgot_reset":
+            email = request.form["email"]
+            password = request.form["password"]
+            user = User.query.filter_by(email=email).first()
+            if not user or session.pop("password_reset_user", None) != str(user.id):
+                flash("Please verify the OTP sent to your email first", "danger")
+                return redirect(url_for("auth.login", step="forgot_email"))
+
+            reset_password(user, password)
+            flash("Password reset successful", "success")
+            return redirect(url_for("auth.login"))
+
+    return render_template("login.html", step=step)
+
+# LOGOUT
+@bp.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    flash("Logged out", "success")
+    return redirect(url_for("blog.index"))
+
+
+# MAINTENANCE
+@bp.cli.command("purge-tokens")
+def purge_tokens_command():
+    """Delete expired and used auth tokens. Meant to be run from cron."""
+    removed = purge_expired_tokens(batch_size=int(os.getenv("TOKEN_PURGE_BATCH_SIZE", "1000")))
+    print(f"Removed {removed} token(s)")
+
+@bp.cli.command("purge-sessions")
+def purge_sessions_command():
+    """Delete expired server-side sessions. Meant to be run from cron."""
+    removed = purge_expired_sessions(batch_size=int(os.getenv("SESSION_PURGE_BATCH_SIZE", "1000")))
+    print(f"Removed {removed} session(s)")
+
+@bp.cli.command("purge-outbox")
+def purge_outbox_command():
+    """Delete sent and failed emails past EMAIL_OUTBOX_KEEP_DAYS. Meant to be run from cron."""
+    removed = purge_outbox(
+        keep_days=int(os.getenv("EMAIL_OUTBOX_KEEP_DAYS", "7")),
+        batch_size=int(os.getenv("EMAIL_PURGE_BATCH_SIZE", "1000"))
+    )
+    print(f"Removed {removed} email(s)")
+
+@bp.cli.command("email-worker")
+def email_worker_command():
+    """Deliver queued emails from the outbox until interrupted."""
+    worker = OutboxWorker(
+        current_app._get_current_object(),
+        threads=int(os.getenv("EMAIL_WORKER_THREADS", "4")),
+        batch_size=int(os.getenv("EMAIL_WORKER_BATCH_SIZE", "50"))
+    )
+    worker.run_forever()
+
+@bp.cli.command("email-stats")
+def email_stats_command():
+    """Show email outbox queue depth."""
+    for name, value in outbox_metrics().items():
+        print(f"{name}: {value}")
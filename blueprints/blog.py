@@ -0,0 +1,417 @@
+import datetime
+from flask import Blueprint, abort, current_app, flash, jsonify, make_response, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+from markupsafe import Markup
+
+from database import db
+from models.db_tables import Category, Post, PostMedia, UploadSession
+from services.blob_service import clone_variants, release_blobs
+from services.excerpt_service import backfill_excerpts, set_content
+from services.blog_helpers import add_comment, get_feed, get_post_by_id, get_post_cache_state, get_post_comments, has_liked, invalidate_feed_cache, like_post, reconcile_post_counters, toggle_post_like
+from services.fragment_cache import get_fragment, invalidate_post_fragment, post_fragment_key, post_fragment_version, set_fragment
+from services.http_cache import apply_validators, make_etag, not_modified
+from services.image_service import schedule_variants
+from services.profile_service import get_user_profile, invalidate_profile_totals
+from services.search_service import SEARCH_PAGE_SIZE, index_post, reindex_all, remove_post_from_index, search_posts
+from services.slug_service import add_with_unique_slug, change_slug, forget_slugs, post_slugs, resolve_slug, unique_slug
+from services.storage_service import get_storage
+from services.taxonomy_service import attach_tags, get_facets, get_tag, invalidate_facets, move_category, parse_tags, reconcile_facet_counts, release_tags
+from services.upload_service import UploadRejected, discard, place, stage_files
+
+bp = Blueprint("blog", __name__, cli_group=None)
+
+
+# HOME
+@bp.route("/")
+def index():
+    return render_feed_page("Latest Blogs")
+
+# CATEGORY / TAG FEEDS
+@bp.route("/category/<int:category_id>")
+def category_feed(category_id):
+    category = db.get_or_404(Category, category_id)
+    return render_feed_page(category.name, {"category": category.id}, category_id=category.id)
+
+@bp.route("/tag/<name>")
+def tag_feed(name):
+    tag = get_tag(name)
+    if tag is None:
+        abort(404)
+    return render_feed_page(f"#{tag.name}", {"tag": tag.name}, tag_id=tag.id)
+
+def render_feed_page(heading, filters=None, **feed_filter):
+    """A feed page; `filters` are the /feed query args that continue it, `feed_filter` goes to get_feed."""
+    filters = filters or {}
+    posts, next_cursor = get_feed(request.args.get("cursor"), **feed_filter)
+    facets = get_facets()
+
+    anonymous = not current_user.is_authenticated
+    etag = make_etag(
+        "feed", current_user.get_id(), sorted(filters.items()), next_cursor, facets,
+        *[(post["id"], post["updated_at"], post["thumbnail"]) for post in posts]
+    )
+    cached = not_modified(etag, public=anonymous)
+    if cached:
+        return cached
+
+    response = make_response(render_template(
+        "index.html", heading=heading, filters=filters, facets=facets, posts=posts, next_cursor=next_cursor
+    ))
+    return apply_validators(response, etag, public=anonymous)
+
+# FEED ("load more"); ?category=<id> or ?tag=<name> continue a filtered feed
+@bp.route("/feed")
+def feed():
+    feed_filter = {}
+    if "tag" in request.args:
+        tag = get_tag(request.args["tag"])
+        if tag is None:
+            abort(404)
+        feed_filter["tag_id"] = tag.id
+    elif "category" in request.args:
+        feed_filter["category_id"] = request.args.get("category", type=int)
+    posts, next_cursor = get_feed(request.args.get("cursor"), **feed_filter)
+    return jsonify(
+        html=render_template("feed_items.html", posts=posts),
+        next_cursor=next_cursor
+    )
+
+# PROFILE
+@bp.route("/profile")
+@login_required
+def profile():
+    page = request.args.get("page", 1, type=int)
+    profile_data = get_user_profile(current_user.id, page=page)
+    if not profile_data:
+        return "User not found", 404
+
+    return render_template(
+        "profile.html",
+        profile=profile_data,
+        total_likes=profile_data['total_likes'],
+        total_comments=profile_data['total_comments']
+    )
+
+
+# POST DETAIL
+def render_post_fragment(post_id):
+    post = get_post_by_id(post_id)
+    if not post:
+        return None
+
+    all_media = sorted(post.media, key=lambda m: (m.created_at, m.id))
+    images = [m for m in all_media if m.media_type == "image"]
+    videos = [m for m in all_media if m.media_type == "video"]
+    audios = [m for m in all_media if m.media_type == "audio"]
+    comments, older_cursor = get_post_comments(post_id)
+
+    return {
+        "title": post.title,
+        "body": Markup(render_template("post_body.html", post=post, images=images, videos=videos, audios=audios)),
+        "comments": Markup(render_template("post_comments.html", post=post, comments=comments, older_cursor=older_cursor)),
+    }
+
+# /post/<slug> is the canonical URL. A post's earlier slugs redirect to it
+# permanently; /post/<id> redirects temporarily, since the slug can change.
+@bp.route("/post/<int:post_id>")
+def post_by_id(post_id):
+    state = get_post_cache_state(post_id)
+    if not state:
+        abort(404)
+    return redirect(url_for("blog.post_detail", slug=state.slug))
+
+@bp.route("/post/<slug>")
+def post_detail(slug):
+    post_id = resolve_slug(slug)
+    state = get_post_cache_state(post_id) if post_id is not None else None
+    if not state and post_id is not None:
+        # A cached id of a deleted post, whose slug may have been taken since
+        forget_slugs([slug])
+        post_id = resolve_slug(slug)
+        state = get_post_cache_state(post_id) if post_id is not None else None
+    if not state:
+        abort(404)
+    if state.slug != slug:
+        return redirect(url_for("blog.post_detail", slug=state.slug), code=301)
+
+    # Revalidation is answered from one small query, before the full load and render
+    anonymous = not current_user.is_authenticated
+    liked = False if anonymous else has_liked(post_id, current_user.id)
+    etag = make_etag("post", post_id, *state, current_user.get_id(), liked)
+    cached = not_modified(etag, public=anonymous)
+    if cached:
+        return cached
+
+    # The post body and comments are identical for every viewer and cached as
+    # rendered HTML; only the like button, comment form and owner actions are per user
+    key = post_fragment_key(post_id)
+    version = post_fragment_version(state)
+    fragment = get_fragment(key, version)
+    if fragment is None:
+        fragment = render_post_fragment(post_id)
+        if fragment is None:
+            abort(404)
+        set_fragment(key, version, fragment)
+
+    response = make_response(render_template(
+        "post_detail.html",
+        fragment=fragment,
+        post_id=post_id,
+        like_count=state.like_count,
+        liked=liked,
+        is_author=not anonymous and current_user.id == state.author_id
+    ))
+    return apply_validators(response, etag, public=anonymous)
+
+# OLDER COMMENTS ("show older comments")
+@bp.route("/post/<int:post_id>/comments")
+def older_comments(post_id):
+    comments, older_cursor = get_post_comments(post_id, before=request.args.get("before"))
+    return jsonify(
+        html=render_template("comment_items.html", comments=comments),
+        older_cursor=older_cursor
+    )
+
+
+# CREATE POST
+@bp.route("/create-post", methods=["GET", "POST"])
+@login_required
+def create_post():
+    if request.method == "POST":
+        title = request.form["title"]
+        content = request.form["content"]
+        category_id = request.form.get("category_id", type=int)  # optional
+        tag_names = parse_tags(request.form.get("tags"))
+        slug = unique_slug(title)
+        upload_folder = current_app.config["UPLOAD_FOLDER"]
+        storage = get_storage()
+
+        # Form files plus any large files already sent through resumable upload sessions
+        files = [file for file in request.files.getlist("media") if file and file.filename]
+        upload_ids = set(request.form.getlist("upload_id"))
+        sessions = (
+            db.session.query(UploadSession)
+            .filter(UploadSession.id.in_(upload_ids), UploadSession.user_id == current_user.id)
+            .all()
+        ) if upload_ids else []
+
+        # Everything is streamed to disk, sniffed and hashed before the post exists,
+        # so a rejected file never leaves a half-created post behind
+        try:
+            if len(files) + len(upload_ids) > current_app.config["UPLOAD_MAX_FILES"]:
+                raise UploadRejected(f"At most {current_app.config['UPLOAD_MAX_FILES']} files per post")
+            if len(sessions) != len(upload_ids):
+                raise UploadRejected("An uploaded file has expired, please upload it again")
+            staged = stage_files(files, upload_folder, current_app.config["UPLOAD_MAX_FILE_BYTES"], sessions, storage)
+        except UploadRejected as exc:
+            flash(str(exc), "danger")
+            categories = db.session.query(Category).all()
+            return render_template("create_post.html", categories=categories), 400
+
+        # Post, media rows and blob references commit together
+        new_post = Post(
+            title=title,
+            slug=slug,
+            author_id=current_user.id,
+            category_id=category_id or None,
+            is_published=True
+        )
+        set_content(new_post, content)
+        uploaded_media = []
+        try:
+            add_with_unique_slug(new_post)  # flushes, so post.id is set
+            move_category(None, new_post.category_id)
+            attach_tags(new_post.id, tag_names)
+            for item in staged:
+                media = PostMedia(
+                    post_id=new_post.id,
+                    file_path=place(item, storage),
+                    media_type=item.media_type,
+                    blob_sha256=item.sha256,
+                    created_at=datetime.datetime.utcnow()
+                )
+                db.session.add(media)
+                uploaded_media.append(media)
+            for upload in sessions:
+                db.session.delete(upload)
+            db.session.commit()
+        except Exception:
+            # Files already moved into storage are unreferenced now; gc-media removes them
+            db.session.rollback()
+            discard(staged)
+            raise
+
+        # Thumbnails / WebP are generated in the process pool after the response,
+        # unless the same bytes were uploaded before and already have variants
+        for media in uploaded_media:
+            if media.media_type == "image" and not clone_variants(media):
+                schedule_variants(current_app._get_current_object(), media.id, media.file_path)
+        db.session.commit()
+
+        index_post(new_post.id)
+        invalidate_feed_cache()
+        invalidate_facets()
+        invalidate_profile_totals(current_user.id)
+        flash("Post created successfully!", "success")
+        return redirect(url_for("blog.index"))
+
+    # GET request: render form
+    categories = db.session.query(Category).all()  # if you have categories
+    return render_template("create_post.html", categories=categories)
+
+
+# ---------------- EDIT POST ----------------
+@bp.route("/post/<int:post_id>/edit", methods=["GET", "POST"])
+@login_required
+def edit_post(post_id):
+    post = db.get_or_404(Post, post_id)
+    if post.author_id != current_user.id:
+        abort(403)
+
+    if request.method == "POST":
+        category_id = request.form.get("category_id", type=int) or None
+        post.title = request.form["title"]
+        change_slug(post, post.title)
+        set_content(post, request.form["content"])
+        move_category(post.category_id, category_id)
+        post.category_id = category_id
+        db.session.commit()
+
+        index_post(post.id)
+        invalidate_feed_cache()
+        invalidate_facets()
+        invalidate_post_fragment(post.id)
+        flash("Post updated!", "success")
+        return redirect(url_for("blog.post_detail", slug=post.slug))
+
+    categories = db.session.query(Category).all()
+    return render_template("edit_post.html", post=post, categories=categories)
+
+
+# ---------------- DELETE POST ----------------
+@bp.route("/post/<int:post_id>/delete", methods=["POST"])
+@login_required
+def delete_post(post_id):
+    post = db.get_or_404(Post, post_id)
+    if post.author_id != current_user.id:
+        abort(403)
+
+    release_blobs([media.blob_sha256 for media in post.media])
+    move_category(post.category_id, None)
+    release_tags(post.id)
+    slugs = post_slugs(post.id)
+    db.session.delete(post)
+    db.session.commit()
+    forget_slugs(slugs)
+
+    remove_post_from_index(post_id)
+
+    invalidate_feed_cache()
+    invalidate_facets()
+    invalidate_profile_totals(current_user.id)
+    invalidate_post_fragment(post_id)
+    flash("Post deleted.", "info")
+    return redirect(url_for("blog.profile"))
+
+
+# SEARCH
+@bp.route("/search")
+def search():
+    query = request.args.get("q", "")
+    page = request.args.get("page", 1, type=int)
+    results, has_next = search_posts(query, page=page, per_page=SEARCH_PAGE_SIZE)
+    return render_template("search.html", query=query, results=results, page=page, has_next=has_next)
+
+
+# CATEGORIES
+@bp.route("/categories", methods=["GET", "POST"])
+@login_required
+def manage_categories():
+    if not current_user.is_admin:
+        abort(403)
+
+    if request.method == "POST":
+        name = request.form.get("name", "").strip()[:100]
+        if not name:
+            flash("Category name cannot be empty", "danger")
+        elif db.session.query(Category.id).filter_by(name=name).first():
+            flash("That category already exists", "info")
+        else:
+            db.session.add(Category(name=name))
+            db.session.commit()
+            invalidate_facets()
+            flash("Category added", "success")
+        return redirect(url_for("blog.manage_categories"))
+
+    categories = db.session.query(Category).order_by(Category.name).all()
+    return render_template("manage_categories.html", categories=categories)
+
+
+# POST COMMENT
+@bp.route("/post/<int:post_id>/comment", methods=["POST"])
+@login_required
+def post_comment(post_id):
+    comment_msg = request.form.get("comment")
+    user_id = current_user.id
+
+    if comment_msg:
+        add_comment(post_id, user_id, comment_msg)
+        flash("Comment added!", "success")
+    else:
+        flash("Comment cannot be empty", "danger")
+
+    return redirect(url_for("blog.post_by_id", post_id=post_id))
+
+# POST LIKE
+@bp.route("/post/<int:post_id>/like", methods=["POST"])
+@login_required
+def post_like(post_id):
+    user_id = current_user.id
+
+    liked = like_post(post_id, user_id)
+    if liked is None:
+        abort(404)
+
+    if liked:
+        flash("Post liked", "success")
+    else:
+        flash("You already liked this post", "info")
+
+    return redirect(url_for("blog.post_by_id", post_id=post_id))
+
+
+@bp.route("/like/<int:post_id>", methods=["POST"])
+@login_required
+def toggle_like(post_id):
+    liked = toggle_post_like(post_id, current_user.id)
+    if liked is None:
+        abort(404)
+
+    if liked:
+        flash("You liked the post.", "success")
+    else:
+        flash("You unliked the post.", "info")
+
+    # Redirect back to the same page
+    return redirect(request.referrer or url_for("blog.index"))
+
+
+# MAINTENANCE
+@bp.cli.command("reconcile-counters")
+def reconcile_counters_command():
+    """Repair drifted like/comment counters on posts and post counts on categories and tags."""
+    repaired = reconcile_post_counters()
+    facets = reconcile_facet_counts()
+    print(f"Repaired counters on {repaired} post(s) and {facets} category/tag count(s)")
+
+@bp.cli.command("reindex-search")
+def reindex_search_command():
+    """Rebuild the full-text search index from scratch."""
+    batches = reindex_all()
+    print(f"Reindexed posts in {batches} batch(es)")
+
+@bp.cli.command("backfill-excerpts")
+def backfill_excerpts_command():
+    """Fill in the excerpt and reading time of posts written before they were stored."""
+    updated = backfill_excerpts()
+    print(f"Backfilled {updated} post(s)")
@@ -0,0 +1,169 @@
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, request, send_from_directory, url_for
+from flask_login import current_user, login_required
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_content_range_header
+
+from database import db
+from models.db_tables import PostMedia, UploadSession
+from services.blob_service import collect_garbage, dedupe_existing_uploads
+from services.http_cache import IMMUTABLE_MAX_AGE, is_content_addressed
+from services.image_service import schedule_variants
+from services.storage_service import get_storage, media_url
+from services.upload_service import (ChunkOutOfOrder, UploadRejected, append_chunk, complete_direct_upload,
+                                     create_upload_session, purge_stale_upload_sessions)
+
+bp = Blueprint("media", __name__, cli_group=None)
+
+
+# UPLOADS
+bp.add_app_template_global(media_url)
+
+@bp.route("/uploads/<path:filename>")
+def uploaded_file(filename):
+    storage = get_storage()
+    if not storage.is_local:
+        # Only this redirect goes through the app; the bytes come from storage.
+        # It may be cached for half the presigned URL's lifetime.
+        expires = current_app.config["MEDIA_URL_EXPIRES"]
+        key = f"uploads/{filename}"
+        response = redirect(storage.url(key) or storage.presigned_get(key, expires))
+        response.cache_control.public = True
+        response.cache_control.max_age = expires // 2
+        return response
+
+    # conditional=True gives ETag / Last-Modified / 304 and Range (206) support
+    immutable = is_content_addressed(filename)
+    response = send_from_directory(
+        storage.root,
+        filename,
+        conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else 3600
+    )
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+# RESUMABLE UPLOADS
+# POST /upload-sessions {filename, size} opens a session; the client then PUTs the
+# file in order with "Content-Range: bytes start-end/size" and, after a failure,
+# GETs the session to learn how many bytes arrived and resumes from there.
+# With a storage backend that can presign (and UPLOAD_DIRECT on) the session
+# instead carries a `direct_url`: the client PUTs the whole file there and then
+# POSTs `complete_url`.
+@bp.route("/upload-sessions", methods=["POST"])
+@login_required
+def create_upload():
+    payload = request.get_json(silent=True) or {}
+    storage = get_storage()
+    direct = storage.supports_presign and current_app.config["UPLOAD_DIRECT"]
+    try:
+        upload = create_upload_session(
+            current_user.id,
+            str(payload.get("filename") or "file"),
+            int(payload.get("size") or 0),
+            current_app.config["UPLOAD_FOLDER"],
+            current_app.config["UPLOAD_MAX_RESUMABLE_BYTES"],
+            direct=direct
+        )
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+
+    if direct:
+        return jsonify(
+            id=upload.id,
+            direct_url=storage.presigned_put(
+                upload.storage_key, "application/octet-stream", current_app.config["MEDIA_URL_EXPIRES"]
+            ),
+            complete_url=url_for("media.complete_upload", upload_id=upload.id),
+            received=0
+        ), 201
+
+    return jsonify(
+        id=upload.id,
+        url=url_for("media.upload_chunk", upload_id=upload.id),
+        chunk_size=current_app.config["UPLOAD_CHUNK_BYTES"],
+        received=0
+    ), 201
+
+@bp.route("/upload-sessions/<upload_id>", methods=["GET", "PUT"])
+@login_required
+def upload_chunk(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        abort(404)
+    if request.method == "GET":
+        return jsonify(received=upload.received, size=upload.total_size)
+    if upload.storage_key:
+        return jsonify(error="This upload goes directly to storage", received=upload.received), 400
+
+    content_range = parse_content_range_header(request.headers.get("Content-Range"))
+    if content_range is None or content_range.length != upload.total_size:
+        return jsonify(error="A Content-Range header matching the file size is required", received=upload.received), 400
+    try:
+        received = append_chunk(
+            upload,
+            content_range.start,
+            content_range.stop - content_range.start,
+            request.stream,
+            current_app.config["UPLOAD_FOLDER"],
+            current_app.config["UPLOAD_CHUNK_BYTES"]
+        )
+    except ChunkOutOfOrder as exc:
+        return jsonify(error=str(exc), received=exc.received), 409
+    except UploadRejected as exc:
+        return jsonify(error=str(exc), received=upload.received), 400
+    return jsonify(received=received, size=upload.total_size)
+
+@bp.route("/upload-sessions/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != current_user.id or not upload.storage_key:
+        abort(404)
+    try:
+        received = complete_direct_upload(upload, get_storage())
+    except UploadRejected as exc:
+        return jsonify(error=str(exc), received=upload.received), 409
+    return jsonify(received=received, size=upload.total_size)
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(error):
+    limit = current_app.config["UPLOAD_MAX_FILE_BYTES"] // (1024 * 1024)
+    message = f"Upload too large: files are limited to {limit} MB each"
+    if request.path.startswith("/upload-sessions"):
+        return jsonify(error=message), 413
+    flash(message, "danger")
+    return redirect(request.url)
+
+
+# MAINTENANCE
+@bp.cli.command("generate-variants")
+def generate_variants_command():
+    """Generate thumbnail/medium/WebP variants for images that have none yet."""
+    missing = (
+        db.session.query(PostMedia)
+        .filter(PostMedia.media_type == "image", ~PostMedia.variants.any())
+        .all()
+    )
+    for media in missing:
+        schedule_variants(current_app._get_current_object(), media.id, media.file_path, wait=True)
+    print(f"Processed {len(missing)} image(s)")
+
+@bp.cli.command("gc-media")
+def gc_media_command():
+    """Delete media blobs, upload files and abandoned upload sessions no post references any more."""
+    storage = get_storage()
+    sessions = purge_stale_upload_sessions(current_app.config["UPLOAD_FOLDER"], storage)
+    blobs, files = collect_garbage(storage)
+    print(f"Removed {blobs} blob(s), {files} file(s) and {sessions} upload session(s)")
+
+@bp.cli.command("dedupe-uploads")
+def dedupe_uploads_command():
+    """Move pre-existing uploads into content-addressed storage, dropping duplicates."""
+    if not get_storage().is_local:
+        print("dedupe-uploads works on local files; run it before switching MEDIA_STORAGE")
+        return
+    migrated, freed = dedupe_existing_uploads(current_app.static_folder, current_app.config["UPLOAD_FOLDER"])
+    print(f"Migrated {migrated} media file(s), freed {freed} byte(s)")
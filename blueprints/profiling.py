@@ -0,0 +1,58 @@
+import time
+from flask import Blueprint, Response, abort, current_app, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+
+from database import db
+from models.db_tables import RequestProfile
+from services.profiler_service import (MAX_TOGGLE_MINUTES, PROFILE_HEADER, get_toggle, make_profile_token,
+                                       recent_profiles, set_toggle)
+
+bp = Blueprint("profiling", __name__, cli_group=None)
+
+
+@bp.before_request
+@login_required
+def require_admin():
+    if not current_user.is_admin:
+        abort(403)
+
+
+# CAPTURES
+@bp.route("/admin/profiles")
+def list_profiles():
+    toggle_route, until = get_toggle()
+    routes = sorted({rule.rule for rule in current_app.url_map.iter_rules() if rule.endpoint != "static"})
+    return render_template(
+        "admin_profiles.html",
+        profiles=recent_profiles(),
+        toggle_route=toggle_route,
+        toggle_minutes=max(0.0, (until - time.time()) / 60),
+        routes=routes,
+        max_minutes=MAX_TOGGLE_MINUTES,
+        header=PROFILE_HEADER,
+        token=make_profile_token(current_app),
+        enabled=current_app.config.get("PROFILING_ENABLED", True),
+    )
+
+@bp.route("/admin/profiles/<int:profile_id>.folded")
+def download_profile(profile_id):
+    profile = db.session.get(RequestProfile, profile_id) or abort(404)
+    return Response(
+        profile.folded,
+        mimetype="text/plain",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.folded"},
+    )
+
+@bp.route("/admin/profiles/toggle", methods=["POST"])
+def toggle_profiling():
+    minutes = request.form.get("minutes", 0, type=float)
+    set_toggle(request.form.get("route", ""), minutes)
+    flash("Profiling switched on" if minutes > 0 else "Profiling switched off", "success")
+    return redirect(url_for("profiling.list_profiles"))
+
+
+# MAINTENANCE
+@bp.cli.command("profile-token")
+def profile_token_command():
+    """Print a signed token that has requests carrying it profiled."""
+    print(f"{PROFILE_HEADER}: {make_profile_token(current_app)}")
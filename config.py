@@ -1,14 +1,142 @@
 import os
 from dotenv import load_dotenv
-import secrets
+
+from database import engine_options
 
 load_dotenv()
 
 class Config:
-    # SECRET_KEY = secrets.token_hex()
+    # Signing keys and sessions. DEPLOYMENT_MODE=multi (several workers or
+    # nodes) requires SECRET_KEY, since every process must sign with the same
+    # key; in single mode a missing key is replaced by a random one per boot.
+    # To rotate, move the old key to SECRET_KEY_FALLBACKS (comma separated, still
+    # accepted) and put the new one in SECRET_KEY. SESSION_STORE=server keeps
+    # sessions in the database (cached under CACHE_URL) rather than in the
+    # cookie, and ends them after SESSION_IDLE_TIMEOUT seconds without a request.
+    DEPLOYMENT_MODE = os.getenv("DEPLOYMENT_MODE", "single")
+    SECRET_KEY = os.getenv("SECRET_KEY")
+    SECRET_KEY_FALLBACKS = [key for key in os.getenv("SECRET_KEY_FALLBACKS", "").split(",") if key]
+    SESSION_STORE = os.getenv("SESSION_STORE") or ("server" if DEPLOYMENT_MODE == "multi" else "cookie")
+    SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", str(7 * 24 * 3600)))
+    SESSION_REFRESH_SECONDS = int(os.getenv("SESSION_REFRESH_SECONDS", "300"))
+
     SQLALCHEMY_DATABASE_URI = os.getenv(
         "DATABASE_URL",
         "sqlite:///app.db"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER")
+
+    # Password hashing (Werkzeug method string). Hashes made with other
+    # parameters are upgraded when their owner next logs in.
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+    # Credential endpoint throttling: token buckets "capacity/seconds" per
+    # client IP and per account (email). Behind a load balancer, set
+    # TRUSTED_PROXY_COUNT so the client IP comes from X-Forwarded-For.
+    RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_LOGIN_IP = os.getenv("RATE_LIMIT_LOGIN_IP", "20/60")
+    RATE_LIMIT_LOGIN_ACCOUNT = os.getenv("RATE_LIMIT_LOGIN_ACCOUNT", "10/600")
+    RATE_LIMIT_OTP_IP = os.getenv("RATE_LIMIT_OTP_IP", "10/60")
+    RATE_LIMIT_OTP_ACCOUNT = os.getenv("RATE_LIMIT_OTP_ACCOUNT", "5/600")
+    RATE_LIMIT_FORGOT_IP = os.getenv("RATE_LIMIT_FORGOT_IP", "5/300")
+    RATE_LIMIT_FORGOT_ACCOUNT = os.getenv("RATE_LIMIT_FORGOT_ACCOUNT", "3/900")
+    RATE_LIMIT_REGISTER_IP = os.getenv("RATE_LIMIT_REGISTER_IP", "10/600")
+    TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+
+    # Instrumentation (services/metrics_service.py): per-route latency, query
+    # count and DB time at /metrics. It requires "Authorization: Bearer
+    # METRICS_TOKEN" when that is set, and a signed-in admin otherwise. Slower
+    # queries and requests, and a statement repeated N_PLUS_ONE_THRESHOLD times
+    # in one request, are logged as JSON. With several workers, METRICS_DIR is a
+    # directory they share so /metrics reports all of them.
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+    # Request profiling (services/profiler_service.py): requests carrying a
+    # signed X-Profile-Token header (`flask profile-token`), requests to a
+    # route an admin switched on at /admin/profiles, and a PROFILE_SAMPLE_RATE
+    # share of all requests are stack-sampled every PROFILE_INTERVAL_MS and kept
+    # (the newest PROFILE_KEEP) as flamegraph input. PROFILING_ENABLED=false
+    # installs no hooks at all.
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() in ("1", "true", "yes")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_TOKEN_MAX_AGE = int(os.getenv("PROFILE_TOKEN_MAX_AGE", "3600"))
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+    # Upload limits. MAX_CONTENT_LENGTH caps a whole request (Flask answers 413);
+    # UPLOAD_MAX_FILE_BYTES caps each file of a form post and is enforced while
+    # the body is parsed. Bigger files go through resumable upload sessions, in
+    # chunks of at most UPLOAD_CHUNK_BYTES.
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(100 * 1024 * 1024)))
+    UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+    UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "10"))
+    UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+    UPLOAD_MAX_RESUMABLE_BYTES = int(os.getenv("UPLOAD_MAX_RESUMABLE_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+    # Media storage: 'local' (UPLOAD_FOLDER on this node), 's3' (any S3 API; set
+    # S3_ENDPOINT_URL for MinIO) or 'memory'. UPLOAD_FOLDER is still used as
+    # scratch space for staging. Without MEDIA_PUBLIC_URL (a public bucket or
+    # CDN base) media is served through presigned URLs valid MEDIA_URL_EXPIRES
+    # seconds. UPLOAD_DIRECT sends resumable uploads straight to the bucket.
+    MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "local")
+    S3_BUCKET = os.getenv("S3_BUCKET")
+    S3_PREFIX = os.getenv("S3_PREFIX", "")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+    S3_REGION = os.getenv("S3_REGION")
+    S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+    S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+    MEDIA_PUBLIC_URL = os.getenv("MEDIA_PUBLIC_URL")
+    MEDIA_URL_EXPIRES = int(os.getenv("MEDIA_URL_EXPIRES", "3600"))
+    UPLOAD_DIRECT = os.getenv("UPLOAD_DIRECT", "true").lower() in ("1", "true", "yes")
+
+    # Connection pool. Checkouts wait at most DB_POOL_TIMEOUT seconds once
+    # pool_size + max_overflow connections are in use; see `flask db-pool-stats`.
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pre_ping=DB_POOL_PRE_PING,
+        statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS
+    )
+
+    # Applied on every new SQLite connection. WAL lets readers run alongside
+    # the single writer; NORMAL sync is durable across app crashes under WAL.
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "cache_size": -20000,  # KiB
+        "temp_store": "MEMORY",
+    }
+
+    # Optional read replica; read-only helpers wrapped in database.read_replica use it
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+    SQLALCHEMY_BINDS = {
+        "replica": {
+            "url": DATABASE_REPLICA_URL,
+            **engine_options(
+                DATABASE_REPLICA_URL,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pre_ping=DB_POOL_PRE_PING,
+                statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS
+            )
+        }
+    } if DATABASE_REPLICA_URL else {}
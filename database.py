@@ -1,10 +1,194 @@
+import contextvars
+import functools
 import os
+import threading
+import time
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 
 load_dotenv()
 
-db = SQLAlchemy()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-print("Database URL:", DATABASE_URL)
+# POOL METRICS
+
+class PoolMetrics:
+    """Checkout wait times for one connection pool."""
+
+    # Checkouts slower than this are counted as stalls
+    SLOW_CHECKOUT = 0.1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.slow += wait >= self.SLOW_CHECKOUT
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "slow_checkouts": self.slow,
+                "avg_wait_ms": round(1000 * self.total_wait / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 3),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited, timeouts included."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+
+# ENGINE OPTIONS
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(uri: str, pool_size: int = 5, max_overflow: int = 10, pool_timeout: float = 10,
+                   pool_recycle: int = 1800, pre_ping: bool = True, statement_timeout_ms: int = 0) -> dict:
+    """SQLAlchemy engine keyword arguments for `uri`, tuned per dialect."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if _is_sqlite_memory(url):
+        # A single shared connection; pool settings don't apply
+        return {}
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pre_ping,
+    }
+    # SQLite has no statement timeout; lock waits are bounded by the busy_timeout pragma
+    if backend == "postgresql" and statement_timeout_ms:
+        options["connect_args"] = {"options": f"-c statement_timeout={int(statement_timeout_ms)}"}
+    return options
+
+
+# READ REPLICA
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+
+@contextmanager
+def read_replica():
+    """
+    Sends SELECTs issued inside the block to the "replica" bind when one is
+    configured. Also usable as a decorator on read-only helpers. A session that
+    has written anything in its current transaction keeps reading from the
+    primary so it always sees its own changes.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica.get() and getattr(clause, "is_select", False):
+            replica = self._db.engines.get("replica")
+            if replica is not None and not self.info.get("wrote") and not (self.new or self.dirty or self.deleted):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _clear_written(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("wrote", None)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+# SETUP
+
+def _apply_sqlite_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+def init_db(app):
+    """
+    Binds `db` to the app and applies the configured SQLite pragmas to every
+    SQLite engine. No connection is opened here. A forked worker (gunicorn
+    --preload) drops any pooled connections it inherited instead of sharing
+    them with its parent.
+    """
+    db.init_app(app)
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    with app.app_context():
+        for engine in db.engines.values():
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=functools.partial(engine.dispose, close=False))
+            if engine.dialect.name != "sqlite" or not pragmas:
+                continue
+            if _is_sqlite_memory(engine.url):
+                # WAL needs a file; the remaining pragmas still apply
+                active = {name: value for name, value in pragmas.items() if name != "journal_mode"}
+            else:
+                active = pragmas
+            event.listen(engine, "connect", _apply_sqlite_pragmas(active))
+
+def pool_stats() -> dict:
+    """Checkout metrics and current pool status for each engine, keyed by bind name."""
+    stats = {}
+    for name, engine in db.engines.items():
+        pool = engine.pool
+        entry = {"status": pool.status()}
+        if isinstance(pool, TimedQueuePool):
+            entry.update(pool.metrics.snapshot())
+        stats[name or "default"] = entry
+    return stats
+
+def dialect_insert(model):
+    """
+    INSERT construct that supports ON CONFLICT clauses on PostgreSQL and SQLite.
+    Returns None on other dialects so callers can fall back to a savepoint.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return None
@@ -0,0 +1,106 @@
+"""Baseline: the schema as first released
+
+Databases created with create_all() before migrations existed are treated as
+being at this revision.
+"""
+from sqlalchemy import (Boolean, Column, DateTime, Enum, ForeignKey, Integer, MetaData, String, Table, Text,
+                        UniqueConstraint)
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0001"
+down_revision = None
+
+metadata = MetaData()
+
+TABLES = [
+    Table(
+        "users", metadata,
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("username", String(150), nullable=False),
+        Column("email", String(150), unique=True, nullable=False),
+        Column("password_hash", String(), nullable=False),
+        Column("is_email_verified", Boolean),
+        Column("is_active", Boolean),
+        Column("is_admin", Boolean),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "auth_tokens", metadata,
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        Column("token", String(20), nullable=False),
+        Column("type", String(50), nullable=False),
+        Column("expires_at", DateTime, nullable=False),
+        Column("is_used", Boolean),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "sessions", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        Column("token", String(255), nullable=False),
+        Column("expires_at", DateTime, nullable=False),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "categories", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(100), unique=True, nullable=False),
+        Column("description", Text),
+    ),
+    Table(
+        "posts", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("title", String(255), nullable=False),
+        Column("slug", String(255), unique=True, nullable=False),
+        Column("content", Text, nullable=False),
+        Column("is_published", Boolean),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+        Column("author_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        Column("category_id", Integer, ForeignKey("categories.id")),
+    ),
+    Table(
+        "post_media", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
+        Column("file_path", String(500), nullable=False),
+        Column("media_type", Enum("image", "video", "audio", name="media_types"), nullable=False),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "tags", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(100), unique=True, nullable=False),
+    ),
+    Table(
+        "post_tags", metadata,
+        Column("post_id", Integer, ForeignKey("posts.id"), primary_key=True),
+        Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
+    ),
+    Table(
+        "comments", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        Column("content", Text, nullable=False),
+        Column("created_at", DateTime),
+    ),
+    Table(
+        "likes", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        UniqueConstraint("user_id", "post_id", name="unique_user_post_like"),
+    ),
+]
+
+
+def upgrade(op):
+    for table in TABLES:
+        op.create_table(table)
+
+
+def downgrade(op):
+    for table in reversed(TABLES):
+        op.drop_table(table.name)
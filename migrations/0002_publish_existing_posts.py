@@ -0,0 +1,22 @@
+"""Publish the posts written before is_published was set
+
+Every post was public before the feed started filtering on is_published, but
+none of them had it set, so they are all marked published here. New rows
+default to published at the database level too.
+"""
+
+revision = "0002"
+down_revision = "0001"
+
+
+def upgrade(op):
+    op.execute("UPDATE posts SET is_published = TRUE WHERE is_published IS NULL OR is_published = FALSE")
+    if op.dialect == "postgresql":
+        # SQLite can't change a column default in place; the model's default covers its inserts
+        op.execute("ALTER TABLE posts ALTER COLUMN is_published SET DEFAULT TRUE")
+
+
+def downgrade(op):
+    # Which posts were hidden before can't be told apart any more, so only the default is reverted
+    if op.dialect == "postgresql":
+        op.execute("ALTER TABLE posts ALTER COLUMN is_published DROP DEFAULT")
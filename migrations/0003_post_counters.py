@@ -0,0 +1,20 @@
+"""Denormalized like/comment counters on posts"""
+from sqlalchemy import Column, Integer
+
+revision = "0003"
+down_revision = "0002"
+
+
+def upgrade(op):
+    op.add_column("posts", Column("like_count", Integer, nullable=False, server_default="0"))
+    op.add_column("posts", Column("comment_count", Integer, nullable=False, server_default="0"))
+    op.execute("""
+        UPDATE posts SET
+            like_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id),
+            comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+    """)
+
+
+def downgrade(op):
+    op.drop_column("posts", "comment_count")
+    op.drop_column("posts", "like_count")
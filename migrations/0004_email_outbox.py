@@ -0,0 +1,26 @@
+"""Outbox table for queued emails"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text
+
+revision = "0004"
+down_revision = "0003"
+
+
+def upgrade(op):
+    op.create_table(Table(
+        "email_outbox", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("recipient", String(150), nullable=False),
+        Column("subject", String(255), nullable=False),
+        Column("body", Text, nullable=False),
+        Column("status", String(20), nullable=False),
+        Column("attempts", Integer, nullable=False),
+        Column("next_attempt_at", DateTime, nullable=False),
+        Column("last_error", Text),
+        Column("created_at", DateTime),
+        Column("sent_at", DateTime),
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    ))
+
+
+def downgrade(op):
+    op.drop_table("email_outbox")
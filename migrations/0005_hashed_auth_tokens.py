@@ -0,0 +1,64 @@
+"""Store auth tokens as keyed hashes
+
+Each existing plaintext token is hashed in place, the way token_service does
+it (HMAC-SHA256 under the app's SECRET_KEY), so codes already emailed keep
+working across the upgrade. Going back drops the tokens: a hash can't be
+turned back into the code.
+"""
+import hashlib
+import hmac
+from flask import current_app
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, MetaData, String, Table
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0005"
+down_revision = "0004"
+
+
+def _auth_tokens(token_column: Column, *indexes) -> Table:
+    metadata = MetaData()
+    Table("users", metadata, Column("id", UUID(as_uuid=True), primary_key=True))
+    return Table(
+        "auth_tokens", metadata,
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        token_column,
+        Column("type", String(50), nullable=False),
+        Column("expires_at", DateTime, nullable=False),
+        Column("is_used", Boolean),
+        Column("created_at", DateTime),
+        *indexes
+    )
+
+def _hash(token: str) -> str:
+    key = current_app.config["SECRET_KEY"]
+    return hmac.new(key.encode() if isinstance(key, str) else key, token.encode(), hashlib.sha256).hexdigest()
+
+
+def upgrade(op):
+    hashed = _auth_tokens(
+        Column("token_hash", String(64), nullable=False),
+        Index("ix_auth_tokens_user_type_hash", "user_id", "type", "token_hash"),
+        Index("ix_auth_tokens_hash_type", "token_hash", "type"),
+        Index("ix_auth_tokens_expires_at", "expires_at"),
+    )
+    if not op.has_column("auth_tokens", "token"):
+        for index in hashed.indexes:
+            op.create_index(index.name, "auth_tokens", [column.name for column in index.columns])
+        return
+
+    # SQLite can't add a NOT NULL column to a filled table, so it is rebuilt with the rows carried over
+    plain = _auth_tokens(Column("token", String(20), nullable=False))
+    rows = op.connection.execute(plain.select()).mappings().all()
+    op.drop_table("auth_tokens")
+    op.create_table(hashed)
+    if rows:
+        op.connection.execute(hashed.insert(), [
+            {**{key: value for key, value in row.items() if key != "token"}, "token_hash": _hash(row["token"])}
+            for row in rows
+        ])
+
+
+def downgrade(op):
+    op.drop_table("auth_tokens")
+    op.create_table(_auth_tokens(Column("token", String(20), nullable=False)))
@@ -0,0 +1,53 @@
+"""Full-text search index over published posts, filled from the existing ones
+
+The same structures as search_service.init_search_index(), written out here so
+the revision doesn't change when the service does:
+  SQLite     -> FTS5 virtual table (rowid = post id)
+  PostgreSQL -> weighted tsvector column with a GIN index
+Other dialects search with LIKE and have nothing to create.
+"""
+
+revision = "0006"
+down_revision = "0005"
+
+
+def upgrade(op):
+    if op.dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_search "
+            "USING fts5(title, content, tags, category, tokenize = 'porter unicode61')"
+        )
+        op.execute("DELETE FROM post_search")
+        op.execute("""
+            INSERT INTO post_search (rowid, title, content, tags, category)
+            SELECT p.id, p.title, p.content,
+                   coalesce((SELECT group_concat(t.name, ' ') FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+                             WHERE pt.post_id = p.id), ''),
+                   coalesce(c.name, '')
+            FROM posts p LEFT JOIN categories c ON c.id = p.category_id
+            WHERE p.is_published
+        """)
+    elif op.dialect == "postgresql":
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS post_search ("
+            " post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,"
+            " document TSVECTOR NOT NULL)"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_post_search_document ON post_search USING GIN (document)")
+        op.execute("""
+            INSERT INTO post_search (post_id, document)
+            SELECT p.id,
+                   setweight(to_tsvector('english', p.title), 'A')
+                   || setweight(to_tsvector('english', coalesce((SELECT string_agg(t.name, ' ') FROM post_tags pt
+                                JOIN tags t ON t.id = pt.tag_id WHERE pt.post_id = p.id), '')), 'B')
+                   || setweight(to_tsvector('english', coalesce(c.name, '')), 'B')
+                   || setweight(to_tsvector('english', p.content), 'C')
+            FROM posts p LEFT JOIN categories c ON c.id = p.category_id
+            WHERE p.is_published
+            ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+        """)
+
+
+def downgrade(op):
+    if op.dialect in ("sqlite", "postgresql"):
+        op.drop_table("post_search")
@@ -0,0 +1,31 @@
+"""Resized and re-encoded image variants"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, UniqueConstraint
+
+revision = "0007"
+down_revision = "0006"
+
+
+def _post_media_variants() -> Table:
+    metadata = MetaData()
+    Table("post_media", metadata, Column("id", Integer, primary_key=True))
+    return Table(
+        "post_media_variants", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("media_id", Integer, ForeignKey("post_media.id"), nullable=False),
+        Column("name", String(50), nullable=False),
+        Column("file_path", String(500), nullable=False),
+        Column("mime_type", String(50), nullable=False),
+        Column("width", Integer, nullable=False),
+        Column("height", Integer, nullable=False),
+        Column("created_at", DateTime),
+        UniqueConstraint("media_id", "name", name="unique_media_variant"),
+        Index("ix_post_media_variants_media_id", "media_id"),
+    )
+
+
+def upgrade(op):
+    op.create_table(_post_media_variants())
+
+
+def downgrade(op):
+    op.drop_table("post_media_variants")
@@ -0,0 +1,29 @@
+"""Content-addressed media blobs shared between post media rows"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect
+
+revision = "0008"
+down_revision = "0007"
+
+
+def upgrade(op):
+    op.create_table(Table(
+        "media_blobs", MetaData(),
+        Column("sha256", String(64), primary_key=True),
+        Column("file_path", String(500), nullable=False),
+        Column("size", Integer, nullable=False),
+        Column("ref_count", Integer, nullable=False),
+        Column("created_at", DateTime),
+    ))
+    # Added without a database-level foreign key: SQLite can't add one to an existing table
+    op.add_column("post_media", Column("blob_sha256", String(64)))
+    op.create_index("ix_post_media_blob_sha256", "post_media", ["blob_sha256"])
+
+
+def downgrade(op):
+    op.drop_index("ix_post_media_blob_sha256", "post_media")
+    # SQLite can't drop a column used by a foreign key, which create_all() adds to
+    # new databases; the nullable column then stays for the next upgrade to reuse
+    foreign_keys = inspect(op.connection).get_foreign_keys("post_media")
+    if op.dialect != "sqlite" or not any("blob_sha256" in fk["constrained_columns"] for fk in foreign_keys):
+        op.drop_column("post_media", "blob_sha256")
+    op.drop_table("media_blobs")
@@ -0,0 +1,12 @@
+"""Index for keyset-paginated comments"""
+
+revision = "0009"
+down_revision = "0008"
+
+
+def upgrade(op):
+    op.create_index("ix_comments_post_created", "comments", ["post_id", "created_at", "id"])
+
+
+def downgrade(op):
+    op.drop_index("ix_comments_post_created", "comments")
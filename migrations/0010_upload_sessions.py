@@ -0,0 +1,36 @@
+"""Resumable upload sessions, and 64-bit blob sizes"""
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, MetaData, String, Table
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0010"
+down_revision = "0009"
+
+
+def _upload_sessions() -> Table:
+    metadata = MetaData()
+    Table("users", metadata, Column("id", UUID(as_uuid=True), primary_key=True))
+    return Table(
+        "upload_sessions", metadata,
+        Column("id", String(32), primary_key=True),
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        Column("filename", String(255), nullable=False),
+        Column("total_size", BigInteger, nullable=False),
+        Column("received", BigInteger, nullable=False),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+        Index("ix_upload_sessions_user_id", "user_id"),
+        Index("ix_upload_sessions_updated_at", "updated_at"),
+    )
+
+
+def upgrade(op):
+    op.create_table(_upload_sessions())
+    # SQLite integers are already 64-bit
+    if op.dialect == "postgresql":
+        op.execute("ALTER TABLE media_blobs ALTER COLUMN size TYPE BIGINT")
+
+
+def downgrade(op):
+    if op.dialect == "postgresql":
+        op.execute("ALTER TABLE media_blobs ALTER COLUMN size TYPE INTEGER")
+    op.drop_table("upload_sessions")
@@ -0,0 +1,13 @@
+"""Storage key for uploads sent straight to the storage backend"""
+from sqlalchemy import Column, String
+
+revision = "0011"
+down_revision = "0010"
+
+
+def upgrade(op):
+    op.add_column("upload_sessions", Column("storage_key", String(500)))
+
+
+def downgrade(op):
+    op.drop_column("upload_sessions", "storage_key")
@@ -0,0 +1,25 @@
+"""Earlier slugs of posts, so old links survive title edits"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+
+revision = "0012"
+down_revision = "0011"
+
+
+def _slug_redirects() -> Table:
+    metadata = MetaData()
+    Table("posts", metadata, Column("id", Integer, primary_key=True))
+    return Table(
+        "post_slug_redirects", metadata,
+        Column("slug", String(255), primary_key=True),
+        Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
+        Column("created_at", DateTime),
+        Index("ix_post_slug_redirects_post_id", "post_id"),
+    )
+
+
+def upgrade(op):
+    op.create_table(_slug_redirects())
+
+
+def downgrade(op):
+    op.drop_table("post_slug_redirects")
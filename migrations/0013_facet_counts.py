@@ -0,0 +1,22 @@
+"""Category/tag post counts and the filtered-feed indexes"""
+from sqlalchemy import Column, Integer
+
+revision = "0013"
+down_revision = "0012"
+
+
+def upgrade(op):
+    op.add_column("categories", Column("post_count", Integer, nullable=False, server_default="0"))
+    op.add_column("tags", Column("post_count", Integer, nullable=False, server_default="0"))
+    op.execute("UPDATE categories SET post_count = (SELECT COUNT(*) FROM posts WHERE posts.category_id = categories.id)")
+    op.execute("UPDATE tags SET post_count = (SELECT COUNT(*) FROM post_tags WHERE post_tags.tag_id = tags.id)")
+
+    op.create_index("ix_posts_category_created", "posts", ["category_id", "created_at", "id"])
+    op.create_index("ix_post_tags_tag_post", "post_tags", ["tag_id", "post_id"])
+
+
+def downgrade(op):
+    op.drop_index("ix_post_tags_tag_post", "post_tags")
+    op.drop_index("ix_posts_category_created", "posts")
+    op.drop_column("tags", "post_count")
+    op.drop_column("categories", "post_count")
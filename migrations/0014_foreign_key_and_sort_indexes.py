@@ -0,0 +1,30 @@
+"""Indexes for every hot foreign key and sort column
+
+PostgreSQL doesn't index foreign keys on its own, so profile pages, media
+lookups and cascade deletes scanned whole tables. Composite indexes end in the
+sort columns so the keyset-paginated queries read rows already in order.
+Built CONCURRENTLY on PostgreSQL, so this runs outside a transaction.
+"""
+
+revision = "0014"
+down_revision = "0013"
+transactional = False
+
+INDEXES = [
+    ("ix_posts_published_created", "posts", ["is_published", "created_at", "id"]),   # home feed
+    ("ix_posts_author_created", "posts", ["author_id", "created_at", "id"]),         # profile, user delete
+    ("ix_post_media_post_created", "post_media", ["post_id", "created_at", "id"]),   # post media, thumbnails
+    ("ix_comments_user_id", "comments", ["user_id"]),                                # user delete
+    ("ix_likes_post_id", "likes", ["post_id"]),                                      # post delete, recounts
+    ("ix_sessions_user_id", "sessions", ["user_id"]),                                # logout everywhere, user delete
+]
+
+
+def upgrade(op):
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade(op):
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table)
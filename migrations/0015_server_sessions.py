@@ -0,0 +1,44 @@
+"""Rebuild sessions for the server-side session store
+
+The table was never written to before this revision, so it is recreated
+rather than altered: user_id becomes optional, the plain token becomes an
+indexed hash, and the session data gets a column.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0015"
+down_revision = "0014"
+
+
+def _sessions(*columns) -> Table:
+    metadata = MetaData()
+    Table("users", metadata, Column("id", UUID(as_uuid=True), primary_key=True))
+    return Table("sessions", metadata, Column("id", Integer, primary_key=True), *columns)
+
+
+def upgrade(op):
+    if op.has_column("sessions", "token_hash"):
+        return
+    op.drop_table("sessions")
+    op.create_table(_sessions(
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id")),
+        Column("token_hash", String(64), nullable=False),
+        Column("data", Text, nullable=False),
+        Column("expires_at", DateTime, nullable=False),
+        Column("created_at", DateTime),
+        Index("ix_sessions_token_hash", "token_hash", unique=True),
+        Index("ix_sessions_user_id", "user_id"),
+        Index("ix_sessions_expires_at", "expires_at"),
+    ))
+
+
+def downgrade(op):
+    op.drop_table("sessions")
+    op.create_table(_sessions(
+        Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+        Column("token", String(255), nullable=False),
+        Column("expires_at", DateTime, nullable=False),
+        Column("created_at", DateTime),
+        Index("ix_sessions_user_id", "user_id"),
+    ))
@@ -0,0 +1,27 @@
+"""Table for captured request profiles"""
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, Text
+
+revision = "0016"
+down_revision = "0015"
+
+
+def upgrade(op):
+    op.create_table(Table(
+        "request_profiles", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("route", String(255), nullable=False),
+        Column("method", String(10), nullable=False),
+        Column("path", String(500), nullable=False),
+        Column("status", Integer, nullable=False),
+        Column("trigger", String(20), nullable=False),
+        Column("duration_ms", Float, nullable=False),
+        Column("samples", Integer, nullable=False),
+        Column("orm_ms", Float, nullable=False),
+        Column("template_ms", Float, nullable=False),
+        Column("folded", Text, nullable=False),
+        Column("created_at", DateTime),
+    ))
+
+
+def downgrade(op):
+    op.drop_table("request_profiles")
@@ -0,0 +1,19 @@
+"""Precomputed excerpt and reading time on posts
+
+The columns start out empty; `flask backfill-excerpts` fills them in for
+existing posts in batches, outside the migration's transaction.
+"""
+from sqlalchemy import Column, Integer, String
+
+revision = "0017"
+down_revision = "0016"
+
+
+def upgrade(op):
+    op.add_column("posts", Column("excerpt", String(255)))
+    op.add_column("posts", Column("reading_minutes", Integer))
+
+
+def downgrade(op):
+    op.drop_column("posts", "reading_minutes")
+    op.drop_column("posts", "excerpt")
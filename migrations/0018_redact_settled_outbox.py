@@ -0,0 +1,17 @@
+"""Blank the bodies of emails already sent or failed
+
+The outbox worker now blanks a body once its row is settled, since bodies can
+hold one-time codes. This clears the rows settled before it did.
+"""
+
+revision = "0018"
+down_revision = "0017"
+
+
+def upgrade(op):
+    op.execute("UPDATE email_outbox SET body = '' WHERE status IN ('sent', 'failed') AND body <> ''")
+
+
+def downgrade(op):
+    # The bodies are gone; there is nothing to put back
+    pass
@@ -2,8 +2,8 @@ import uuid
 from datetime import datetime
 from flask_login import UserMixin
 from sqlalchemy import (
-    Column, String, Integer, Boolean, Text, DateTime,
-    ForeignKey, UniqueConstraint, Enum
+    Column, String, Integer, BigInteger, Boolean, Float, Text, DateTime,
+    ForeignKey, UniqueConstraint, Enum, Index, true
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -39,7 +39,7 @@ class AuthToken(db.Model):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    token = Column(String(20), nullable=False)
+    token_hash = Column(String(64), nullable=False)  # SHA-256 hex digest, never the token itself
     type = Column(String(50), nullable=False)
     expires_at = Column(DateTime, nullable=False)
     is_used = Column(Boolean, default=False)
@@ -47,20 +47,33 @@ class AuthToken(db.Model):
 
     user = relationship("User", back_populates="tokens")
 
+    __table_args__ = (
+        Index("ix_auth_tokens_user_type_hash", "user_id", "type", "token_hash"),
+        Index("ix_auth_tokens_hash_type", "token_hash", "type"),
+        Index("ix_auth_tokens_expires_at", "expires_at"),
+    )
+
 
-# SESSIONS
+# SESSIONS (server-side sessions, SESSION_STORE=server; see services/session_service.py)
 
 class Session(db.Model):
     __tablename__ = "sessions"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    token = Column(String(255), nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))  # None until someone logs in
+    token_hash = Column(String(64), nullable=False)  # SHA-256 hex digest of the cookie's token
+    data = Column(Text, nullable=False)  # the session dict, in Flask's tagged JSON
+    expires_at = Column(DateTime, nullable=False)  # slides forward while the session is used
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="sessions")
 
+    __table_args__ = (
+        Index("ix_sessions_token_hash", "token_hash", unique=True),
+        Index("ix_sessions_user_id", "user_id"),
+        Index("ix_sessions_expires_at", "expires_at"),
+    )
+
 
 # CATEGORIES
 
@@ -70,6 +83,8 @@ class Category(db.Model):
     id = Column(Integer, primary_key=True)
     name = Column(String(100), unique=True, nullable=False)
     description = Column(Text)
+    # Denormalized facet count, kept in step by the post write paths
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     posts = relationship("Post", back_populates="category")
 
@@ -83,10 +98,17 @@ class Post(db.Model):
     title = Column(String(255), nullable=False)
     slug = Column(String(255), unique=True, nullable=False)
     content = Column(Text, nullable=False)
-    is_published = Column(Boolean, default=False)
+    # Derived from content on every write (services/excerpt_service.py); listings read these instead
+    excerpt = Column(String(255))
+    reading_minutes = Column(Integer)
+    is_published = Column(Boolean, default=True, server_default=true())
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Denormalized counters, kept in step by the like/comment write paths
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     author_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"))
 
@@ -96,6 +118,24 @@ class Post(db.Model):
     comments = relationship("Comment", back_populates="post", cascade="all, delete")
     likes = relationship("Like", back_populates="post", cascade="all, delete")
     tags = relationship("Tag", secondary="post_tags", back_populates="posts")
+    slug_redirects = relationship("PostSlugRedirect", cascade="all, delete-orphan")
+
+    # Keyset feeds: (filter, created_at, id) so each page is one index range read
+    __table_args__ = (
+        Index("ix_posts_published_created", "is_published", "created_at", "id"),
+        Index("ix_posts_author_created", "author_id", "created_at", "id"),
+        Index("ix_posts_category_created", "category_id", "created_at", "id"),
+    )
+
+
+# SLUG REDIRECTS (earlier slugs of a post, kept so old links survive title edits)
+
+class PostSlugRedirect(db.Model):
+    __tablename__ = "post_slug_redirects"
+
+    slug = Column(String(255), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 # POST MEDIA
@@ -108,8 +148,71 @@ class PostMedia(db.Model):
     file_path = Column(String(500), nullable=False)
     media_type = Column(Enum("image", "video", "audio", name="media_types"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    blob_sha256 = Column(String(64), ForeignKey("media_blobs.sha256"), index=True)
 
     post = relationship("Post", back_populates="media")
+    blob = relationship("MediaBlob")
+    variants = relationship(
+        "PostMediaVariant", back_populates="media", cascade="all, delete-orphan",
+        order_by="PostMediaVariant.width"
+    )
+
+    __table_args__ = (
+        Index("ix_post_media_post_created", "post_id", "created_at", "id"),
+    )
+
+    @property
+    def file_url(self):
+        from services.storage_service import media_url
+        return media_url(self.file_path)
+
+
+# MEDIA BLOBS (content-addressed upload storage, shared between PostMedia rows)
+
+class MediaBlob(db.Model):
+    __tablename__ = "media_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String(500), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# POST MEDIA VARIANTS (resized / re-encoded copies of an image)
+
+class PostMediaVariant(db.Model):
+    __tablename__ = "post_media_variants"
+
+    id = Column(Integer, primary_key=True)
+    media_id = Column(Integer, ForeignKey("post_media.id"), nullable=False, index=True)
+    name = Column(String(50), nullable=False)  # e.g. 'thumb', 'thumb_webp', 'medium'
+    file_path = Column(String(500), nullable=False)
+    mime_type = Column(String(50), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    media = relationship("PostMedia", back_populates="variants")
+
+    __table_args__ = (
+        UniqueConstraint("media_id", "name", name="unique_media_variant"),
+    )
+
+
+# UPLOAD SESSIONS (resumable uploads in progress; the bytes live in a partial file)
+
+class UploadSession(db.Model):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # random hex, also names the partial file
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0)
+    storage_key = Column(String(500))  # set when the client uploads straight to storage
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
 
 # TAGS
@@ -119,6 +222,8 @@ class Tag(db.Model):
 
     id = Column(Integer, primary_key=True)
     name = Column(String(100), unique=True, nullable=False)
+    # Denormalized facet count, kept in step by the post write paths
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     posts = relationship("Post", secondary="post_tags", back_populates="tags")
 
@@ -131,6 +236,11 @@ class PostTag(db.Model):
     post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True)
     tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
 
+    # The primary key serves post -> tags; this serves the tag feeds
+    __table_args__ = (
+        Index("ix_post_tags_tag_post", "tag_id", "post_id"),
+    )
+
 
 # COMMENTS
 
@@ -146,6 +256,11 @@ class Comment(db.Model):
     post = relationship("Post", back_populates="comments")
     user = relationship("User", back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_comments_post_created", "post_id", "created_at", "id"),
+        Index("ix_comments_user_id", "user_id"),
+    )
+
 
 # LIKES
 
@@ -161,4 +276,45 @@ class Like(db.Model):
 
     __table_args__ = (
         UniqueConstraint("user_id", "post_id", name="unique_user_post_like"),
+        Index("ix_likes_post_id", "post_id"),
+    )
+
+
+# EMAIL OUTBOX
+
+class EmailOutbox(db.Model):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(150), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending / sending / sent / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
     )
+
+
+# REQUEST PROFILES (sampled stacks of profiled requests; see services/profiler_service.py)
+
+class RequestProfile(db.Model):
+    __tablename__ = "request_profiles"
+
+    id = Column(Integer, primary_key=True)
+    route = Column(String(255), nullable=False)  # URL rule, e.g. /post/<slug>
+    method = Column(String(10), nullable=False)
+    path = Column(String(500), nullable=False)
+    status = Column(Integer, nullable=False)
+    trigger = Column(String(20), nullable=False)  # header / toggle / sample
+    duration_ms = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False)
+    orm_ms = Column(Float, nullable=False)  # sampled time under SQLAlchemy
+    template_ms = Column(Float, nullable=False)  # sampled time under Jinja
+    folded = Column(Text, nullable=False)  # collapsed stacks, "root;...;leaf count" per line
+    created_at = Column(DateTime, default=datetime.utcnow)
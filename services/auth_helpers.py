@@ -1,17 +1,34 @@
 import secrets
 from datetime import datetime, timedelta
+from flask import current_app
 from database import db
 from models.db_tables import User, AuthToken
-from werkzeug.security import generate_password_hash, check_password_hash
+from services import password_service
+from services.password_service import KdfBusy
+from services.session_service import end_user_sessions
+from services.token_service import auth_token_hashes, consume_token
 
 
 # PASSWORD
 
 def hash_password(password: str) -> str:
-    return generate_password_hash(password)
+    return password_service.hash_password(password, current_app.config["PASSWORD_HASH_METHOD"])
 
 def verify_password(user: User, password: str) -> bool:
-    return check_password_hash(user.password_hash, password)
+    """
+    Checks the password in the KDF pool. A hash made with older parameters
+    than PASSWORD_HASH_METHOD is replaced on success, so raising the cost
+    upgrades accounts as their owners log in.
+    """
+    if not password_service.check_password(user.password_hash, password):
+        return False
+    if password_service.needs_rehash(user.password_hash, current_app.config["PASSWORD_HASH_METHOD"]):
+        try:
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        except KdfBusy:
+            pass  # the upgrade waits for the next login
+    return True
 
 
 # USER CREATION
@@ -33,38 +50,33 @@ def create_user(username: str, email: str, password: str) -> User:
 def generate_otp_token(user: User, token_type: str = "login_otp", minutes_valid: int = 10) -> AuthToken:
     """
     token_type: 'login_otp' or 'password_reset'
+    Only the digest is stored; the OTP itself is available as `plain_token`.
     """
     token_str = str(secrets.randbelow(900000) + 100000)  # 6-digit numeric OTP
     expires_at = datetime.utcnow() + timedelta(minutes=minutes_valid)
     token = AuthToken(
         user_id=user.id,
-        token=token_str,
+        token_hash=auth_token_hashes(token_str)[0],
         type=token_type,
         expires_at=expires_at,
         is_used=False
     )
     db.session.add(token)
     db.session.commit()
+    token.plain_token = token_str
     return token
 
 def verify_otp_token(user: User, otp_str: str, token_type: str = "login_otp") -> bool:
-    token = (
-        AuthToken.query
-        .filter_by(user_id=user.id, token=otp_str, type=token_type, is_used=False)
-        .first()
-    )
-    if token and token.expires_at > datetime.utcnow():
-        token.is_used = True
-        db.session.commit()
-        return True
-    return False
+    return consume_token(otp_str, token_type, user_id=user.id) is not None
 
 
 # PASSWORD RESET
 
 def reset_password(user: User, new_password: str):
+    """Also ends the user's server-side sessions, so a stolen session dies with the old password."""
     user.password_hash = hash_password(new_password)
     db.session.commit()
+    end_user_sessions(user.id)
 
 def generate_email_verification_token(user: User, minutes_valid: int = 10) -> AuthToken:
     """Generates OTP for email verification."""
@@ -0,0 +1,291 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from sqlalchemy import delete, exists, func, select, update
+from database import db, dialect_insert
+from models.db_tables import MediaBlob, PostMedia, PostMediaVariant
+
+# Uploads are stored once per distinct content as uploads/<sha256>.<ext>.
+# PostMedia rows point at their blob through blob_sha256; MediaBlob.ref_count
+# tracks how many rows share it so deleting a post never removes bytes that
+# another post still uses.
+
+CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = ".upload-"
+
+# mkstemp() makes owner-only files, and temp files are renamed into storage as
+# they are; they get the mode open() would give instead, so a front-end server
+# can read stored originals like the variants. (The umask is read at import:
+# reading it means setting it.)
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+# HASHING
+
+class FileTooLarge(ValueError):
+    pass
+
+
+def stream_to_temp(stream, directory, max_bytes: int = None, head: bytes = b""):
+    """
+    Copies `head` followed by `stream` into a temp file in `directory` chunk by
+    chunk, hashing as it goes. Raises FileTooLarge (leaving nothing behind) once
+    more than `max_bytes` have been read. Returns (temp_path, sha256_hex, size).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            chunk = head or stream.read(CHUNK_SIZE)
+            while chunk:
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise FileTooLarge(f"File exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+        os.chmod(temp_path, FILE_MODE)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest(), os.path.getsize(path)
+
+def _extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else "bin"
+
+
+# REFERENCES
+
+def acquire_blob(sha256: str, file_path: str, size: int) -> str:
+    """
+    Creates the blob with ref_count 1, or bumps ref_count if it already exists,
+    in a single upsert. Returns the blob's canonical file_path (the existing one
+    wins when the same bytes were first uploaded under another extension).
+    """
+    insert = dialect_insert(MediaBlob)
+    if insert is not None:
+        stmt = (
+            insert.values(sha256=sha256, file_path=file_path, size=size, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[MediaBlob.sha256],
+                set_={"ref_count": MediaBlob.ref_count + 1}
+            )
+            .returning(MediaBlob.file_path)
+        )
+        return db.session.execute(stmt).scalar_one()
+
+    blob = db.session.get(MediaBlob, sha256, with_for_update=True)
+    if blob is None:
+        blob = MediaBlob(sha256=sha256, file_path=file_path, size=size, ref_count=0)
+        db.session.add(blob)
+    blob.ref_count += 1
+    db.session.flush()
+    return blob.file_path
+
+def release_blobs(sha256s):
+    """Drops one reference per entry; blobs reaching zero are removed by collect_garbage()."""
+    for sha256, count in Counter(s for s in sha256s if s).items():
+        db.session.execute(
+            update(MediaBlob)
+            .where(MediaBlob.sha256 == sha256)
+            .values(ref_count=MediaBlob.ref_count - count)
+            .execution_options(synchronize_session=False)
+        )
+
+def store_file(temp_path, sha256: str, size: int, extension: str, storage):
+    """
+    Moves an already hashed temp file into content-addressed storage, or drops it
+    when the blob already exists. Returns the blob's file_path (its storage key).
+    The reference is taken inside the caller's transaction.
+    """
+    file_path = acquire_blob(sha256, f"uploads/{sha256}.{extension}", size)
+
+    if storage.exists(file_path):
+        os.remove(temp_path)
+    else:
+        storage.put_file(file_path, temp_path, move=True)
+    return file_path
+
+def clone_variants(media: PostMedia) -> bool:
+    """
+    Reuses the variants already generated for another PostMedia with the same blob.
+    Returns False when there is nothing to copy and variants must be generated.
+    """
+    if not media.blob_sha256:
+        return False
+
+    source_id = db.session.execute(
+        select(PostMediaVariant.media_id)
+        .join(PostMedia, PostMedia.id == PostMediaVariant.media_id)
+        .where(PostMedia.blob_sha256 == media.blob_sha256, PostMedia.id != media.id)
+        .limit(1)
+    ).scalar()
+    if source_id is None:
+        return False
+
+    for variant in db.session.query(PostMediaVariant).filter_by(media_id=source_id):
+        db.session.add(PostMediaVariant(
+            media_id=media.id,
+            name=variant.name,
+            file_path=variant.file_path,
+            mime_type=variant.mime_type,
+            width=variant.width,
+            height=variant.height
+        ))
+    return True
+
+
+# GARBAGE COLLECTION
+
+def _referenced_paths() -> set:
+    referenced = set()
+    for column in (MediaBlob.file_path, PostMedia.file_path, PostMediaVariant.file_path):
+        referenced.update(db.session.execute(select(column)).scalars())
+    return referenced
+
+def _delete_orphaned_blobs(batch_size: int) -> list:
+    """
+    Deletes up to `batch_size` blob rows nothing references and returns their
+    file paths. The rows stay locked until the caller commits.
+    """
+    orphaned = (
+        MediaBlob.ref_count <= 0,
+        ~exists().where(PostMedia.blob_sha256 == MediaBlob.sha256),
+        ~exists().where(PostMedia.file_path == MediaBlob.file_path),
+    )
+    if db.session.get_bind().dialect.delete_returning:
+        # The conditions are checked again on each row as it is deleted, after any
+        # concurrent acquire_blob() on it has committed
+        candidates = select(MediaBlob.sha256).where(*orphaned).limit(batch_size)
+        return db.session.execute(
+            delete(MediaBlob)
+            .where(MediaBlob.sha256.in_(candidates), *orphaned)
+            .returning(MediaBlob.file_path)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+    rows = db.session.execute(
+        select(MediaBlob.sha256, MediaBlob.file_path).where(*orphaned).limit(batch_size).with_for_update()
+    ).all()
+    db.session.execute(
+        delete(MediaBlob)
+        .where(MediaBlob.sha256.in_([sha256 for sha256, _ in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    return [file_path for _, file_path in rows]
+
+def collect_garbage(storage, grace_seconds: int = 3600, batch_size: int = 500):
+    """
+    Deletes unreferenced blobs and any stored upload no longer referenced by a
+    blob, media or variant row. Objects younger than `grace_seconds` are kept
+    so uploads still in flight are never touched.
+    Returns (blobs_removed, files_removed).
+    """
+    # A blob's bytes are removed before its row's deletion commits: a store_file()
+    # of the same content waits on the row until then, and finds neither row nor
+    # file afterwards, so it stores both again instead of pointing at a deleted file
+    blobs_removed = 0
+    while True:
+        file_paths = _delete_orphaned_blobs(batch_size)
+        if not file_paths:
+            break
+        for file_path in file_paths:
+            storage.delete(file_path)
+        db.session.commit()
+        blobs_removed += len(file_paths)
+
+    referenced = _referenced_paths()
+    cutoff = time.time() - grace_seconds
+    files_removed = 0
+    for stored in storage.list():
+        if stored.key in referenced or stored.modified > cutoff:
+            continue
+        storage.delete(stored.key)
+        files_removed += 1
+
+    return blobs_removed, files_removed
+
+
+# MIGRATION
+
+def dedupe_existing_uploads(static_folder, upload_folder, batch_size: int = 200):
+    """
+    One-off migration for media stored before content addressing: hashes every
+    PostMedia file without a blob, repoints the row at its blob and deletes the
+    now-redundant copies. Local storage only, where the legacy files live.
+    Returns (media_migrated, bytes_freed).
+    """
+    migrated = 0
+    old_paths = {}  # old file_path -> bytes saved by removing it
+    last_id = 0
+
+    while True:
+        batch = (
+            db.session.query(PostMedia)
+            .filter(PostMedia.blob_sha256.is_(None), PostMedia.id > last_id)
+            .order_by(PostMedia.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        for media in batch:
+            last_id = media.id
+            source = os.path.join(static_folder, media.file_path)
+            if not os.path.exists(source):
+                continue
+
+            sha256, size = hash_file(source)
+            candidate = f"uploads/{sha256}.{_extension(media.file_path)}"
+            file_path = acquire_blob(sha256, candidate, size)
+            target = os.path.join(upload_folder, os.path.basename(file_path))
+            duplicate = os.path.exists(target)
+            if not duplicate:
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copyfile(source, target)
+
+            if file_path != media.file_path:
+                old_paths[media.file_path] = size if duplicate else 0
+            media.file_path = file_path
+            media.blob_sha256 = sha256
+            migrated += 1
+
+        db.session.commit()
+
+    # Recount references from scratch so the blobs are exact whatever ran before
+    db.session.execute(
+        update(MediaBlob)
+        .values(ref_count=(
+            select(func.count(PostMedia.id))
+            .where(PostMedia.blob_sha256 == MediaBlob.sha256)
+            .scalar_subquery()
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    still_used = _referenced_paths()
+    bytes_freed = 0
+    for path, saved in old_paths.items():
+        full_path = os.path.join(static_folder, path)
+        if path not in still_used and os.path.exists(full_path):
+            os.remove(full_path)
+            bytes_freed += saved
+
+    return migrated, bytes_freed
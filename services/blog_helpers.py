@@ -1,42 +1,185 @@
+import base64
+import binascii
+from datetime import datetime
 from flask import session
-from sqlalchemy import column, select, table
-from sqlalchemy.orm import joinedload
-from database import db
-from models.db_tables import Comment, Like, Post, PostMedia, User
+from sqlalchemy import column, delete, func, or_, select, table, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from database import db, dialect_insert, read_replica
+from models.db_tables import Comment, Like, Post, PostMedia, PostMediaVariant, PostTag, User
+from services.cache_service import TTLCache
+from services.excerpt_service import listing_options
+from services.fragment_cache import invalidate_post_fragment
+from services.media_helpers import get_post_thumbnails
+from services.profile_service import clear_profile_totals, invalidate_profile_totals
 
-def get_all_blogs() -> Post:
+FEED_PAGE_SIZE = 12
+COMMENT_PAGE_SIZE = 20
 
-    return (
+# Rendered feed pages keyed by (cursor, limit). Short TTL so other workers
+# converge quickly; the local worker clears it on every post write.
+feed_cache = TTLCache(maxsize=128, ttl=30)
+
+
+# CURSORS (keyset positions over (created_at, id), used by the feed and comments)
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Returns (created_at, id) or None if the cursor is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+# FEED
+
+@read_replica()
+def get_feed(cursor: str = None, limit: int = FEED_PAGE_SIZE, category_id=None, tag_id=None):
+    """
+    Published posts, newest first, keyset-paginated on (created_at, id),
+    optionally only those in one category or with one tag.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Items are plain dicts so pages can be cached across requests.
+    """
+    cache_key = (cursor or "", limit, category_id, tag_id)
+    cached = feed_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    query = (
         db.session.query(Post)
-        .options(
-            joinedload(Post.author),
-            joinedload(Post.category)
-        )
+        .options(listing_options(), joinedload(Post.category))
+        .filter(Post.is_published.is_(True))
+    )
+    if category_id is not None:
+        query = query.filter(Post.category_id == category_id)  # ix_posts_category_created
+    if tag_id is not None:
+        query = query.join(PostTag, PostTag.post_id == Post.id).filter(PostTag.tag_id == tag_id)  # ix_post_tags_tag_post
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(tuple_(Post.created_at, Post.id) < tuple_(*position))
+
+    posts = (
+        query
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit + 1)
         .all()
     )
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+
+    thumbnails = get_post_thumbnails([post.id for post in posts])
+    items = [
+        {
+            "id": post.id,
+            "slug": post.slug,
+            "title": post.title,
+            "excerpt": post.excerpt,
+            "reading_minutes": post.reading_minutes,
+            "created_at": post.created_at,
+            "updated_at": post.updated_at,
+            "category_name": post.category.name if post.category else None,
+            "thumbnail": thumbnails.get(post.id),
+        }
+        for post in posts
+    ]
+    next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id) if has_more else None
 
+    result = (items, next_cursor)
+    feed_cache.set(cache_key, result)
+    return result
+
+def invalidate_feed_cache():
+    feed_cache.clear()
+
+
+# POST DETAIL
+
+@read_replica()
 def get_post_by_id(post_id):
+    """
+    The post with its author, category, tags, media and media variants. Each collection
+    is loaded by its own batched query; comments and likes are not loaded at all
+    (see get_post_comments, Post.like_count and has_liked).
+    """
     post = (
         db.session.query(Post)
         .options(
             joinedload(Post.author),
             joinedload(Post.category),
-            joinedload(Post.media),
-            joinedload(Post.comments).joinedload(Comment.user),
-            joinedload(Post.likes)
+            selectinload(Post.tags),
+            selectinload(Post.media).selectinload(PostMedia.variants)
         )
         .filter(Post.id == post_id)
         .first()
     )
     return post
 
-def get_post_media_by_post_id(post_id):
-    return (
-        db.session.query(PostMedia)
-        .filter(PostMedia.post_id == post_id)
-        .order_by(PostMedia.created_at.asc())
+@read_replica()
+def get_post_comments(post_id, before: str = None, limit: int = COMMENT_PAGE_SIZE):
+    """
+    One page of a post's comments, oldest first. The first page holds the most
+    recent `limit` comments; `before` is the cursor of an earlier page's oldest
+    comment. Returns (comments, older_cursor); older_cursor is None when there
+    is nothing older.
+    """
+    query = (
+        db.session.query(Comment)
+        .options(joinedload(Comment.user))
+        .filter(Comment.post_id == post_id)
+    )
+    position = decode_cursor(before) if before else None
+    if position:
+        query = query.filter(tuple_(Comment.created_at, Comment.id) < tuple_(*position))
+
+    comments = (
+        query
+        .order_by(Comment.created_at.desc(), Comment.id.desc())
+        .limit(limit + 1)
         .all()
     )
+    has_older = len(comments) > limit
+    comments = comments[:limit]
+    older_cursor = encode_cursor(comments[-1].created_at, comments[-1].id) if has_older else None
+
+    comments.reverse()
+    return comments, older_cursor
+
+@read_replica()
+def get_post_cache_state(post_id):
+    """
+    Everything the rendered post page depends on besides the viewer, in one small query:
+    a row of (author_id, updated_at, like_count, comment_count, variant_count, slug), or
+    None if the post doesn't exist.
+    """
+    variant_count = (
+        select(func.count(PostMediaVariant.id))
+        .join(PostMedia, PostMedia.id == PostMediaVariant.media_id)
+        .where(PostMedia.post_id == Post.id)
+        .scalar_subquery()
+    )
+    return db.session.execute(
+        select(
+            Post.author_id,
+            Post.updated_at,
+            Post.like_count,
+            Post.comment_count,
+            variant_count.label("variant_count"),
+            Post.slug
+        )
+        .where(Post.id == post_id)
+    ).first()
+
+def has_liked(post_id, user_id) -> bool:
+    return db.session.execute(
+        select(Like.id).where(Like.post_id == post_id, Like.user_id == user_id).limit(1)
+    ).first() is not None
 
 def add_comment(post_id, user_id, comment_msg):
     comment = Comment(
@@ -45,61 +188,119 @@ def add_comment(post_id, user_id, comment_msg):
         content = comment_msg
     )
     db.session.add(comment)
+    author_id = db.session.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(comment_count=Post.comment_count + 1)
+        .returning(Post.author_id)
+    ).scalar_one_or_none()
     db.session.commit()
+    invalidate_profile_totals(author_id)
+    invalidate_post_fragment(post_id)
     return comment
 
-def like_post(post_id, user_id):
-    
-    # check if user already like
-    existing_like = Like.query.filter_by(
-        post_id = post_id,
-        user_id = user_id
-    ).first()
-    
-    if existing_like:
+
+# LIKES
+# Each path is one INSERT/DELETE guarded by the unique_user_post_like
+# constraint plus one counter UPDATE, committed together. When adding a like the
+# UPDATE runs first: it doubles as the existence check, and the row lock it takes
+# keeps the post from being deleted before the like's foreign key is checked.
+
+def _insert_like(post_id, user_id) -> bool:
+    """Inserts the like unless it already exists. Returns True if a row was added."""
+    values = {"post_id": post_id, "user_id": user_id}
+
+    insert = dialect_insert(Like)
+    if insert is not None:
+        stmt = insert.values(**values).on_conflict_do_nothing()
+        return db.session.execute(stmt).rowcount == 1
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(Like(**values))
+        return True
+    except IntegrityError:
         return False
-    
-    like = Like(
-        post_id = post_id,
-        user_id = user_id
-    )
-    db.session.add(like)
-    db.session.commit()
-    
+
+def _adjust_like_count(post_id, delta: int) -> bool:
+    """Returns False when the post does not exist."""
+    author_id = db.session.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(like_count=Post.like_count + delta)
+        .returning(Post.author_id)
+    ).scalar_one_or_none()
+    if author_id is None:
+        return False
+
+    invalidate_profile_totals(author_id)
     return True
 
-def get_user_profile(user_id):
-    user = User.query.filter_by(id=user_id).first()
-    if not user:
+def like_post(post_id, user_id):
+    """Returns True if the like was added, False if it already existed, None if the post does not exist."""
+    if not _adjust_like_count(post_id, 1):
+        db.session.rollback()
         return None
 
-    posts = Post.query.filter_by(author_id=user_id).order_by(Post.created_at.desc()).all()
+    if not _insert_like(post_id, user_id):
+        db.session.rollback()
+        return False
+
+    db.session.commit()
+    return True
 
-    total_likes = 0
-    total_comments = 0
+def unlike_post(post_id, user_id) -> bool:
+    """Returns True if a like was removed."""
+    result = db.session.execute(
+        delete(Like)
+        .where(Like.post_id == post_id, Like.user_id == user_id)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
 
-    for post in posts:
-        post.likes_count = len(post.likes)
-        post.comments_count = len(post.comments)
-        total_likes += post.likes_count
-        total_comments += post.comments_count
+    _adjust_like_count(post_id, -1)
+    db.session.commit()
+    return True
 
-    profile_data = {
-        "username": user.username,
-        "email": user.email,
-        "is_active": user.is_active,
-        "created_at": user.created_at,
-        "posts": posts,
-        "total_likes": total_likes,
-        "total_comments": total_comments
-    }
+def toggle_post_like(post_id, user_id):
+    """
+    Likes the post, or removes the like if it already exists.
+    Returns True if the post is now liked, False if unliked, None if the post does not exist.
+    """
+    if unlike_post(post_id, user_id):
+        return False
 
-    return profile_data
+    if not _adjust_like_count(post_id, 1):
+        db.session.rollback()
+        return None
 
+    if not _insert_like(post_id, user_id):
+        # A concurrent request liked it between our DELETE and INSERT
+        db.session.rollback()
+        return True
 
-# # ---------------Testing of functions ----------------------------------
+    db.session.commit()
+    return True
 
-# if __name__ == '__main__':
-#     from app_copy import app
-#     with app.app_context():
-#         get_all_blogs()
\ No newline at end of file
+def reconcile_post_counters() -> int:
+    """Recomputes like/comment counters in bulk. Returns the number of repaired posts."""
+    likes = (
+        select(func.count(Like.id))
+        .where(Like.post_id == Post.id)
+        .scalar_subquery()
+    )
+    comments = (
+        select(func.count(Comment.id))
+        .where(Comment.post_id == Post.id)
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        update(Post)
+        .where(or_(Post.like_count != likes, Post.comment_count != comments))
+        .values(like_count=likes, comment_count=comments)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    clear_profile_totals()
+    return result.rowcount
@@ -0,0 +1,132 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache. Entries expire `ttl` seconds after they are set
+    and the least recently used entry is evicted once `maxsize` is reached.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    Shared cache backend on Redis, with the same interface as TTLCache.
+    Values are pickled; keys are namespaced with `prefix`.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl: float = 60):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key, default=None):
+        raw = self.client.get(self._key(key))
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self._key(key), pickle.dumps(value), ex=max(1, int(self.ttl)))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f"{self.prefix}:*"):
+            self.client.delete(key)
+
+
+class TieredCache:
+    """In-process TTLCache in front of an optional shared backend."""
+
+    def __init__(self, local: TTLCache, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.shared is None:
+            return default
+        value = self.shared.get(key)
+        if value is None:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+# Stand-ins for the shared backend when CACHE_URL=memory:// (tests / single box)
+_memory_backends = {}
+
+def get_shared_backend(namespace: str, ttl: float = 60):
+    """
+    Shared cache selected by CACHE_URL: unset -> None (in-process only),
+    'memory://' -> process-wide TTLCache stand-in, 'redis://...' -> RedisCache.
+    """
+    url = os.getenv("CACHE_URL")
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return _memory_backends.setdefault(namespace, TTLCache(maxsize=10_000, ttl=ttl))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url, prefix=namespace, ttl=ttl)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
@@ -1,17 +1,297 @@
 import os
+import queue
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from email.message import EmailMessage
+from sqlalchemy import delete, func, select, update
+from database import db
+from models.db_tables import EmailOutbox
 
-def send_email(to, subject, message):
+
+def build_message(to, subject, message) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = os.getenv("SENDER_EMAIL")
     msg["To"] = to
     msg["Subject"] = subject
     msg.set_content(message)
+    return msg
+
+
+# BACKENDS
+# A backend takes a list of EmailMessage objects and returns a list of the same
+# length holding None for each delivered message or the exception that failed it.
+
+class SMTPBackend:
+    """SMTP over SSL with a small pool of logged-in connections reused across batches."""
+
+    def __init__(self, host="smtp.gmail.com", port=465, username=None, password=None,
+                 pool_size=4, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        if self.username:
+            conn.login(self.username, self.password)
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.quit()
+        except smtplib.SMTPException:
+            conn.close()
+        except OSError:
+            pass
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close(conn)
+
+    def _checkin(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._close(conn)
+
+    def send_messages(self, messages):
+        conn = self._checkout()
+        results = []
+        for msg in messages:
+            try:
+                conn.send_message(msg)
+                results.append(None)
+            except (smtplib.SMTPServerDisconnected, OSError) as exc:
+                # The connection is gone; fail the rest of the batch so it is retried
+                self._close(conn)
+                return results + [exc] * (len(messages) - len(results))
+            except smtplib.SMTPException as exc:
+                results.append(exc)
+        self._checkin(conn)
+        return results
+
+
+class MemoryBackend:
+    """Keeps sent messages in `self.outbox`. For tests and local development."""
+
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self._lock:
+            self.outbox.extend(messages)
+        return [None] * len(messages)
+
+
+class FileBackend:
+    """Writes each message as an .eml file into `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send_messages(self, messages):
+        for msg in messages:
+            filename = f"{time.time_ns()}_{threading.get_ident()}.eml"
+            with open(os.path.join(self.directory, filename), "wb") as fh:
+                fh.write(msg.as_bytes())
+        return [None] * len(messages)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    Backend selected by EMAIL_BACKEND: 'smtp' (default), 'memory' or 'file'
+    (writes to EMAIL_FILE_PATH). Created once per process.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.getenv("EMAIL_BACKEND", "smtp")
+            if name == "memory":
+                _backend = MemoryBackend()
+            elif name == "file":
+                _backend = FileBackend(os.getenv("EMAIL_FILE_PATH", "sent_emails"))
+            else:
+                _backend = SMTPBackend(
+                    host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+                    port=int(os.getenv("SMTP_PORT", "465")),
+                    username=os.getenv("SENDER_EMAIL"),
+                    password=os.getenv("SENDER_PASSWORD"),
+                    pool_size=int(os.getenv("SMTP_POOL_SIZE", "4"))
+                )
+        return _backend
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# SENDING
+
+def queue_email(to, subject, message) -> EmailOutbox:
+    """Stores the email in the outbox; the outbox worker delivers it."""
+    email = EmailOutbox(recipient=to, subject=subject, body=message)
+    db.session.add(email)
+    db.session.commit()
+    return email
+
+def send_email(to, subject, message):
+    """Sends immediately through the configured backend, bypassing the outbox."""
+    error = get_backend().send_messages([build_message(to, subject, message)])[0]
+    if error:
+        raise error
+
+
+# OUTBOX WORKER
+
+# Bodies can hold one-time codes, so they are blanked once a row is sent or has
+# failed for good; the recipient, subject and status stay for the metrics.
+REDACTED_BODY = ""
+
+
+class OutboxWorker:
+    """
+    Drains the email outbox with a pool of sender threads.
+
+    Each poll claims up to `batch_size` due rows by leasing them (status 'sending'
+    with next_attempt_at pushed `lease_seconds` ahead), so rows left behind by a
+    crashed worker become due again once the lease runs out. The batch is split
+    across threads and every thread sends its share over one pooled connection.
+    Failures are retried with exponential backoff until `max_attempts`.
+    """
+
+    def __init__(self, app, backend=None, threads=4, batch_size=50, max_attempts=5,
+                 base_delay=30, lease_seconds=300):
+        self.app = app
+        self.backend = backend or get_backend()
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.lease_seconds = lease_seconds
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="email-outbox")
+
+    def claim_batch(self):
+        now = datetime.utcnow()
+        ids = db.session.execute(
+            select(EmailOutbox.id)
+            .where(
+                EmailOutbox.status.in_(("pending", "sending")),
+                EmailOutbox.next_attempt_at <= now
+            )
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if ids:
+            db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(ids))
+                .values(status="sending", next_attempt_at=now + timedelta(seconds=self.lease_seconds))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        return ids
+
+    def _deliver(self, ids):
+        with self.app.app_context():
+            emails = db.session.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).all()
+            messages = [build_message(e.recipient, e.subject, e.body) for e in emails]
+            try:
+                results = self.backend.send_messages(messages)
+            except Exception as exc:
+                results = [exc] * len(emails)
+
+            now = datetime.utcnow()
+            for email, error in zip(emails, results):
+                email.attempts += 1
+                if error is None:
+                    email.status = "sent"
+                    email.sent_at = now
+                    email.last_error = None
+                    email.body = REDACTED_BODY
+                elif email.attempts >= self.max_attempts:
+                    email.status = "failed"
+                    email.last_error = repr(error)
+                    email.body = REDACTED_BODY
+                else:
+                    email.status = "pending"
+                    email.last_error = repr(error)
+                    email.next_attempt_at = now + timedelta(seconds=self.base_delay * 2 ** (email.attempts - 1))
+            db.session.commit()
+            return sum(1 for error in results if error is None)
+
+    def run_once(self) -> int:
+        """Claims and delivers one batch. Returns the number of emails sent."""
+        with self.app.app_context():
+            ids = self.claim_batch()
+        if not ids:
+            return 0
+
+        chunk_size = -(-len(ids) // self.threads)
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        return sum(self.executor.map(self._deliver, chunks))
+
+    def run_forever(self, poll_interval=2.0):
+        while True:
+            if not self.run_once():
+                time.sleep(poll_interval)
+
+
+def purge_outbox(keep_days: int = 7, batch_size: int = 1000) -> int:
+    """Deletes sent and failed emails older than `keep_days`, `batch_size` at a time. Returns the count."""
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    removed = 0
+    while True:
+        ids = db.session.execute(
+            select(EmailOutbox.id)
+            .where(EmailOutbox.status.in_(("sent", "failed")), EmailOutbox.created_at < cutoff)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return removed
+
+        db.session.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(ids)))
+        db.session.commit()
+        removed += len(ids)
+
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-        smtp.login(
-            os.getenv("SENDER_EMAIL"),
-            os.getenv("SENDER_PASSWORD")
-        )
-        smtp.send_message(msg)
+def outbox_metrics() -> dict:
+    """Queue depth by status plus the age of the oldest undelivered email."""
+    counts = dict(
+        db.session.execute(
+            select(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status)
+        ).all()
+    )
+    oldest = db.session.execute(
+        select(func.min(EmailOutbox.created_at))
+        .where(EmailOutbox.status.in_(("pending", "sending")))
+    ).scalar()
+    return {
+        "pending": counts.get("pending", 0),
+        "sending": counts.get("sending", 0),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+    }
@@ -0,0 +1,65 @@
+import math
+from markupsafe import Markup
+from sqlalchemy import select, update
+from sqlalchemy.orm import defer
+from database import db
+from models.db_tables import Post
+
+# Listings (feeds, profile pages, search fallback) show a post's title and a
+# short excerpt, never its body, which can run to hundreds of kilobytes. The
+# plain-text excerpt and reading time are stored on the post whenever its
+# content is written (set_content), and listing queries defer the content
+# column with raiseload, so touching post.content in a listing template fails
+# loudly instead of loading every body one query at a time. Posts written
+# before these columns existed are filled in by `flask backfill-excerpts`.
+
+EXCERPT_LENGTH = 200
+WORDS_PER_MINUTE = 200
+
+
+def make_excerpt(content: str, length: int = EXCERPT_LENGTH) -> str:
+    """The content as plain text, cut at a word boundary to at most `length` characters."""
+    text = Markup(content or "").striptags()
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1].rsplit(" ", 1)[0] or text[:length - 1]
+    return cut.rstrip(" .,;:") + "…"
+
+def reading_minutes(content: str) -> int:
+    return max(1, math.ceil(len(Markup(content or "").striptags().split()) / WORDS_PER_MINUTE))
+
+def set_content(post: Post, content: str):
+    """Writes a post's content together with the fields derived from it."""
+    post.content = content
+    post.excerpt = make_excerpt(content)
+    post.reading_minutes = reading_minutes(content)
+
+def listing_options():
+    """Loader options for queries that list posts: the body is never loaded."""
+    return defer(Post.content, raiseload=True)
+
+
+# BACKFILL
+
+def backfill_excerpts(batch_size: int = 500) -> int:
+    """Fills in excerpts and reading times missing from older posts. Returns the number updated."""
+    updated, last_id = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Post.id, Post.content, Post.updated_at)
+            .where(Post.id > last_id, Post.excerpt.is_(None))
+            .order_by(Post.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+
+        # updated_at is passed through so its onupdate default doesn't mark every post as edited
+        db.session.execute(update(Post), [
+            {"id": post_id, "excerpt": make_excerpt(content), "reading_minutes": reading_minutes(content),
+             "updated_at": updated_at}
+            for post_id, content, updated_at in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
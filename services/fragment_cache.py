@@ -0,0 +1,36 @@
+from services.cache_service import TieredCache, TTLCache, get_shared_backend
+
+# Rendered HTML fragments stored as (version, fragment). A read only hits when
+# the caller's current version matches, so a stale entry in the shared backend
+# or in another worker's LRU is never served; write paths still delete their
+# entries right away so memory isn't held by dead versions.
+fragment_cache = TieredCache(
+    TTLCache(maxsize=512, ttl=600),
+    get_shared_backend("fragments", ttl=3600)
+)
+
+
+def get_fragment(key: str, version: str):
+    entry = fragment_cache.get(key)
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1]
+
+def set_fragment(key: str, version: str, fragment):
+    fragment_cache.set(key, (version, fragment))
+
+def invalidate_fragment(key: str):
+    fragment_cache.delete(key)
+
+
+# POST DETAIL
+
+def post_fragment_key(post_id) -> str:
+    return f"post:{post_id}"
+
+def post_fragment_version(state) -> str:
+    """Version of the cached post body: changes on edit, new comment or new image variants."""
+    return f"{state.updated_at.isoformat() if state.updated_at else ''}:{state.comment_count}:{state.variant_count}"
+
+def invalidate_post_fragment(post_id):
+    invalidate_fragment(post_fragment_key(post_id))
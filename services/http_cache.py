@@ -0,0 +1,56 @@
+import hashlib
+import re
+from flask import Response, get_flashed_messages, request, session
+
+# One year: the longest lifetime caches reliably honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# uploads/<sha256>.<ext> and the variants derived from it (<sha256>_thumb.webp, ...)
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(_[a-z0-9_]+)?\.[a-z0-9]+$")
+
+
+def is_content_addressed(filename: str) -> bool:
+    """True when the name is derived from the file's bytes, so it can never change."""
+    return bool(_CONTENT_ADDRESSED.match(filename))
+
+def make_etag(*parts) -> str:
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def not_modified(etag: str, public: bool = False):
+    """
+    Returns a ready 304 response when the request's If-None-Match matches `etag`,
+    so the caller can skip loading and rendering the page. Returns None otherwise.
+    Never short-circuits while flash messages are pending, since those must render.
+    """
+    if "_flashes" in session:
+        return None
+    if not request.if_none_match.contains(etag):
+        return None
+    return apply_validators(Response(status=304), etag, public=public)
+
+def _has_flashes() -> bool:
+    """True when flash messages are pending or were rendered into this response."""
+    # Rendering pops them from the session; get_flashed_messages() then returns
+    # the ones this request consumed (and pops nothing when there were none).
+    return "_flashes" in session or bool(get_flashed_messages())
+
+def apply_validators(response, etag: str, public: bool = False):
+    """
+    ETag plus revalidate-on-every-use caching. Anonymous pages are `public` so a
+    CDN can hold them and revalidate; per-user pages stay `private`.
+    A page carrying flash messages is a one-off: it gets no ETag and is not stored.
+    """
+    if _has_flashes():
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+        response.vary.add("Cookie")
+        return response
+
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    response.vary.add("Cookie")
+    return response
@@ -0,0 +1,180 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from sqlalchemy import select
+from database import db
+from models.db_tables import PostMedia, PostMediaVariant
+
+logger = logging.getLogger(__name__)
+
+# Bounding-box widths of the generated variants. Each is written once as
+# JPEG/PNG (same family as the original) and once as WebP.
+VARIANT_WIDTHS = {
+    "thumb": 400,
+    "medium": 1200,
+}
+
+# Refuse decompression bombs well before they reach the decoder
+MAX_IMAGE_PIXELS = 50_000_000
+
+
+# DERIVATIVES (runs inside the worker processes; no app or DB access here)
+
+def generate_variants(source_path: str, output_dir: str, basename: str) -> list:
+    """
+    Writes every variant of `source_path` into `output_dir` and returns a list of
+    dicts describing them (file name, mime type, width, height).
+
+    The image is opened lazily and, for JPEGs, `draft()` asks the decoder to
+    downscale while decoding, so a large photo is never expanded to full
+    resolution in memory. Variants are re-encoded from pixels only, which drops
+    EXIF/GPS and other metadata; the EXIF orientation is applied first.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    largest = max(VARIANT_WIDTHS.values())
+    variants = []
+
+    with Image.open(source_path) as image:
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+
+        for name, width in VARIANT_WIDTHS.items():
+            resized = image.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            resized = resized.convert("RGBA" if has_alpha else "RGB")
+
+            encodings = [
+                ("png", "image/png", {"optimize": True}) if has_alpha
+                else ("jpg", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+                ("webp", "image/webp", {"quality": 80, "method": 4}),
+            ]
+            for extension, mime_type, options in encodings:
+                filename = f"{basename}_{name}.{extension}"
+                resized.save(os.path.join(output_dir, filename), **options)
+                variants.append({
+                    "name": name if extension != "webp" else f"{name}_webp",
+                    "filename": filename,
+                    "mime_type": mime_type,
+                    "width": resized.width,
+                    "height": resized.height,
+                })
+
+    return variants
+
+def generate_stored_variants(storage, file_path: str) -> list:
+    """
+    generate_variants() for a stored upload: fetches the original into a scratch
+    directory when the backend isn't local, and puts every variant back into
+    the same storage as uploads/<name>.
+    """
+    basename = os.path.splitext(os.path.basename(file_path))[0]
+    with tempfile.TemporaryDirectory(prefix="variants-") as scratch:
+        source_path = storage.local_path(file_path)
+        if source_path is None:
+            source_path = os.path.join(scratch, "original")
+            storage.download(file_path, source_path)
+        variants = generate_variants(source_path, scratch, basename)
+        for variant in variants:
+            storage.put_file(
+                f"uploads/{variant['filename']}", os.path.join(scratch, variant["filename"]),
+                variant["mime_type"], move=True
+            )
+    return variants
+
+
+# POOL
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=int(os.getenv("IMAGE_WORKERS", "2")))
+        return _executor
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _discard_variants(app, file_path, variants):
+    """Deletes variant files rendered for a media row that no longer exists."""
+    # Variant names derive from the upload's bytes, so another post using the same
+    # upload shares them; those stay
+    if db.session.execute(select(PostMedia.id).where(PostMedia.file_path == file_path).limit(1)).first():
+        return
+    paths = {f"uploads/{variant['filename']}" for variant in variants}
+    referenced = set(db.session.execute(
+        select(PostMediaVariant.file_path).where(PostMediaVariant.file_path.in_(paths))
+    ).scalars())
+    storage = app.extensions["media_storage"]
+    for path in paths - referenced:
+        storage.delete(path)
+
+def _record_variants(app, media_id, file_path, future):
+    try:
+        variants = future.result()
+    except Exception:
+        logger.exception("Generating variants for media %s failed", media_id)
+        return
+
+    with app.app_context():
+        # The post may have been deleted while the pool was rendering; the lock
+        # keeps the media row from going away until the variants are recorded
+        media = db.session.execute(
+            select(PostMedia.id).where(PostMedia.id == media_id).with_for_update()
+        ).first()
+        if media is None:
+            _discard_variants(app, file_path, variants)
+            db.session.rollback()
+            return
+
+        db.session.query(PostMediaVariant).filter_by(media_id=media_id).delete()
+        db.session.add_all([
+            PostMediaVariant(
+                media_id=media_id,
+                name=variant["name"],
+                file_path=f"uploads/{variant['filename']}",
+                mime_type=variant["mime_type"],
+                width=variant["width"],
+                height=variant["height"]
+            )
+            for variant in variants
+        ])
+        db.session.commit()
+
+def schedule_variants(app, media_id, file_path, wait=False):
+    """
+    Generates the variants of a stored image in the process pool, off the
+    request path, and records them against the PostMedia row when done.
+    With wait=True the variants are recorded before returning (for CLI backfills).
+    Returns the future, or None when Pillow isn't installed.
+    """
+    if not pillow_available():
+        logger.warning("Pillow is not installed; skipping image variants for media %s", media_id)
+        return None
+
+    storage = app.extensions["media_storage"]
+    if storage.shared_across_processes:
+        future = get_executor().submit(generate_stored_variants, storage, file_path)
+    else:
+        # The workers can't see an in-process backend; render here instead
+        future = Future()
+        try:
+            future.set_result(generate_stored_variants(storage, file_path))
+        except Exception as exc:
+            future.set_exception(exc)
+    if wait:
+        _record_variants(app, media_id, file_path, future)
+    else:
+        future.add_done_callback(lambda done: _record_variants(app, media_id, file_path, done))
+    return future
@@ -0,0 +1,52 @@
+from sqlalchemy import func, select
+from database import db
+from models.db_tables import PostMedia, PostMediaVariant
+
+
+def _variant_dict(variant) -> dict:
+    return {
+        "file_path": variant.file_path,
+        "mime_type": variant.mime_type,
+        "width": variant.width,
+    }
+
+def get_post_thumbnails(post_ids) -> dict:
+    """
+    First image of each post as {post_id: {"file_path": ..., "variants": [...]}},
+    loaded in two queries whatever the number of posts.
+    """
+    if not post_ids:
+        return {}
+
+    ranked = (
+        select(
+            PostMedia.id,
+            PostMedia.post_id,
+            PostMedia.file_path,
+            func.row_number().over(
+                partition_by=PostMedia.post_id,
+                order_by=(PostMedia.created_at.asc(), PostMedia.id.asc())
+            ).label("position")
+        )
+        .where(PostMedia.post_id.in_(post_ids), PostMedia.media_type == "image")
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked.c.id, ranked.c.post_id, ranked.c.file_path).where(ranked.c.position == 1)
+    ).all()
+
+    thumbnails = {}
+    by_media_id = {}
+    for media_id, post_id, file_path in rows:
+        thumbnails[post_id] = by_media_id[media_id] = {"file_path": file_path, "variants": []}
+
+    if by_media_id:
+        variants = (
+            db.session.query(PostMediaVariant)
+            .filter(PostMediaVariant.media_id.in_(by_media_id))
+            .order_by(PostMediaVariant.width)
+        )
+        for variant in variants:
+            by_media_id[variant.media_id]["variants"].append(_variant_dict(variant))
+
+    return thumbnails
@@ -0,0 +1,355 @@
+import glob
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from flask import Response, abort, current_app, request
+from flask_login import current_user
+from sqlalchemy import event
+from database import db, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Request instrumentation. A WSGI middleware times each request end to end
+# (session load and save included) while SQLAlchemy cursor events count the
+# queries it runs and the time they take. Per route (the URL rule, so
+# "/post/<slug>" rather than every slug) it keeps latency, query count and DB
+# time histograms, exported in the Prometheus text format at /metrics. Three
+# things are also logged as one JSON object per line on this module's logger:
+#   - slow_query: a statement slower than SLOW_QUERY_MS
+#   - slow_request: a request slower than SLOW_REQUEST_MS, with its query totals
+#   - n_plus_one: one statement run N_PLUS_ONE_THRESHOLD times or more in a
+#     request (the same SQL with different parameters: a query in a loop);
+#     logged once per route and statement per process, always counted
+# Each process counts on its own. With several workers, point METRICS_DIR at a
+# directory they share (emptied on deploy) and each one writes its numbers
+# there every few seconds, so whichever worker answers /metrics reports all.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+FLUSH_SECONDS = 5
+MAX_LOGGED_STATEMENT = 500
+
+HELP = {
+    "http_requests_total": ("counter", "Requests answered, by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Request latency, session handling included."),
+    "http_request_db_queries": ("histogram", "Queries run per request."),
+    "http_request_db_seconds": ("histogram", "Time per request spent waiting on queries."),
+    "http_slow_requests_total": ("counter", "Requests slower than SLOW_REQUEST_MS."),
+    "db_queries_total": ("counter", "Queries run, by route (empty outside requests)."),
+    "db_slow_queries_total": ("counter", "Queries slower than SLOW_QUERY_MS."),
+    "db_n_plus_one_total": ("counter", "Requests that repeated one statement N_PLUS_ONE_THRESHOLD times or more."),
+}
+
+
+def log_event(name: str, **fields):
+    logger.warning(json.dumps({"event": name, **fields}, default=str))
+
+def _statement_text(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement).strip()[:MAX_LOGGED_STATEMENT]
+
+
+# REGISTRY
+
+class Registry:
+    """Counters and histograms keyed by (metric name, sorted label pairs)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}  # key -> [bucket counts..., sum, count]
+        self.buckets = {}
+
+    def inc(self, name: str, labels: dict, value: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.buckets.setdefault(name, buckets)
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self) -> dict:
+        """JSON-friendly copy, mergeable with other processes' snapshots."""
+        with self._lock:
+            return {
+                "counters": [[name, list(map(list, labels)), value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, list(map(list, labels)), list(entry)]
+                               for (name, labels), entry in self.histograms.items()],
+                "buckets": {name: list(bounds) for name, bounds in self.buckets.items()},
+            }
+
+
+def merge_snapshots(snapshots) -> Registry:
+    merged = Registry()
+    for snapshot in snapshots:
+        merged.buckets.update({name: tuple(bounds) for name, bounds in snapshot["buckets"].items()})
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged.counters[key] = merged.counters.get(key, 0) + value
+        for name, labels, entry in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            current = merged.histograms.get(key)
+            merged.histograms[key] = entry if current is None else [a + b for a, b in zip(current, entry)]
+    return merged
+
+
+registry = Registry()
+
+
+# PER-REQUEST STATE
+
+class RequestStats:
+    """Queries seen while one request is in flight."""
+
+    __slots__ = ("route", "queries", "db_time", "statements", "slow_queries")
+
+    def __init__(self):
+        self.route = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+        self.slow_queries = []
+
+_current = ContextVar("request_stats", default=None)
+
+
+def _on_before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+def _on_error(exception_context):
+    # after_cursor_execute never runs for a failed statement
+    if exception_context.connection is not None:
+        exception_context.connection.info.pop("query_start", None)
+
+def _on_after_execute(settings):
+    def on_after_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        slow = elapsed * 1000 >= settings["slow_query_ms"]
+        stats = _current.get()
+        if stats is None:
+            # CLI commands and background threads
+            registry.inc("db_queries_total", {"route": ""})
+            if slow:
+                registry.inc("db_slow_queries_total", {"route": ""})
+                log_event("slow_query", route=None, duration_ms=round(elapsed * 1000, 1),
+                          statement=_statement_text(statement))
+            return
+        # The session is loaded before routing, so the route is only known once the request is done
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        if slow:
+            stats.slow_queries.append((elapsed, statement))
+    return on_after_execute
+
+
+class MetricsMiddleware:
+    """Times every request and records what it cost once the response is built."""
+
+    def __init__(self, wsgi_app, settings):
+        self.wsgi_app = wsgi_app
+        self.settings = settings
+        self._logged_repeats = set()
+        self._last_flush = 0.0
+
+    def __call__(self, environ, start_response):
+        stats = RequestStats()
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status.append(status_line.split(" ", 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, capture_status)
+        finally:
+            # Streamed bodies are still being sent here; they count up to their first byte
+            self.record(stats, environ.get("REQUEST_METHOD", ""), status[0] if status else "500",
+                        time.perf_counter() - start)
+            _current.reset(token)
+
+    def record(self, stats, method, status, elapsed):
+        route = stats.route or "<unmatched>"
+        registry.inc("http_requests_total", {"route": route, "method": method, "status": status})
+        registry.observe("http_request_duration_seconds", {"route": route, "method": method}, elapsed)
+        registry.observe("http_request_db_queries", {"route": route}, stats.queries, QUERY_COUNT_BUCKETS)
+        registry.observe("http_request_db_seconds", {"route": route}, stats.db_time)
+        if stats.queries:
+            registry.inc("db_queries_total", {"route": route}, stats.queries)
+        for duration, sql in stats.slow_queries:
+            registry.inc("db_slow_queries_total", {"route": route})
+            log_event("slow_query", route=route, method=method, duration_ms=round(duration * 1000, 1),
+                      statement=_statement_text(sql))
+
+        threshold = self.settings["n_plus_one_threshold"]
+        repeated = {sql: count for sql, count in stats.statements.items() if count >= threshold} if threshold else {}
+        if repeated:
+            registry.inc("db_n_plus_one_total", {"route": route})
+            for sql, count in repeated.items():
+                if (route, sql) not in self._logged_repeats:
+                    self._logged_repeats.add((route, sql))
+                    log_event("n_plus_one", route=route, method=method, count=count, statement=_statement_text(sql))
+
+        if elapsed * 1000 >= self.settings["slow_request_ms"]:
+            registry.inc("http_slow_requests_total", {"route": route})
+            log_event(
+                "slow_request", route=route, method=method, status=status,
+                duration_ms=round(elapsed * 1000, 1), queries=stats.queries, db_ms=round(stats.db_time * 1000, 1),
+                repeated_statements=len(repeated)
+            )
+
+        if self.settings["dir"] and time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+            self._last_flush = time.monotonic()
+            write_snapshot(self.settings["dir"])
+
+
+# MULTI-PROCESS
+
+def _snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"metrics-{pid}.json")
+
+def write_snapshot(directory: str):
+    path = _snapshot_path(directory, os.getpid())
+    try:
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+    except OSError:
+        logger.exception("Writing metrics to %s failed", directory)
+
+def collected_registry(directory: str = None) -> Registry:
+    """This process's metrics, plus those every other worker wrote to `directory`."""
+    if not directory:
+        return registry
+    own = _snapshot_path(directory, os.getpid())
+    snapshots = [registry.snapshot()]
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        if path == own:
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # being replaced right now; next scrape has it
+    return merge_snapshots(snapshots)
+
+
+# EXPOSITION
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def render(reg: Registry, gauges: dict = None) -> str:
+    """Prometheus text exposition of `reg`, plus {name: [(labels, value)]} gauges."""
+    lines = []
+    families = {}
+    for (name, labels), value in reg.counters.items():
+        families.setdefault(name, []).append((labels, value))
+    for (name, labels), entry in reg.histograms.items():
+        families.setdefault(name, []).append((labels, entry))
+
+    for name in sorted(families):
+        kind, help_text = HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(families[name]):
+            if kind != "histogram":
+                lines.append(f"{name}{_label_text(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(reg.buckets[name], value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_label_text((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_bucket{_label_text((*labels, ('le', '+Inf')))} {value[-1]}")
+            lines.append(f"{name}_sum{_label_text(labels)} {value[-2]}")
+            lines.append(f"{name}_count{_label_text(labels)} {value[-1]}")
+
+    for name, samples in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_label_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def service_gauges() -> dict:
+    """Connection pool and email outbox figures, read at scrape time."""
+    from services.email_service import outbox_metrics
+
+    gauges = {}
+    for bind, stats in pool_stats().items():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                gauges.setdefault(f"db_pool_{key}", []).append(((("bind", bind),), value))
+    try:
+        for key, value in outbox_metrics().items():
+            gauges[f"email_outbox_{key}"] = [((), value)]
+    except Exception:
+        db.session.rollback()
+        logger.exception("Reading outbox metrics failed")
+    return gauges
+
+
+# FLASK WIRING
+
+def metrics_view():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            abort(401)
+    elif not (current_user.is_authenticated and current_user.is_admin):
+        # Without a token only signed-in admins may read it; scrapers need METRICS_TOKEN
+        abort(403)
+    body = render(collected_registry(current_app.config.get("METRICS_DIR")), service_gauges())
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+def init_metrics(app):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    settings = {
+        "slow_query_ms": app.config.get("SLOW_QUERY_MS", 100),
+        "slow_request_ms": app.config.get("SLOW_REQUEST_MS", 1000),
+        "n_plus_one_threshold": app.config.get("N_PLUS_ONE_THRESHOLD", 5),
+        "dir": app.config.get("METRICS_DIR"),
+    }
+    if settings["dir"]:
+        os.makedirs(settings["dir"], exist_ok=True)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _on_before_execute)
+            event.listen(engine, "after_cursor_execute", _on_after_execute(settings))
+            event.listen(engine, "handle_error", _on_error)
+
+    @app.before_request
+    def tag_route():
+        stats = _current.get()
+        if stats is not None and request.url_rule is not None:
+            stats.route = request.url_rule.rule
+
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, settings)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
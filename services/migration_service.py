@@ -0,0 +1,232 @@
+import importlib.util
+import os
+import re
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+# Schema changes live in migrations/NNNN_<name>.py, one revision per file,
+# chained through `down_revision` like Alembic's. Each module defines
+# `upgrade(op)` and `downgrade(op)`, where `op` is an Operations object bound to
+# one connection. Every operation is a no-op when the change is already there,
+# so a migration that failed halfway can simply be run again.
+#
+# An empty database is created from the models and stamped with the newest
+# revision (create_or_upgrade); one created with create_all() before migrations
+# existed has no recorded revision and counts as the baseline.
+#
+# A migration runs in its own transaction and records its revision in the same
+# one. Modules that set `transactional = False` run in autocommit instead, so
+# PostgreSQL can build their indexes CONCURRENTLY without locking writes.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+BASELINE = "0001"
+
+_version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", String(32), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+class Migration:
+    __slots__ = ("revision", "down_revision", "description", "module", "transactional")
+
+    def __init__(self, module):
+        self.module = module
+        self.revision = module.revision
+        self.down_revision = module.down_revision
+        self.description = next(iter((module.__doc__ or "").strip().splitlines()), "")
+        self.transactional = getattr(module, "transactional", True)
+
+
+def load_migrations(directory=MIGRATIONS_DIR) -> list:
+    """Every migration in `directory`, ordered from the baseline to the head."""
+    by_down = {}
+    for filename in sorted(os.listdir(directory)):
+        if not re.match(r"^\d{4}_\w+\.py$", filename):
+            continue
+        spec = importlib.util.spec_from_file_location(f"migrations_{filename[:-3]}", os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migration = Migration(module)
+        if migration.down_revision in by_down:
+            raise MigrationError(f"Revisions {by_down[migration.down_revision].revision} and "
+                                 f"{migration.revision} both follow {migration.down_revision}")
+        by_down[migration.down_revision] = migration
+
+    chain, revision = [], None
+    while revision in by_down:
+        chain.append(by_down.pop(revision))
+        revision = chain[-1].revision
+    if by_down:
+        raise MigrationError(f"Unreachable revisions: {', '.join(m.revision for m in by_down.values())}")
+    return chain
+
+
+# OPERATIONS
+
+class Operations:
+    """The schema operations available to a migration, on one connection."""
+
+    def __init__(self, connection, concurrently: bool = False):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.concurrently = concurrently and self.dialect == "postgresql"
+
+    def _quote(self, name: str) -> str:
+        return self.connection.dialect.identifier_preparer.quote(name)
+
+    def has_table(self, table: str) -> bool:
+        return inspect(self.connection).has_table(table)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return self.has_table(table) and column in {c["name"] for c in inspect(self.connection).get_columns(table)}
+
+    def has_index(self, table: str, name: str) -> bool:
+        return self.has_table(table) and name in {i["name"] for i in inspect(self.connection).get_indexes(table)}
+
+    def execute(self, sql: str, params=None):
+        return self.connection.execute(text(sql), params or {})
+
+    def create_table(self, table: Table):
+        """Creates `table` (defined on the migration's own MetaData) with its indexes, if missing."""
+        table.create(self.connection, checkfirst=True)
+
+    def drop_table(self, table: str):
+        self.execute(f"DROP TABLE IF EXISTS {self._quote(table)}")
+
+    def add_column(self, table: str, column: Column):
+        if self.has_column(table, column.name):
+            return
+        Table(table, MetaData(), column)
+        ddl = CreateColumn(column).compile(dialect=self.connection.dialect)
+        self.execute(f"ALTER TABLE {self._quote(table)} ADD COLUMN {ddl}")
+
+    def drop_column(self, table: str, column: str):
+        if self.has_column(table, column):
+            self.execute(f"ALTER TABLE {self._quote(table)} DROP COLUMN {self._quote(column)}")
+
+    def create_index(self, name: str, table: str, columns, unique: bool = False):
+        if self.has_index(table, name):
+            return
+        target = Table(table, MetaData(), *[Column(column) for column in columns])
+        index = Index(name, *[target.c[column] for column in columns], unique=unique,
+                      postgresql_concurrently=self.concurrently)
+        index.create(self.connection)
+
+    def drop_index(self, name: str, table: str):
+        if self.has_index(table, name):
+            concurrently = "CONCURRENTLY " if self.concurrently else ""
+            self.execute(f"DROP INDEX {concurrently}{self._quote(name)}")
+
+
+# VERSION
+
+def current_revision(connection):
+    if not inspect(connection).has_table(_version_table.name):
+        return None
+    return connection.execute(_version_table.select().with_only_columns(_version_table.c.version)).scalar()
+
+def _set_revision(connection, revision):
+    _version_table.create(connection, checkfirst=True)
+    connection.execute(_version_table.delete())
+    if revision is not None:
+        connection.execute(_version_table.insert().values(version=revision, applied_at=datetime.utcnow()))
+
+def _database_revision(engine):
+    """(revision, inferred): a database with tables but no recorded revision is at the baseline."""
+    with engine.connect() as connection:
+        current = current_revision(connection)
+        if current is None and inspect(connection).get_table_names():
+            return BASELINE, True
+    return current, False
+
+def stamp(engine, revision):
+    """Records `revision` as applied without running anything."""
+    with engine.begin() as connection:
+        _set_revision(connection, revision)
+
+def _run(engine, migration, direction: str, new_revision):
+    step = getattr(migration.module, direction)
+    if migration.transactional:
+        with engine.begin() as connection:
+            step(Operations(connection))
+            _set_revision(connection, new_revision)
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            step(Operations(connection, concurrently=True))
+            _set_revision(connection, new_revision)
+
+
+# COMMANDS
+
+def upgrade(engine, target: str = None, migrations=None) -> list:
+    """
+    Applies the migrations after the database's revision, up to `target`
+    (default: the head). A database with tables but no revision is taken to
+    be at the baseline. Returns the applied migrations.
+    """
+    migrations = migrations if migrations is not None else load_migrations()
+    revisions = [m.revision for m in migrations]
+    if target is not None and target not in revisions:
+        raise MigrationError(f"Unknown revision {target}")
+
+    current, inferred = _database_revision(engine)
+    if current is not None and current not in revisions:
+        raise MigrationError(f"Database is at unknown revision {current}")
+    if inferred:
+        stamp(engine, BASELINE)
+
+    start = revisions.index(current) + 1 if current else 0
+    stop = revisions.index(target) + 1 if target else len(revisions)
+    applied = []
+    for migration in migrations[start:stop]:
+        _run(engine, migration, "upgrade", migration.revision)
+        applied.append(migration)
+    return applied
+
+def downgrade(engine, target: str, migrations=None) -> list:
+    """Reverts migrations, newest first, until `target` is the current revision. Returns them."""
+    migrations = migrations if migrations is not None else load_migrations()
+    revisions = [m.revision for m in migrations]
+    if target not in revisions:
+        raise MigrationError(f"Unknown revision {target}")
+
+    current, _ = _database_revision(engine)
+    if current is None:
+        raise MigrationError("Database has no recorded revision")
+
+    reverted = []
+    for migration in reversed(migrations[revisions.index(target) + 1:revisions.index(current) + 1]):
+        _run(engine, migration, "downgrade", migration.down_revision)
+        reverted.append(migration)
+    return reverted
+
+def create_or_upgrade(engine, create_all, migrations=None) -> list:
+    """
+    Brings the database to the head: an empty one is built by `create_all()`
+    and stamped, an existing one is migrated. Returns the applied migrations.
+    """
+    migrations = migrations if migrations is not None else load_migrations()
+    with engine.connect() as connection:
+        empty = not inspect(connection).get_table_names()
+    if empty:
+        # Nothing to migrate: the models are the head schema
+        create_all()
+        stamp(engine, migrations[-1].revision)
+        return []
+    return upgrade(engine, migrations=migrations)
+
+def status(engine, migrations=None):
+    """(current revision, [pending migrations])."""
+    migrations = migrations if migrations is not None else load_migrations()
+    current, _ = _database_revision(engine)
+    revisions = [m.revision for m in migrations]
+    start = revisions.index(current) + 1 if current in revisions else 0
+    return current, migrations[start:]
@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing is deliberately expensive: Werkzeug's default scrypt costs
+# tens of milliseconds of CPU and 32 MiB per call. It runs in a small process
+# pool (KDF_WORKERS per web worker, 0 = inline), so a burst of logins queues
+# for a few cores instead of pinning every web worker. The queue is bounded
+# too: past KDF_MAX_PENDING calls in flight, a caller waits at most
+# KDF_QUEUE_TIMEOUT seconds for room and then gets KdfBusy (answered with a
+# 503), which is the backpressure the throttles in front of it rely on.
+
+
+class KdfBusy(RuntimeError):
+    pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(int(os.getenv("KDF_MAX_PENDING", "16")))
+
+def get_executor():
+    """The KDF process pool, or None when KDF_WORKERS=0."""
+    global _executor
+    with _executor_lock:
+        workers = int(os.getenv("KDF_WORKERS", "2"))
+        if _executor is None and workers > 0:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+def _reset_executor(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=float(os.getenv("KDF_QUEUE_TIMEOUT", "2"))):
+        raise KdfBusy("Too many password checks in progress")
+    try:
+        for attempt in range(2):
+            executor = get_executor()
+            if executor is None:
+                return fn(*args)
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM killed); start a fresh pool and retry once
+                _reset_executor(executor)
+                if attempt:
+                    raise
+    finally:
+        _slots.release()
+
+
+# HASHING
+
+def hash_password(password: str, method: str) -> str:
+    return _run(generate_password_hash, password, method)
+
+def check_password(password_hash: str, password: str) -> bool:
+    return _run(check_password_hash, password_hash, password)
+
+@lru_cache(maxsize=8)
+def _canonical_method(method: str) -> str:
+    # "scrypt" is stored as "scrypt:32768:8:1"; hash once to learn the spelled-out form
+    return generate_password_hash("", method).split("$", 1)[0]
+
+def needs_rehash(password_hash: str, method: str) -> bool:
+    """True when `password_hash` was made with other parameters than `method`."""
+    return password_hash.split("$", 1)[0] != _canonical_method(method)
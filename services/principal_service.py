@@ -0,0 +1,119 @@
+import uuid
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from database import db
+from models.db_tables import User
+from services.cache_service import TieredCache, TTLCache, get_shared_backend
+
+# Flask-Login reloads the user on every authenticated request. Instead of the
+# full ORM User, requests get a small Principal built from a handful of
+# columns and cached by user id, so most requests never touch the users table.
+
+# Columns copied onto the principal, plus password_hash: a password reset
+# must drop the cached entry even though the hash itself is never cached.
+PRINCIPAL_FIELDS = ("username", "email", "is_active", "is_admin", "is_email_verified")
+_WATCHED_FIELDS = PRINCIPAL_FIELDS + ("password_hash",)
+
+principal_cache = TieredCache(
+    TTLCache(maxsize=4096, ttl=300),
+    get_shared_backend("principals", ttl=300)
+)
+
+
+class Principal:
+    """
+    The logged-in user as Flask-Login sees it. Handlers that need the ORM
+    object (relationships, writes) call `load()`.
+    """
+
+    __slots__ = ("id",) + PRINCIPAL_FIELDS
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, email, is_active, is_admin, is_email_verified):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_active = is_active
+        self.is_admin = is_admin
+        self.is_email_verified = is_email_verified
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def load(self) -> User:
+        """The full User, from the session's identity map if already loaded this request."""
+        return db.session.get(User, self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, (Principal, User)) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<Principal {self.username}>"
+
+
+# LOOKUP
+
+def get_principal(user_id):
+    """Cached Principal for `user_id` (UUID or its string form), or None if there is no such user."""
+    try:
+        user_id = user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))
+    except ValueError:
+        return None
+
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    row = db.session.execute(
+        select(User.id, *(getattr(User, field) for field in PRINCIPAL_FIELDS))
+        .where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+
+    principal = Principal(*row)
+    principal_cache.set(user_id, principal)
+    return principal
+
+def load_principal(user_id):
+    """Flask-Login user_loader: deactivated accounts are logged out."""
+    principal = get_principal(user_id)
+    if principal is None or not principal.is_active:
+        return None
+    return principal
+
+def invalidate_principal(user_id):
+    principal_cache.delete(user_id)
+
+
+# INVALIDATION
+# Any flushed change to a watched column (or a deleted user) drops the cached
+# principal once the transaction ends, whichever code path made the change.
+# Waiting for the commit keeps a concurrent request from re-caching the old row.
+
+_PENDING_KEY = "principals_to_invalidate"
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _WATCHED_FIELDS):
+        state.session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    inspect(target).session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_principal(user_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _invalidate_rolled_back(session, previous_transaction):
+    # Dropping an entry that didn't change only costs one extra lookup
+    _invalidate_committed(session)
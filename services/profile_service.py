@@ -0,0 +1,83 @@
+from sqlalchemy import func, select
+from database import db
+from models.db_tables import Post, User
+from services.cache_service import TTLCache
+from services.excerpt_service import listing_options
+from services.media_helpers import get_post_thumbnails
+
+PROFILE_PAGE_SIZE = 9
+
+# Per-author totals, dropped whenever one of the author's posts gains or loses
+# a like/comment or a new post is published.
+profile_totals_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+# TOTALS
+
+def get_profile_totals(user_id) -> dict:
+    """Post, like and comment totals for an author in one aggregate query."""
+    totals = profile_totals_cache.get(user_id)
+    if totals is not None:
+        return totals
+
+    total_posts, total_likes, total_comments = db.session.execute(
+        select(
+            func.count(Post.id),
+            func.coalesce(func.sum(Post.like_count), 0),
+            func.coalesce(func.sum(Post.comment_count), 0)
+        )
+        .where(Post.author_id == user_id)
+    ).one()
+
+    totals = {
+        "total_posts": total_posts,
+        "total_likes": total_likes,
+        "total_comments": total_comments
+    }
+    profile_totals_cache.set(user_id, totals)
+    return totals
+
+def invalidate_profile_totals(user_id):
+    if user_id is not None:
+        profile_totals_cache.delete(user_id)
+
+def clear_profile_totals():
+    profile_totals_cache.clear()
+
+
+# PROFILE
+
+def get_user_profile(user_id, page: int = 1, per_page: int = PROFILE_PAGE_SIZE):
+    user = db.session.get(User, user_id)
+    if not user:
+        return None
+
+    page = max(page, 1)
+    posts = (
+        db.session.query(Post)
+        .options(listing_options())
+        .filter(Post.author_id == user_id)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    has_next = len(posts) > per_page
+    posts = posts[:per_page]
+
+    thumbnails = get_post_thumbnails([post.id for post in posts])
+    for post in posts:
+        post.thumbnail = thumbnails.get(post.id)
+
+    profile_data = {
+        "username": user.username,
+        "email": user.email,
+        "is_active": user.is_active,
+        "created_at": user.created_at,
+        "posts": posts,
+        "page": page,
+        "has_next": has_next,
+        **get_profile_totals(user_id)
+    }
+
+    return profile_data
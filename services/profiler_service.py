@@ -0,0 +1,228 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import delete, insert, select
+from database import db
+from models.db_tables import RequestProfile
+from services.cache_service import TTLCache, get_shared_backend
+from services.session_service import secret_keys
+
+logger = logging.getLogger(__name__)
+
+# On-demand request profiling. A profiled request gets a helper thread that
+# samples the handling thread's Python stack every PROFILE_INTERVAL_MS, from
+# before_request until teardown, so view code, ORM calls, template rendering
+# and the session save all show up. The stacks are stored in the
+# request_profiles table in the collapsed ("folded") format that flamegraph.pl,
+# speedscope and inferno read, and listed at /admin/profiles. A request is
+# profiled when:
+#   - it carries a valid X-Profile-Token header (`flask profile-token`, or the
+#     admin page), signed with SECRET_KEY and valid PROFILE_TOKEN_MAX_AGE seconds
+#   - an admin has switched profiling on for its route (or all routes) for a
+#     few minutes; shared through CACHE_URL, so every worker sees it within
+#     TOGGLE_REFRESH seconds
+#   - it is picked by PROFILE_SAMPLE_RATE (0..1)
+# With PROFILING_ENABLED=false none of the hooks are installed.
+
+PROFILE_HEADER = "X-Profile-Token"
+TOKEN_SALT = "request-profile"
+TOGGLE_REFRESH = 5
+MAX_TOGGLE_MINUTES = 60
+
+_toggle_store = get_shared_backend("profiler", ttl=MAX_TOGGLE_MINUTES * 60) or \
+    TTLCache(maxsize=1, ttl=MAX_TOGGLE_MINUTES * 60)
+_toggle_local = TTLCache(maxsize=1, ttl=TOGGLE_REFRESH)
+_TOGGLE_OFF = ("", 0.0)
+
+
+# SAMPLING
+
+_app_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_stdlib_root = os.path.dirname(os.__file__)
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    if path.startswith(_app_root):
+        path = os.path.relpath(path, _app_root)
+    elif "site-packages" in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    elif path.startswith(_stdlib_root):
+        path = os.path.relpath(path, _stdlib_root)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+def _part_of(code) -> str:
+    path = code.co_filename
+    if f"{os.sep}sqlalchemy{os.sep}" in path:
+        return "orm"
+    if f"{os.sep}jinja2{os.sep}" in path or path.endswith(".html"):
+        return "template"
+    return ""
+
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds from a helper thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # tuple of code objects, leaf first -> samples
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(stack)] += 1
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def folded(self) -> str:
+        """One "root;caller;...;leaf count" line per distinct stack."""
+        labels = {}
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = [labels[code] if code in labels else labels.setdefault(code, _frame_label(code))
+                     for code in reversed(stack)]
+            lines.append(f"{';'.join(names)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def time_in(self) -> dict:
+        """Sampled milliseconds spent under SQLAlchemy and under Jinja, by innermost match."""
+        totals = {"orm": 0, "template": 0}
+        for stack, count in self.stacks.items():
+            part = next((p for p in map(_part_of, stack) if p), "")
+            if part:
+                totals[part] += count
+        return {part: round(count * self.interval * 1000, 1) for part, count in totals.items()}
+
+
+# TRIGGERS
+
+def _serializer(app) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(secret_keys(app), salt=TOKEN_SALT)
+
+def make_profile_token(app) -> str:
+    return _serializer(app).dumps("profile")
+
+def _valid_token(app, token: str) -> bool:
+    try:
+        _serializer(app).loads(token, max_age=app.config.get("PROFILE_TOKEN_MAX_AGE", 3600))
+    except BadSignature:
+        return False
+    return True
+
+def get_toggle() -> tuple:
+    """(route or "" for every route, until as a Unix time) of the admin toggle."""
+    toggle = _toggle_local.get("toggle")
+    if toggle is None:
+        toggle = _toggle_store.get("toggle") or _TOGGLE_OFF
+        _toggle_local.set("toggle", toggle)
+    return toggle
+
+def set_toggle(route: str, minutes: float):
+    """Profiles every request to `route` ("" for all) for `minutes`; 0 switches it off."""
+    minutes = max(0, min(minutes, MAX_TOGGLE_MINUTES))
+    toggle = (route, time.time() + minutes * 60) if minutes else _TOGGLE_OFF
+    _toggle_store.set("toggle", toggle)
+    _toggle_local.set("toggle", toggle)
+
+def _trigger(app):
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        return "header" if _valid_token(app, token) else None
+    if request.endpoint == "static":
+        return None
+    route, until = get_toggle()
+    if until > time.time() and (not route or (request.url_rule is not None and request.url_rule.rule == route)):
+        return "toggle"
+    rate = app.config.get("PROFILE_SAMPLE_RATE", 0)
+    if rate and random.random() < rate:
+        return "sample"
+    return None
+
+
+# STORAGE
+
+def save_profile(sampler: StackSampler, trigger: str, status: int, duration: float):
+    parts = sampler.time_in()
+    with db.engine.begin() as connection:
+        connection.execute(insert(RequestProfile).values(
+            route=request.url_rule.rule if request.url_rule is not None else "<unmatched>",
+            method=request.method,
+            path=request.full_path.rstrip("?")[:500],
+            status=status,
+            trigger=trigger,
+            duration_ms=round(duration * 1000, 1),
+            samples=sampler.samples,
+            orm_ms=parts["orm"],
+            template_ms=parts["template"],
+            folded=sampler.folded(),
+        ))
+        keep = current_app.config.get("PROFILE_KEEP", 200)
+        oldest_kept = connection.execute(
+            select(RequestProfile.id).order_by(RequestProfile.id.desc()).offset(keep - 1).limit(1)
+        ).scalar()
+        if oldest_kept is not None:
+            connection.execute(delete(RequestProfile).where(RequestProfile.id < oldest_kept))
+
+def recent_profiles(limit: int = 100) -> list:
+    return db.session.execute(
+        select(
+            RequestProfile.id, RequestProfile.route, RequestProfile.method, RequestProfile.path,
+            RequestProfile.status, RequestProfile.trigger, RequestProfile.duration_ms, RequestProfile.samples,
+            RequestProfile.orm_ms, RequestProfile.template_ms, RequestProfile.created_at
+        ).order_by(RequestProfile.id.desc()).limit(limit)
+    ).all()
+
+
+# FLASK WIRING
+
+def init_profiler(app):
+    if not app.config.get("PROFILING_ENABLED", True):
+        return
+    interval = app.config.get("PROFILE_INTERVAL_MS", 5) / 1000
+
+    @app.before_request
+    def start_profile():
+        trigger = _trigger(app)
+        if trigger:
+            g.profile = (StackSampler(threading.get_ident(), interval).start(), trigger, time.perf_counter())
+
+    @app.after_request
+    def note_status(response):
+        if "profile" in g:
+            g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        sampler, trigger, start = profile
+        sampler.stop()
+        try:
+            save_profile(sampler, trigger, g.get("profile_status", 500), time.perf_counter() - start)
+        except Exception:
+            logger.exception("Saving the profile of %s failed", request.path)
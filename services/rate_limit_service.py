@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+from flask import current_app
+from services.cache_service import RedisCache, TTLCache, get_shared_backend
+
+# Token buckets in front of the credential endpoints. Every attempt takes a
+# token from the client IP's bucket and, when the form names an account, from
+# that account's bucket; an empty bucket refuses the attempt until it refills.
+# Limits are "capacity/seconds" (RATE_LIMIT_<SCOPE>_IP / _ACCOUNT): a burst of
+# `capacity`, refilled evenly over `seconds`. Buckets live in the shared cache
+# under CACHE_URL (updated atomically by a Lua script on Redis), so all workers
+# and nodes count together; without it each process counts on its own.
+
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = math.min(capacity, (tonumber(state[1]) or capacity) + (now - (tonumber(state[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return tostring(wait)
+"""
+
+
+def parse_limit(limit: str) -> tuple:
+    """"10/60" -> (10, 60.0)"""
+    capacity, seconds = limit.split("/")
+    return int(capacity), float(seconds)
+
+
+class TokenBucket:
+    """Buckets of `capacity` tokens per key, each refilled at capacity / period per second."""
+
+    def __init__(self, name: str, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        # An idle bucket is full again after `period`, so expiring it then loses nothing
+        self.ttl = period
+        self.store = get_shared_backend(f"ratelimit:{name}", ttl=period) or TTLCache(maxsize=100_000, ttl=period)
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        """Takes a token for `key`. Returns 0 if there was one, else the seconds until there is."""
+        if isinstance(self.store, RedisCache):
+            return float(self.store.client.eval(
+                _TAKE_SCRIPT, 1, self.store._key(key), self.capacity, self.rate, max(1, int(self.ttl))
+            ))
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self.store.get(key) or (self.capacity, now)
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self.store.set(key, (tokens, now))
+            return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(scope: str, kind: str):
+    """The bucket configured as RATE_LIMIT_<SCOPE>_<KIND>, or None when that limit is unset."""
+    limit = current_app.config.get(f"RATE_LIMIT_{scope.upper()}_{kind.upper()}")
+    if not limit:
+        return None
+    name = f"{scope}:{kind}"
+    with _buckets_lock:
+        bucket = _buckets.get((name, limit))
+        if bucket is None:
+            bucket = _buckets[(name, limit)] = TokenBucket(name, *parse_limit(limit))
+        return bucket
+
+def take_attempt(scope: str, client_ip: str, account: str = None) -> float:
+    """
+    Counts one attempt at `scope` ("login", "otp", ...) against the client and
+    the account. Returns 0 when it may go ahead, else seconds to Retry-After.
+    """
+    if not current_app.config.get("RATE_LIMITS_ENABLED", True):
+        return 0.0
+    ip_bucket = get_bucket(scope, "ip")
+    wait = ip_bucket.take(client_ip or "unknown") if ip_bucket else 0.0
+    if wait or not account:
+        return wait
+    account_bucket = get_bucket(scope, "account")
+    # Hashed so the shared cache never holds email addresses
+    account_key = hashlib.sha256(account.strip().lower().encode()).hexdigest()[:32]
+    return account_bucket.take(account_key) if account_bucket else 0.0
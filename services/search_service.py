@@ -0,0 +1,204 @@
+import logging
+from markupsafe import Markup, escape
+from sqlalchemy import DateTime, Integer, String, func, or_, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from database import db
+from models.db_tables import Post
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 10
+
+# Snippet highlight markers. Control characters can't come from a browser form,
+# so the snippet can be HTML-escaped first and the markers swapped for <mark> after.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
+# The inverted index lives in `post_search`, keyed by post id:
+#   SQLite     -> FTS5 virtual table (rowid = post id) over title/content/tags/category
+#   PostgreSQL -> weighted tsvector column with a GIN index
+# Only published posts are indexed.
+
+# Tags are folded into one space-separated string per post
+_TAGS_SQL = {
+    "sqlite": "(SELECT group_concat(t.name, ' ') FROM post_tags pt JOIN tags t ON t.id = pt.tag_id WHERE pt.post_id = p.id)",
+    "postgresql": "(SELECT string_agg(t.name, ' ') FROM post_tags pt JOIN tags t ON t.id = pt.tag_id WHERE pt.post_id = p.id)",
+}
+
+
+def _dialect() -> str:
+    return db.session.get_bind().dialect.name
+
+
+# SCHEMA
+
+def init_search_index():
+    """Creates the search index structures if they don't exist yet."""
+    dialect = _dialect()
+    if dialect == "sqlite":
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_search "
+            "USING fts5(title, content, tags, category, tokenize = 'porter unicode61')"
+        ))
+    elif dialect == "postgresql":
+        db.session.execute(text(
+            "CREATE TABLE IF NOT EXISTS post_search ("
+            " post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,"
+            " document TSVECTOR NOT NULL)"
+        ))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_post_search_document ON post_search USING GIN (document)"
+        ))
+    db.session.commit()
+
+
+# INDEXING
+
+def _index_where(where_sql: str, params: dict):
+    """(Re)indexes the posts matching `where_sql` (posts aliased as `p`) with set-based SQL."""
+    dialect = _dialect()
+    if dialect == "sqlite":
+        db.session.execute(
+            text(f"DELETE FROM post_search WHERE rowid IN (SELECT p.id FROM posts p WHERE {where_sql})"),
+            params
+        )
+        db.session.execute(text(f"""
+            INSERT INTO post_search (rowid, title, content, tags, category)
+            SELECT p.id, p.title, p.content, coalesce({_TAGS_SQL[dialect]}, ''), coalesce(c.name, '')
+            FROM posts p LEFT JOIN categories c ON c.id = p.category_id
+            WHERE p.is_published AND {where_sql}
+        """), params)
+    elif dialect == "postgresql":
+        db.session.execute(
+            text(f"DELETE FROM post_search WHERE post_id IN (SELECT p.id FROM posts p WHERE NOT p.is_published AND {where_sql})"),
+            params
+        )
+        db.session.execute(text(f"""
+            INSERT INTO post_search (post_id, document)
+            SELECT p.id,
+                   setweight(to_tsvector('english', p.title), 'A')
+                   || setweight(to_tsvector('english', coalesce({_TAGS_SQL[dialect]}, '')), 'B')
+                   || setweight(to_tsvector('english', coalesce(c.name, '')), 'B')
+                   || setweight(to_tsvector('english', p.content), 'C')
+            FROM posts p LEFT JOIN categories c ON c.id = p.category_id
+            WHERE p.is_published AND {where_sql}
+            ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+        """), params)
+
+# The post is already committed when these run, so a failure (e.g. a database
+# without the index yet) is logged rather than failing the request; searches
+# join back to posts, and `flask reindex-search` repairs whatever was missed.
+
+def index_post(post_id):
+    """Call after a post, its tags or its category change."""
+    try:
+        _index_where("p.id = :post_id", {"post_id": post_id})
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        logger.exception("Indexing post %s for search failed", post_id)
+
+def remove_post_from_index(post_id):
+    dialect = _dialect()
+    if dialect in ("sqlite", "postgresql"):
+        column = "rowid" if dialect == "sqlite" else "post_id"
+        try:
+            db.session.execute(text(f"DELETE FROM post_search WHERE {column} = :post_id"), {"post_id": post_id})
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception("Removing post %s from the search index failed", post_id)
+
+def reindex_all(batch_size: int = 5000) -> int:
+    """Rebuilds the whole index in id-range batches. Returns the number of batches."""
+    if _dialect() not in ("sqlite", "postgresql"):
+        return 0
+
+    init_search_index()
+    max_id = db.session.query(func.max(Post.id)).scalar() or 0
+    batches = 0
+    for low in range(0, max_id + 1, batch_size):
+        _index_where("p.id >= :low AND p.id < :high", {"low": low, "high": low + batch_size})
+        db.session.commit()
+        batches += 1
+    return batches
+
+
+# QUERYING
+
+_RESULT_TYPES = {"id": Integer, "slug": String, "title": String, "created_at": DateTime, "snippet": String}
+
+def _highlight(snippet: str) -> Markup:
+    return Markup(
+        str(escape(snippet or ""))
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+def _fts5_query(query: str) -> str:
+    """Quotes every term so user input can't inject FTS5 operators; terms are ANDed."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms)
+
+def search_posts(query: str, page: int = 1, per_page: int = SEARCH_PAGE_SIZE):
+    """
+    Ranked full-text search over published posts.
+    Returns (results, has_next); each result is a dict with id, slug, title, created_at and a
+    highlighted `snippet` (Markup).
+    """
+    query = (query or "").strip()
+    if not query:
+        return [], False
+
+    page = max(page, 1)
+    params = {"limit": per_page + 1, "offset": (page - 1) * per_page}
+    dialect = _dialect()
+
+    if dialect == "sqlite":
+        rows = db.session.execute(text("""
+            SELECT p.id, p.slug, p.title, p.created_at,
+                   snippet(post_search, 1, :start, :stop, '…', 24) AS snippet
+            FROM post_search
+            JOIN posts p ON p.id = post_search.rowid
+            WHERE post_search MATCH :query
+            ORDER BY bm25(post_search, 10.0, 1.0, 5.0, 5.0)
+            LIMIT :limit OFFSET :offset
+        """).columns(**_RESULT_TYPES), {
+            **params,
+            "query": _fts5_query(query),
+            "start": HIGHLIGHT_START,
+            "stop": HIGHLIGHT_STOP
+        }).all()
+    elif dialect == "postgresql":
+        rows = db.session.execute(text("""
+            SELECT p.id, p.slug, p.title, p.created_at,
+                   ts_headline('english', p.content, hits.query, :headline) AS snippet
+            FROM (
+                SELECT post_id, query, ts_rank_cd(document, query) AS rank
+                FROM post_search, websearch_to_tsquery('english', :query) AS query
+                WHERE document @@ query
+                ORDER BY rank DESC
+                LIMIT :limit OFFSET :offset
+            ) AS hits
+            JOIN posts p ON p.id = hits.post_id
+            ORDER BY hits.rank DESC
+        """).columns(**_RESULT_TYPES), {
+            **params,
+            "query": query,
+            "headline": f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords=35, MinWords=15"
+        }).all()
+    else:
+        pattern = f"%{query}%"
+        rows = db.session.execute(
+            select(Post.id, Post.slug, Post.title, Post.created_at, Post.excerpt)
+            .where(Post.is_published.is_(True), or_(Post.title.ilike(pattern), Post.content.ilike(pattern)))
+            .order_by(Post.created_at.desc())
+            .limit(params["limit"])
+            .offset(params["offset"])
+        ).all()
+
+    results = [
+        {"id": post_id, "slug": slug, "title": title, "created_at": created_at, "snippet": _highlight(snippet)}
+        for post_id, slug, title, created_at, snippet in rows[:per_page]
+    ]
+    return results, len(rows) > per_page
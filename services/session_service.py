@@ -0,0 +1,213 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import delete, insert, select, update
+from database import db
+from models.db_tables import Session
+from services.cache_service import get_shared_backend
+from services.token_service import hash_token
+
+# Flask's default session lives entirely in a cookie signed with SECRET_KEY,
+# which only works across workers and nodes when all of them share that key.
+# init_sessions() takes the key, and the older keys still accepted during a
+# rotation, from the config. With SESSION_STORE=server the cookie carries only
+# a signed random token, and the session itself is a row in the sessions table:
+#   - rows store the token's SHA-256, looked up through a unique index
+#   - expiry slides: an active session's row is pushed forward at most once
+#     per SESSION_REFRESH_SECONDS, so most requests don't write
+#   - logging in or out issues a new token, so a planted cookie is useless
+#   - sessions can be revoked; a password reset ends all of the user's sessions
+# Under CACHE_URL, sessions are also cached in the shared backend. There is no
+# per-process tier: every worker must see a logout right away.
+
+SIGNER_SALT = "server-session"
+ANONYMOUS_SESSION_SECONDS = 3600  # sessions that only hold flashes for a visitor
+
+session_cache = get_shared_backend("sessions", ttl=300)  # None without CACHE_URL
+
+
+# KEYS
+
+def secret_keys(app) -> list:
+    """Keys that verify signatures, oldest first; the last one (SECRET_KEY) signs."""
+    return [*app.config.get("SECRET_KEY_FALLBACKS", ()), app.config["SECRET_KEY"]]
+
+def init_sessions(app):
+    if not app.config.get("SECRET_KEY"):
+        if app.config.get("DEPLOYMENT_MODE") == "multi":
+            raise RuntimeError(
+                "SECRET_KEY must be set when DEPLOYMENT_MODE=multi: every worker and node has to sign with the same key"
+            )
+        # Single process only: every restart logs everyone out
+        app.config["SECRET_KEY"] = secrets.token_hex()
+
+    store = app.config.get("SESSION_STORE") or "cookie"
+    if store == "server":
+        app.session_interface = ServerSessionInterface()
+    elif store != "cookie":
+        raise ValueError(f"Unsupported SESSION_STORE: {store}")
+
+
+# STORE
+
+def load_session(token_hash: str):
+    """(user_id, data, expires_at) of a live session, or None."""
+    row = session_cache.get(token_hash) if session_cache is not None else None
+    if row is None:
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(Session.user_id, Session.data, Session.expires_at).where(Session.token_hash == token_hash)
+            ).first()
+        if row is None:
+            return None
+        row = tuple(row)
+        if session_cache is not None:
+            session_cache.set(token_hash, row)
+    return row if row[2] > datetime.utcnow() else None
+
+def save_session_row(token_hash: str, user_id, data: str, expires_at: datetime, new: bool = False):
+    with db.engine.begin() as connection:
+        if new:
+            connection.execute(insert(Session).values(
+                token_hash=token_hash, user_id=user_id, data=data, expires_at=expires_at
+            ))
+        else:
+            connection.execute(
+                update(Session)
+                .where(Session.token_hash == token_hash)
+                .values(user_id=user_id, data=data, expires_at=expires_at)
+            )
+    if session_cache is not None:
+        session_cache.set(token_hash, (user_id, data, expires_at))
+
+def delete_session(token_hash: str):
+    with db.engine.begin() as connection:
+        connection.execute(delete(Session).where(Session.token_hash == token_hash))
+    if session_cache is not None:
+        session_cache.delete(token_hash)
+
+def end_user_sessions(user_id) -> int:
+    """Logs a user out everywhere. Returns the number of sessions ended."""
+    with db.engine.begin() as connection:
+        token_hashes = connection.execute(
+            delete(Session).where(Session.user_id == user_id).returning(Session.token_hash)
+        ).scalars().all()
+    if session_cache is not None:
+        for token_hash in token_hashes:
+            session_cache.delete(token_hash)
+    return len(token_hashes)
+
+def purge_expired_sessions(batch_size: int = 1000) -> int:
+    """Deletes expired sessions in chunks of `batch_size`. Returns the number removed."""
+    removed = 0
+    while True:
+        ids = db.session.execute(
+            select(Session.id).where(Session.expires_at < datetime.utcnow()).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return removed
+
+        db.session.execute(delete(Session).where(Session.id.in_(ids)))
+        db.session.commit()
+        removed += len(ids)
+
+
+# FLASK INTERFACE
+
+def _user_uuid(value):
+    try:
+        return uuid.UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+class ServerSession(SecureCookieSession):
+    """The session dict plus the token it was loaded with (None until first saved)."""
+
+    def __init__(self, initial=None, token=None, expires_at=None, resign=False):
+        super().__init__(initial)
+        self.token = token
+        self.expires_at = expires_at
+        self.resign = resign
+        self.loaded_user_id = dict.get(self, "_user_id")
+
+
+class ServerSessionInterface(SessionInterface):
+    """Sessions kept in the sessions table, addressed by a signed token cookie."""
+
+    session_class = ServerSession
+    serializer = session_json_serializer  # the signed cookie's format: tuples, bytes, datetimes survive
+
+    def _signer(self, keys) -> Signer:
+        return Signer(keys, salt=SIGNER_SALT, digest_method=hashlib.sha256)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSession()
+        try:
+            token = self._signer(secret_keys(app)).unsign(cookie).decode()
+        except BadSignature:
+            return ServerSession()
+
+        row = load_session(hash_token(token))
+        if row is None:
+            return ServerSession()
+        _, data, expires_at = row
+        # Still signed with a key that is being rotated out: re-sign with the current one
+        resign = bool(app.config.get("SECRET_KEY_FALLBACKS")) and \
+            not self._signer([app.config["SECRET_KEY"]]).validate(cookie)
+        return ServerSession(self.serializer.loads(data), token=token, expires_at=expires_at, resign=resign)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        user_id = dict.get(session, "_user_id")
+        if session.token is not None and (not session or user_id != session.loaded_user_id):
+            # Emptied, or someone logged in or out: the old token is retired
+            delete_session(hash_token(session.token))
+            session.token = None
+            if not session:
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                    samesite=self.get_cookie_samesite(app), httponly=self.get_cookie_httponly(app)
+                )
+                return
+        if not session:
+            return
+
+        now = datetime.utcnow()
+        idle_timeout = app.config.get("SESSION_IDLE_TIMEOUT", 7 * 24 * 3600)
+        if not user_id:
+            idle_timeout = min(idle_timeout, ANONYMOUS_SESSION_SECONDS)
+        expires_at = now + timedelta(seconds=idle_timeout)
+        refresh_due = session.expires_at is None or \
+            session.expires_at < expires_at - timedelta(seconds=app.config.get("SESSION_REFRESH_SECONDS", 300))
+
+        new = session.token is None
+        if new:
+            session.token = secrets.token_urlsafe(32)
+        if new or session.modified or refresh_due:
+            save_session_row(
+                hash_token(session.token), _user_uuid(user_id), self.serializer.dumps(dict(session)), expires_at, new=new
+            )
+
+        if new or session.resign or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(secret_keys(app)).sign(session.token).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+                partitioned=self.get_cookie_partitioned(app),
+            )
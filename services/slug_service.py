@@ -0,0 +1,118 @@
+from slugify import slugify
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from database import db, read_replica
+from models.db_tables import Post, PostSlugRedirect
+from services.cache_service import TieredCache, TTLCache, get_shared_backend
+
+# A post is addressed by its current slug; every slug it had before stays in
+# post_slug_redirects pointing at it. A slug therefore names one post for as
+# long as that post exists, which is what lets slug -> id be cached without
+# invalidation on rename. Deleting a post frees its slugs and drops them from
+# the cache.
+
+MAX_SLUG_LENGTH = 200  # leaves room for "-<n>" within the 255-character column
+SLUG_RETRIES = 5
+
+slug_cache = TieredCache(
+    TTLCache(maxsize=10_000, ttl=3600),
+    get_shared_backend("slugs", ttl=3600)
+)
+
+
+# GENERATION
+
+def base_slug(title: str) -> str:
+    slug = slugify(title or "", max_length=MAX_SLUG_LENGTH, word_boundary=True) or "post"
+    # All-digit paths are routed as post ids
+    return f"post-{slug}" if slug.isdigit() else slug
+
+def _family(column, base: str):
+    # base itself or base-<anything>: a range rather than LIKE, so every
+    # database can answer it from the unique index ("." sorts right after "-")
+    return or_(column == base, and_(column >= f"{base}-", column < f"{base}."))
+
+def unique_slug(title: str, post_id=None) -> str:
+    """
+    Slug for `title` that no other post uses now or used before: the plain slug
+    when it's free, otherwise the first free "<slug>-<n>". The taken slugs of
+    the whole family come back in one query; `post_id` lets a post keep or
+    reclaim its own slugs.
+    """
+    base = base_slug(title)
+    current = select(Post.slug).where(_family(Post.slug, base))
+    previous = select(PostSlugRedirect.slug).where(_family(PostSlugRedirect.slug, base))
+    if post_id is not None:
+        current = current.where(Post.id != post_id)
+        previous = previous.where(PostSlugRedirect.post_id != post_id)
+    taken = set(db.session.execute(current.union_all(previous)).scalars())
+
+    if base not in taken:
+        return base
+    n = 2
+    while f"{base}-{n}" in taken:
+        n += 1
+    return f"{base}-{n}"
+
+def add_with_unique_slug(post: Post, retries: int = SLUG_RETRIES):
+    """
+    Adds and flushes a new `post`. unique_slug() can't see a post that another
+    request is inserting at the same moment, so when the insert hits the unique
+    index on posts.slug, the post gets the next free slug and is inserted again.
+    Each attempt runs in a savepoint, so the rest of the transaction survives.
+    """
+    for attempt in range(retries):
+        try:
+            with db.session.begin_nested():
+                db.session.add(post)
+            return
+        except IntegrityError as exc:
+            if attempt == retries - 1 or "slug" not in str(exc.orig):
+                raise
+            post.slug = unique_slug(post.title)
+
+def change_slug(post: Post, title: str) -> bool:
+    """Moves `post` to the slug for its new title, keeping the old one as a redirect. Returns True if it changed."""
+    new_slug = unique_slug(title, post_id=post.id)
+    if new_slug == post.slug:
+        return False
+
+    # Reclaiming an earlier slug turns its redirect back into the canonical slug
+    db.session.execute(
+        delete(PostSlugRedirect)
+        .where(PostSlugRedirect.slug == new_slug, PostSlugRedirect.post_id == post.id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.add(PostSlugRedirect(slug=post.slug, post_id=post.id))
+    post.slug = new_slug
+    return True
+
+
+# LOOKUP
+
+@read_replica()
+def resolve_slug(slug: str):
+    """Id of the post that has or had `slug`, or None."""
+    post_id = slug_cache.get(slug)
+    if post_id is not None:
+        return post_id
+
+    post_id = db.session.execute(
+        select(Post.id).where(Post.slug == slug)
+        .union_all(select(PostSlugRedirect.post_id).where(PostSlugRedirect.slug == slug))
+        .limit(1)
+    ).scalar()
+    if post_id is not None:
+        slug_cache.set(slug, post_id)
+    return post_id
+
+def post_slugs(post_id) -> list:
+    """Current and earlier slugs of a post, for dropping them from the cache when it is deleted."""
+    return list(db.session.execute(
+        select(Post.slug).where(Post.id == post_id)
+        .union_all(select(PostSlugRedirect.slug).where(PostSlugRedirect.post_id == post_id))
+    ).scalars())
+
+def forget_slugs(slugs):
+    for slug in slugs:
+        slug_cache.delete(slug)
@@ -0,0 +1,342 @@
+import mimetypes
+import os
+import shutil
+import threading
+import time
+from flask import current_app, url_for
+
+# Media bytes live behind a storage backend addressed by key. Keys are the
+# file_path values stored on MediaBlob / PostMedia / PostMediaVariant rows
+# ("uploads/<sha256>.<ext>"), so switching backends never rewrites the database.
+#
+#   local   - a directory on this node (UPLOAD_FOLDER), served by media.uploaded_file
+#   s3      - any S3 API (AWS, MinIO, R2, ...); browsers fetch from the bucket or a CDN
+#             in front of it, and large uploads go straight to it with presigned PUTs
+#   memory  - in-process fake with the S3 backend's behaviour, for tests and dev shells
+#
+# Every backend implements the same methods; callers check `is_local` only to
+# decide whether the web tier serves the bytes itself.
+
+KEY_PREFIX = "uploads/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def content_type_for(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class StoredObject:
+    __slots__ = ("key", "size", "modified")
+
+    def __init__(self, key, size, modified):
+        self.key = key
+        self.size = size
+        self.modified = modified  # epoch seconds
+
+
+# BACKENDS
+
+class LocalStorage:
+    """Files under `root`; the key "uploads/a.jpg" is stored as <root>/a.jpg."""
+
+    is_local = True
+    supports_presign = False
+    shared_across_processes = True
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        name = key[len(KEY_PREFIX):] if key.startswith(KEY_PREFIX) else key
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Key {key!r} escapes the storage root")
+        return path
+
+    def local_path(self, key: str):
+        return self.path(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def size(self, key: str):
+        try:
+            return os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def put_file(self, key: str, source_path, content_type=None, move=False):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if move:
+            shutil.move(source_path, target)
+        else:
+            shutil.copyfile(source_path, target)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        with open(self.path(key), "rb") as fh:
+            fh.seek(start)
+            return fh.read(length)
+
+    def download(self, key: str, target_path):
+        shutil.copyfile(self.path(key), target_path)
+
+    def copy(self, source_key: str, target_key: str):
+        self.put_file(target_key, self.path(source_key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix: str = KEY_PREFIX):
+        """Top-level files only; the .partial directory belongs to upload sessions."""
+        for entry in os.scandir(self.root):
+            key = KEY_PREFIX + entry.name
+            if entry.is_file() and key.startswith(prefix):
+                stat = entry.stat()
+                yield StoredObject(key, stat.st_size, stat.st_mtime)
+
+    def url(self, key: str):
+        return None
+
+    def presigned_get(self, key: str, expires_in: int = 3600):
+        return None
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int = 3600):
+        return None
+
+
+class S3Storage:
+    """
+    Objects in an S3 bucket, optionally under `prefix`. `endpoint_url` points it
+    at MinIO or another S3-compatible server; `public_url` is the base browsers
+    fetch objects from (a public bucket or a CDN) and, when unset, reads go
+    through short-lived presigned GETs instead. boto3 is only needed when this
+    backend is configured.
+    """
+
+    is_local = False
+    supports_presign = True
+    shared_across_processes = True
+
+    # upload_file switches to a multipart upload above this size, streaming the
+    # file part by part instead of holding it in memory
+    MULTIPART_THRESHOLD = 16 * 1024 * 1024
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, region=None, public_url=None,
+                 access_key=None, secret_key=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix else ""
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Pickled into image workers; each process opens its own client
+        state = self.__dict__.copy()
+        state["_client"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import boto3
+                from botocore.config import Config as BotoConfig
+
+                self._client = boto3.client(
+                    "s3",
+                    endpoint_url=self.endpoint_url,
+                    region_name=self.region,
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"} if self.endpoint_url else {})
+                )
+            return self._client
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def local_path(self, key: str):
+        return None
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def size(self, key: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))["ContentLength"]
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put_file(self, key: str, source_path, content_type=None, move=False):
+        from boto3.s3.transfer import TransferConfig
+
+        extra = {"ContentType": content_type or content_type_for(key)}
+        if key.startswith(KEY_PREFIX):
+            extra["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+        self.client.upload_file(
+            source_path, self.bucket, self._object_key(key), ExtraArgs=extra,
+            Config=TransferConfig(multipart_threshold=self.MULTIPART_THRESHOLD, multipart_chunksize=self.MULTIPART_THRESHOLD)
+        )
+        if move:
+            os.remove(source_path)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._object_key(key), Range=f"bytes={start}-{start + length - 1}"
+        )
+        return response["Body"].read()
+
+    def download(self, key: str, target_path):
+        self.client.download_file(self.bucket, self._object_key(key), target_path)
+
+    def copy(self, source_key: str, target_key: str):
+        # Server-side copy; the bytes never pass through this process
+        self.client.copy(
+            {"Bucket": self.bucket, "Key": self._object_key(source_key)}, self.bucket, self._object_key(target_key),
+            ExtraArgs={"ContentType": content_type_for(target_key), "CacheControl": IMMUTABLE_CACHE_CONTROL,
+                       "MetadataDirective": "REPLACE"}
+        )
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def list(self, prefix: str = KEY_PREFIX):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix)):
+            for item in page.get("Contents", []):
+                yield StoredObject(item["Key"][len(self.prefix):], item["Size"], item["LastModified"].timestamp())
+
+    def url(self, key: str):
+        return f"{self.public_url}/{self._object_key(key)}" if self.public_url else None
+
+    def presigned_get(self, key: str, expires_in: int = 3600):
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._object_key(key)}, ExpiresIn=expires_in
+        )
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int = 3600):
+        return self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key), "ContentType": content_type},
+            ExpiresIn=expires_in
+        )
+
+
+class MemoryStorage:
+    """
+    In-process stand-in for S3Storage: nothing is served by the web tier and
+    reads go through "presigned" URLs on a fake host. Objects are lost when the
+    process exits and are not visible to the image worker processes.
+    """
+
+    is_local = False
+    supports_presign = True
+    shared_across_processes = False
+
+    def __init__(self, base_url="https://storage.invalid/media"):
+        self.base_url = base_url
+        self.objects = {}  # key -> (bytes, content_type, modified)
+        self._lock = threading.Lock()
+
+    def local_path(self, key: str):
+        return None
+
+    def exists(self, key: str) -> bool:
+        return key in self.objects
+
+    def size(self, key: str):
+        entry = self.objects.get(key)
+        return len(entry[0]) if entry else None
+
+    def put_bytes(self, key: str, data: bytes, content_type=None):
+        with self._lock:
+            self.objects[key] = (bytes(data), content_type or content_type_for(key), time.time())
+
+    def put_file(self, key: str, source_path, content_type=None, move=False):
+        with open(source_path, "rb") as fh:
+            self.put_bytes(key, fh.read(), content_type)
+        if move:
+            os.remove(source_path)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        return self.objects[key][0][start:start + length]
+
+    def download(self, key: str, target_path):
+        with open(target_path, "wb") as out:
+            out.write(self.objects[key][0])
+
+    def copy(self, source_key: str, target_key: str):
+        data, _, _ = self.objects[source_key]
+        self.put_bytes(target_key, data)
+
+    def delete(self, key: str):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def list(self, prefix: str = KEY_PREFIX):
+        with self._lock:
+            items = list(self.objects.items())
+        for key, (data, _, modified) in items:
+            if key.startswith(prefix):
+                yield StoredObject(key, len(data), modified)
+
+    def url(self, key: str):
+        return None
+
+    def presigned_get(self, key: str, expires_in: int = 3600):
+        return f"{self.base_url}/{key}?expires={int(time.time()) + expires_in}"
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int = 3600):
+        return f"{self.base_url}/{key}?upload=1&expires={int(time.time()) + expires_in}"
+
+
+# SELECTION
+
+def create_storage(config):
+    """Backend selected by MEDIA_STORAGE: 'local' (default), 's3' or 'memory'."""
+    name = config.get("MEDIA_STORAGE") or "local"
+    if name == "s3":
+        return S3Storage(
+            bucket=config["S3_BUCKET"],
+            prefix=config.get("S3_PREFIX") or "",
+            endpoint_url=config.get("S3_ENDPOINT_URL"),
+            region=config.get("S3_REGION"),
+            public_url=config.get("MEDIA_PUBLIC_URL"),
+            access_key=config.get("S3_ACCESS_KEY"),
+            secret_key=config.get("S3_SECRET_KEY")
+        )
+    if name == "memory":
+        return MemoryStorage()
+    return LocalStorage(config["UPLOAD_FOLDER"])
+
+def init_storage(app, storage=None):
+    app.extensions["media_storage"] = storage or create_storage(app.config)
+
+def get_storage():
+    return current_app.extensions["media_storage"]
+
+def media_url(file_path: str) -> str:
+    """
+    URL of an uploaded file: the storage's public URL (bucket or CDN) when it has
+    one, otherwise media.uploaded_file, which serves or redirects with cache headers.
+    """
+    if file_path.startswith(KEY_PREFIX):
+        return get_storage().url(file_path) or url_for("media.uploaded_file", filename=file_path[len(KEY_PREFIX):])
+    return url_for("static", filename=file_path)
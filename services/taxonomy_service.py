@@ -0,0 +1,143 @@
+import re
+from sqlalchemy import func, insert, select, update
+from database import db, dialect_insert, read_replica
+from models.db_tables import Category, Post, PostTag, Tag
+from services.cache_service import TTLCache
+
+# Category.post_count and Tag.post_count are the facet counts shown next to
+# each name ("Python (1,203)"). Like the post counters they are moved by the
+# write paths (create, edit, delete) and repaired by `flask reconcile-counters`,
+# so rendering never counts post_tags.
+
+MAX_TAGS_PER_POST = 10
+TOP_TAGS = 30
+
+# Facet lists for the feed pages. Short TTL so other workers converge
+# quickly; the local worker clears it on every post write.
+facet_cache = TTLCache(maxsize=4, ttl=60)
+
+
+# TAG NAMES
+
+def parse_tags(raw: str) -> list:
+    """Comma-separated input -> distinct, lowercased tag names, at most MAX_TAGS_PER_POST."""
+    names = []
+    for part in (raw or "").split(","):
+        # "/" becomes a space like other separators: /tag/<name> can't match one
+        name = re.sub(r"[\s/]+", " ", part).strip().lower()[:100]
+        if name and name not in names:
+            names.append(name)
+    return names[:MAX_TAGS_PER_POST]
+
+@read_replica()
+def get_tag(name: str):
+    return db.session.execute(select(Tag.id, Tag.name).where(Tag.name == name.lower())).first()
+
+
+# WRITES (inside the caller's transaction)
+
+def attach_tags(post_id, names) -> list:
+    """
+    Tags a post: creates the missing tags and bumps post_count on the existing
+    ones in a single upsert, then links them with one multi-row insert.
+    Returns the tag ids.
+    """
+    if not names:
+        return []
+    names = sorted(set(names))  # same lock order in concurrent transactions
+
+    insert_tag = dialect_insert(Tag)
+    if insert_tag is not None:
+        tag_ids = list(db.session.execute(
+            insert_tag.values([{"name": name, "post_count": 1} for name in names])
+            .on_conflict_do_update(index_elements=[Tag.name], set_={"post_count": Tag.post_count + 1})
+            .returning(Tag.id)
+        ).scalars())
+    else:
+        tag_ids = []
+        for name in names:
+            tag = db.session.query(Tag).filter_by(name=name).with_for_update().first()
+            if tag is None:
+                tag = Tag(name=name, post_count=0)
+                db.session.add(tag)
+            tag.post_count += 1
+            db.session.flush()
+            tag_ids.append(tag.id)
+
+    db.session.execute(insert(PostTag), [{"post_id": post_id, "tag_id": tag_id} for tag_id in tag_ids])
+    return tag_ids
+
+def release_tags(post_id):
+    """Drops the post's contribution to its tags' counts; the post_tags rows go with the post."""
+    db.session.execute(
+        update(Tag)
+        .where(Tag.id.in_(select(PostTag.tag_id).where(PostTag.post_id == post_id)))
+        .values(post_count=Tag.post_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def move_category(old_category_id, new_category_id):
+    """Moves one post's worth of count between categories (either may be None)."""
+    if old_category_id == new_category_id:
+        return
+    for category_id, delta in ((old_category_id, -1), (new_category_id, 1)):
+        if category_id:
+            db.session.execute(
+                update(Category)
+                .where(Category.id == category_id)
+                .values(post_count=Category.post_count + delta)
+                .execution_options(synchronize_session=False)
+            )
+
+
+# FACETS
+
+@read_replica()
+def get_facets() -> dict:
+    """
+    {"categories": [(id, name, count)], "tags": [(name, count)]}: every category,
+    and the TOP_TAGS most used tags, read from the stored counts.
+    """
+    cached = facet_cache.get("facets")
+    if cached is not None:
+        return cached
+
+    categories = [
+        tuple(row) for row in db.session.execute(
+            select(Category.id, Category.name, Category.post_count).order_by(Category.name)
+        )
+    ]
+    tags = [
+        tuple(row) for row in db.session.execute(
+            select(Tag.name, Tag.post_count)
+            .where(Tag.post_count > 0)
+            .order_by(Tag.post_count.desc(), Tag.name)
+            .limit(TOP_TAGS)
+        )
+    ]
+    facets = {"categories": categories, "tags": tags}
+    facet_cache.set("facets", facets)
+    return facets
+
+def invalidate_facets():
+    facet_cache.clear()
+
+def reconcile_facet_counts() -> int:
+    """Recomputes category and tag counts in bulk. Returns the number of repaired rows."""
+    category_posts = select(func.count(Post.id)).where(Post.category_id == Category.id).scalar_subquery()
+    tag_posts = select(func.count(PostTag.post_id)).where(PostTag.tag_id == Tag.id).scalar_subquery()
+    repaired = db.session.execute(
+        update(Category)
+        .where(Category.post_count != category_posts)
+        .values(post_count=category_posts)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    repaired += db.session.execute(
+        update(Tag)
+        .where(Tag.post_count != tag_posts)
+        .values(post_count=tag_posts)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    invalidate_facets()
+    return repaired
@@ -1,29 +1,88 @@
+import hashlib
+import hmac
 import secrets
 from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, or_, select, update
 from database import db
-from models.db_tables import AuthToken
+from models.db_tables import AuthToken, User
+
+
+def hash_token(token: str) -> str:
+    """Plain SHA-256, for tokens with enough entropy of their own (session ids)."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def auth_token_hashes(token: str) -> list:
+    """
+    HMAC-SHA256 digests of an auth token under SECRET_KEY, then under each of
+    SECRET_KEY_FALLBACKS; the first is the one to store. OTPs are six digits,
+    so a plain digest could be reversed by hashing every candidate.
+    """
+    # Imported here: session_service imports this module
+    from services.session_service import secret_keys
+
+    return [
+        hmac.new(key.encode() if isinstance(key, str) else key, token.encode(), hashlib.sha256).hexdigest()
+        for key in reversed(secret_keys(current_app))
+    ]
 
 def generate_token(user_id, token_type="otp", minutes=10):
+    """The plaintext token is only available as `plain_token` on the returned object."""
     token = secrets.token_urlsafe(8)
     auth = AuthToken(
         user_id=user_id,
-        token=token,
+        token_hash=auth_token_hashes(token)[0],
         type=token_type,
         expires_at=datetime.utcnow() + timedelta(minutes=minutes)
     )
     db.session.add(auth)
     db.session.commit()
+    auth.plain_token = token
     return auth
 
+def consume_token(token, token_type, user_id=None):
+    """
+    Marks a valid token as used with a single conditional UPDATE .. RETURNING,
+    so two concurrent verifications can't both succeed.
+    Returns the owning user_id, or None if no unused, unexpired token matched.
+    """
+    stmt = (
+        update(AuthToken)
+        .where(
+            AuthToken.token_hash.in_(auth_token_hashes(token)),
+            AuthToken.type == token_type,
+            AuthToken.is_used.is_(False),
+            AuthToken.expires_at > datetime.utcnow()
+        )
+        .values(is_used=True)
+        .returning(AuthToken.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    if user_id is not None:
+        stmt = stmt.where(AuthToken.user_id == user_id)
+
+    owner_id = db.session.execute(stmt).scalars().first()
+    db.session.commit()
+    return owner_id
+
 def verify_token(token, token_type="otp"):
-    auth = AuthToken.query.filter_by(
-        token=token,
-        type=token_type,
-        is_used=False
-    ).first()
+    user_id = consume_token(token, token_type)
+    if user_id is None:
+        return None
+    return db.session.get(User, user_id)
+
+def purge_expired_tokens(batch_size: int = 1000) -> int:
+    """Deletes expired and used tokens in chunks of `batch_size`. Returns the number removed."""
+    removed = 0
+    while True:
+        ids = db.session.execute(
+            select(AuthToken.id)
+            .where(or_(AuthToken.expires_at < datetime.utcnow(), AuthToken.is_used.is_(True)))
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return removed
 
-    if auth and auth.expires_at > datetime.utcnow():
-        auth.is_used = True
+        db.session.execute(delete(AuthToken).where(AuthToken.id.in_(ids)))
         db.session.commit()
-        return auth.user
-    return None
+        removed += len(ids)
@@ -0,0 +1,291 @@
+import os
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import Request, current_app
+from sqlalchemy import update
+from werkzeug.exceptions import RequestEntityTooLarge
+from database import db
+from models.db_tables import UploadSession
+from services.blob_service import CHUNK_SIZE, FileTooLarge, hash_file, store_file, stream_to_temp
+
+# Upload ingestion happens in two steps:
+#   stage  - disk only: stream to a temp file in the upload folder, sniff the type
+#            from the first bytes and hash. Runs in a thread pool, several files at once.
+#   place  - database: take the blob reference and move the temp file into
+#            content-addressed storage. Runs in the request's session, so the post
+#            and all of its media commit together or not at all.
+# Large files can instead arrive through a resumable upload session, in chunks
+# of at most UPLOAD_CHUNK_BYTES, and are then staged from the assembled file.
+# When the storage backend can presign, the session hands out a presigned PUT
+# instead and the file goes straight to storage under incoming/<id>; placing it
+# is then a server-side copy and the bytes never pass through the web tier.
+
+SNIFF_BYTES = 16
+PARTIAL_DIR = ".partial"
+
+
+class UploadRejected(ValueError):
+    """The message is safe to show to the user."""
+
+
+class ChunkOutOfOrder(ValueError):
+    def __init__(self, received: int):
+        super().__init__(f"Expected the chunk starting at byte {received}")
+        self.received = received
+
+
+# SNIFFING
+
+def sniff_media(head: bytes):
+    """(media_type, extension) from a file's first bytes, or None if the format isn't accepted."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image", "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image", "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image", "gif"
+    if head[:4] == b"RIFF":
+        if head[8:12] == b"AVI ":
+            return "video", "avi"
+        if head[8:12] == b"WAVE":
+            return "audio", "wav"
+        return None
+    if head[4:8] == b"ftyp":
+        return ("video", "mov") if head[8:12] == b"qt  " else ("video", "mp4")
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "audio", "mp3"
+    return None
+
+
+# STAGING
+
+class StagedUpload:
+    """A sniffed upload waiting to be placed: a local temp file, or a `source_key` already in storage."""
+
+    __slots__ = ("filename", "temp_path", "sha256", "size", "media_type", "extension", "source_key")
+
+    def __init__(self, filename, temp_path, sha256, size, media_type, extension, source_key=None):
+        self.filename = filename
+        self.temp_path = temp_path
+        self.sha256 = sha256
+        self.size = size
+        self.media_type = media_type
+        self.extension = extension
+        self.source_key = source_key
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("UPLOAD_WORKERS", "4")), thread_name_prefix="upload"
+            )
+        return _executor
+
+def _megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.0f} MB"
+
+def stage_file(file_storage, directory, max_bytes: int) -> StagedUpload:
+    name = file_storage.filename or "file"
+    head = file_storage.stream.read(SNIFF_BYTES)
+    sniffed = sniff_media(head)
+    if sniffed is None:
+        raise UploadRejected(f"{name} is not a supported image, video or audio file")
+    try:
+        temp_path, sha256, size = stream_to_temp(file_storage.stream, directory, max_bytes, head=head)
+    except FileTooLarge:
+        raise UploadRejected(f"{name} is larger than {_megabytes(max_bytes)}")
+    return StagedUpload(name, temp_path, sha256, size, *sniffed)
+
+def stage_files(file_storages, directory, max_bytes: int, upload_sessions=(), storage=None) -> list:
+    """
+    Stages form files and completed upload sessions in parallel. If any of them
+    is rejected or fails, the temp copies of the form files are removed and the
+    first error is raised (session files stay, so the upload can be reused).
+    """
+    executor = get_executor()
+    file_futures = [executor.submit(stage_file, f, directory, max_bytes) for f in file_storages]
+    session_futures = [executor.submit(stage_session, upload, directory, storage) for upload in upload_sessions]
+
+    staged, error = [], None
+    for future in file_futures + session_futures:
+        try:
+            staged.append(future.result())
+        except Exception as exc:
+            error = error or exc
+    if error is not None:
+        discard(future.result() for future in file_futures if future.exception() is None)
+        raise error
+    return staged
+
+def discard(staged_uploads):
+    for staged in staged_uploads:
+        if staged.temp_path is None:
+            continue
+        try:
+            os.remove(staged.temp_path)
+        except FileNotFoundError:
+            pass
+
+def place(staged: StagedUpload, storage) -> str:
+    """Takes the blob reference in the caller's transaction and returns the stored file_path."""
+    if staged.source_key is not None:
+        # Direct uploads aren't hashed (that would mean downloading them again);
+        # they keep their random session id as name and have no shared blob
+        file_path = f"uploads/{os.path.basename(staged.source_key)}.{staged.extension}"
+        storage.copy(staged.source_key, file_path)
+        storage.delete(staged.source_key)
+        return file_path
+    return store_file(staged.temp_path, staged.sha256, staged.size, staged.extension, storage)
+
+
+# PARSE-TIME LIMITS
+
+class CappedFile:
+    """Spooled temp file for one multipart part that refuses to grow past `max_bytes`."""
+
+    def __init__(self, max_bytes: int):
+        self._file = tempfile.SpooledTemporaryFile(max_size=512 * 1024)
+        self._max_bytes = max_bytes
+        self._size = 0
+
+    def write(self, data):
+        self._size += len(data)
+        if self._size > self._max_bytes:
+            raise RequestEntityTooLarge()
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Stops parsing a multipart body as soon as one file passes UPLOAD_MAX_FILE_BYTES."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_bytes = current_app.config.get("UPLOAD_MAX_FILE_BYTES")
+        if not max_bytes:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return CappedFile(max_bytes)
+
+
+# RESUMABLE UPLOADS
+
+def partial_path(upload_folder, upload_id: str) -> str:
+    return os.path.join(upload_folder, PARTIAL_DIR, upload_id)
+
+def create_upload_session(user_id, filename: str, total_size: int, upload_folder, max_bytes: int,
+                          direct: bool = False) -> UploadSession:
+    """With direct=True the client PUTs the whole file to storage under the session's storage_key."""
+    if total_size <= 0:
+        raise UploadRejected("File is empty")
+    if total_size > max_bytes:
+        raise UploadRejected(f"{filename} is larger than {_megabytes(max_bytes)}")
+
+    upload = UploadSession(id=secrets.token_hex(16), user_id=user_id, filename=filename[:255], total_size=total_size)
+    if direct:
+        upload.storage_key = f"incoming/{upload.id}"
+    else:
+        os.makedirs(os.path.join(upload_folder, PARTIAL_DIR), exist_ok=True)
+        open(partial_path(upload_folder, upload.id), "wb").close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+def append_chunk(upload: UploadSession, start: int, length: int, stream, upload_folder, max_chunk: int) -> int:
+    """
+    Writes `length` bytes from `stream` at offset `start` of the partial file.
+    Chunks must arrive in order; a retried chunk that was already stored is
+    acknowledged without rewriting. Returns the number of bytes received so far.
+    """
+    if start + length > upload.total_size or length <= 0:
+        raise UploadRejected("Chunk lies outside the file")
+    if length > max_chunk:
+        raise UploadRejected(f"Chunks are limited to {_megabytes(max_chunk)}")
+    if start + length <= upload.received:
+        return upload.received
+    if start != upload.received:
+        raise ChunkOutOfOrder(upload.received)
+
+    with open(partial_path(upload_folder, upload.id), "r+b") as out:
+        out.seek(start)
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise UploadRejected("Chunk ended early")
+            out.write(chunk)
+            remaining -= len(chunk)
+
+    # Conditional on the offset, so a concurrent retry of the same chunk can't double count
+    db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload.id, UploadSession.received == start)
+        .values(received=start + length, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    db.session.refresh(upload)
+    return upload.received
+
+def complete_direct_upload(upload: UploadSession, storage) -> int:
+    """Marks a direct upload as received once its object is in storage at the announced size."""
+    size = storage.size(upload.storage_key)
+    if size != upload.total_size:
+        raise UploadRejected(f"{upload.filename} has not finished uploading")
+    upload.received = size
+    db.session.commit()
+    return upload.received
+
+def stage_session(upload: UploadSession, upload_folder, storage=None) -> StagedUpload:
+    """Stages a completed session's partial file in place (it is moved, not copied, when placed)."""
+    if upload.received != upload.total_size:
+        raise UploadRejected(f"{upload.filename} has not finished uploading")
+
+    if upload.storage_key:
+        sniffed = sniff_media(storage.read_range(upload.storage_key, 0, SNIFF_BYTES))
+        if sniffed is None:
+            raise UploadRejected(f"{upload.filename} is not a supported image, video or audio file")
+        return StagedUpload(upload.filename, None, None, upload.total_size, *sniffed, source_key=upload.storage_key)
+
+    path = partial_path(upload_folder, upload.id)
+    with open(path, "rb") as fh:
+        sniffed = sniff_media(fh.read(SNIFF_BYTES))
+    if sniffed is None:
+        raise UploadRejected(f"{upload.filename} is not a supported image, video or audio file")
+    sha256, size = hash_file(path)
+    return StagedUpload(upload.filename, path, sha256, size, *sniffed)
+
+def purge_stale_upload_sessions(upload_folder, storage, max_age_seconds: int = 24 * 3600) -> int:
+    """Deletes abandoned upload sessions and their partial files or objects. Returns the number removed."""
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+    stale = db.session.query(UploadSession).filter(UploadSession.updated_at < cutoff).all()
+    for upload in stale:
+        if upload.storage_key:
+            storage.delete(upload.storage_key)
+        else:
+            try:
+                os.remove(partial_path(upload_folder, upload.id))
+            except FileNotFoundError:
+                pass
+        db.session.delete(upload)
+    db.session.commit()
+
+    # Partial files whose session row is already gone
+    directory = os.path.join(upload_folder, PARTIAL_DIR)
+    live = {upload_id for (upload_id,) in db.session.query(UploadSession.id)}
+    for entry in os.scandir(directory):
+        if entry.name not in live and entry.stat().st_mtime < time.time() - max_age_seconds:
+            os.remove(entry.path)
+    for stored in storage.list("incoming/"):
+        if os.path.basename(stored.key) not in live and stored.modified < time.time() - max_age_seconds:
+            storage.delete(stored.key)
+    return len(stale)